@@ -0,0 +1,167 @@
+# async_weather_agent.py
+# asyncio version of weather_agent.py: one process serves many independent
+# conversations, each with its own message history.
+import asyncio
+import json
+from collections import Counter
+
+import httpx
+
+from command_executor import run_command_async
+from json_stream_parser import check_object, parse_error_message
+from llm_clients import create_client, load_env
+from rate_limiter import acall_with_retry, shared_limiter
+from weather_agent import (MAX_INVALID_REPLIES, MODEL_NAME, PREFETCH, WEATHER_BASE_URL, history, sessions,
+                           system_prompt, weather_cache)
+from weather_prefetch import AsyncWeatherPrefetcher
+
+load_env()
+
+# protects against a model that never reaches the "result" step
+MAX_STEPS_PER_TURN = 20
+
+
+class AsyncWeatherAgent:
+    """
+    Async agent engine with per-session histories.
+
+    The LLM client, the wttr.in HTTP client and the weather cache are shared
+    by all sessions, so connections are pooled and reused across conversations.
+    Histories live in a SessionStore, so several agent processes (behind a load
+    balancer) can serve the same sessions and a restart loses none of them.
+    """
+
+    def __init__(self, llm_client=None, http_client=None, model=MODEL_NAME,
+                 weather_base_url=WEATHER_BASE_URL, max_connections=100, cache=weather_cache,
+                 limiter=shared_limiter, session_store=sessions):
+        self.model = model
+        self.limiter = limiter
+        self.weather_base_url = weather_base_url
+        self.cache = cache
+        # owned by the agent (closed in aclose), so not the shared cached client
+        self.llm = llm_client or create_client("gemini", asynchronous=True, max_retries=0)
+        self.http = http_client or httpx.AsyncClient(
+            timeout=httpx.Timeout(10.0),
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=20),
+        )
+        self.sessions = session_store
+        self.prefetch_stats = Counter()
+        self.tools = {
+            "get_weather": self.get_weather,
+            "run_command": self.run_command,
+        }
+
+    # ------------------ Tools ------------------
+    async def fetch_weather(self, city: str) -> str:
+        response = await self.http.get(f"{self.weather_base_url}/{city}", params={"format": "%C %t"})
+        response.raise_for_status()
+        return response.text.strip()
+
+    async def get_weather(self, city: str) -> str:
+        print('🔨tool called: get_weather', city)
+        try:
+            return await self.cache.aget_or_fetch(city, self.fetch_weather)
+        except httpx.HTTPError:
+            return "Could not fetch weather data at this time."
+
+    async def run_command(self, command: str):
+        # runs as an asyncio subprocess, other sessions keep going meanwhile
+        return (await run_command_async(command)).as_dict()
+
+    # ------------------ Sessions ------------------
+    async def session(self, session_id: str) -> list:
+        """
+        Returns the message history of a session, creating it on first use.
+        Only the recent window of a long session is loaded.
+        """
+        return await self.sessions.aget(session_id, [{"role": "system", "content": system_prompt}])
+
+    async def end_session(self, session_id: str):
+        await self.sessions.adelete(session_id)
+
+    async def ask(self, session_id: str, query: str):
+        """
+        Resolve one user query inside a session and return the final answer.
+        """
+        messages = await self.session(session_id)
+        messages.append({"role": "user", "content": query})
+        # per turn, so concurrent sessions never discard each other's lookups
+        prefetcher = AsyncWeatherPrefetcher(lambda city: self.cache.aget_or_fetch(city, self.fetch_weather))
+        if PREFETCH:
+            prefetcher.from_text(query)
+        try:
+            return await self._run_steps(messages, prefetcher)
+        finally:
+            prefetcher.discard()
+            self.prefetch_stats.update(prefetcher.stats())
+            # one small append-only transaction per turn
+            await self.sessions.asave(messages)
+
+    async def _run_steps(self, messages, prefetcher):
+        invalid = 0
+        for _ in range(MAX_STEPS_PER_TURN):
+            history.compact(messages)
+            response = await acall_with_retry(
+                lambda: self.llm.chat.completions.create(
+                    model=self.model,
+                    response_format={"type": "json_object"},
+                    messages=messages,
+                ),
+                limiter=self.limiter,
+                tokens=history.total_tokens(messages),
+            )
+            try:
+                parsed_response = check_object(json.loads(response.choices[0].message.content))
+            except (TypeError, ValueError) as e:
+                # the position goes back to the model, which gets another try
+                invalid += 1
+                if invalid >= MAX_INVALID_REPLIES:
+                    return None
+                messages.append({"role": "assistant", "content": json.dumps(
+                    {"step": "observe", "content": parse_error_message(e)})})
+                continue
+            invalid = 0
+            messages.append({"role": "assistant", "content": json.dumps(parsed_response)})
+
+            step = parsed_response.get("step")
+            if step == "result":
+                return parsed_response.get("content")
+            if step == "action":
+                function_name = parsed_response.get("function")
+                tool_fn = self.tools.get(function_name)
+                if tool_fn is None:
+                    messages.append({"role": "assistant", "content": f"Observation: Function {function_name} not found."})
+                    return None
+                tool_input = parsed_response.get("tool_input")
+                observation = await prefetcher.take(tool_input) if function_name == "get_weather" else None
+                if observation is None:
+                    observation = await tool_fn(tool_input)
+                messages.append({"role": "assistant", "content": json.dumps({"step": "observe", "content": observation})})
+            elif PREFETCH:
+                prefetcher.from_text(parsed_response.get("content", ""))
+
+        return None
+
+    async def aclose(self):
+        await self.http.aclose()
+        await self.llm.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+
+async def main():
+    async with AsyncWeatherAgent() as agent:
+        while True:
+            query = await asyncio.to_thread(input, "> ")
+            if query.lower() in ["exit", "quit"]:
+                break
+            answer = await agent.ask("cli", query)
+            print(f"Final Answer: {answer}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,155 @@
+# batch_runner.py
+# Offline batch mode for the step-protocol agents: queries are streamed from a
+# JSONL file through a bounded pool of concurrent conversations, and every
+# result is appended to a JSONL file as soon as it is done.
+#
+# - memory stays flat: the input is read lazily, only `workers * 2` queries
+#   are in flight at once and only the id and step count of finished ones
+#   are kept
+# - resumable: queries already answered in the output file are skipped, so an
+#   interrupted run continues where it stopped (failed ones are retried)
+# - the shared rate limiter still applies, so the pool cannot exceed the quota
+#
+# input lines:  {"id": "q1", "query": "what is 3 + 4 * 2"}  or just "what is 3 + 4 * 2"
+# output lines: {"id": "q1", "query": ..., "answer": ..., "steps": 6, "seconds": 1.2}
+#               (+ "error" when the conversation failed)
+import json
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+
+from metrics import percentile
+
+DEFAULT_WORKERS = int(os.getenv("BATCH_WORKERS", "8"))
+
+
+def read_queries(path: str):
+    """
+    Yields (id, query) per input line; the id defaults to the line number.
+    """
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                item = json.loads(line)
+            except ValueError:
+                item = line  # plain text line
+            if isinstance(item, dict):
+                yield str(item.get("id", number)), item.get("query") or item.get("prompt", "")
+            else:
+                yield str(number), str(item)
+
+
+def finished_ids(path: str) -> set:
+    """
+    Ids answered in an earlier run. A line torn by a crash is cut off so new
+    results start on a fresh line.
+    """
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, "rb+") as f:
+        end = 0  # offset after the last complete line
+        for line in f:
+            if not line.endswith(b"\n"):
+                f.truncate(end)
+                break
+            end += len(line)
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if "error" not in record:
+                done.add(str(record.get("id")))
+    return done
+
+
+class BatchStats:
+    def __init__(self):
+        self.completed = 0
+        self.failed = 0
+        self.skipped = 0
+        self.steps = []  # per successful query; ints, small even for long runs
+        self.started = time.perf_counter()
+
+    def report(self) -> dict:
+        elapsed = time.perf_counter() - self.started
+        processed = self.completed + self.failed
+        return {
+            "completed": self.completed,
+            "failed": self.failed,
+            "skipped": self.skipped,
+            "elapsed_s": round(elapsed, 1),
+            "queries_per_minute": round(processed / elapsed * 60, 1) if elapsed else 0.0,
+            "steps_mean": round(sum(self.steps) / len(self.steps), 2) if self.steps else 0.0,
+            "steps_p50": percentile(self.steps, 50),
+            "steps_p95": percentile(self.steps, 95),
+            "steps_max": max(self.steps, default=0),
+        }
+
+
+def run_batch(solve, input_path: str, output_path: str, workers: int = DEFAULT_WORKERS,
+              on_progress=None) -> dict:
+    """
+    solve(query) -> (answer, steps) is called for every unanswered query,
+    from up to `workers` threads. Returns the stats report.
+    """
+    stats = BatchStats()
+    done = finished_ids(output_path)
+    lock = threading.Lock()
+
+    def one(query_id, query):
+        start = time.perf_counter()
+        record = {"id": query_id, "query": query}
+        try:
+            answer, steps = solve(query)
+            record.update(answer=answer, steps=steps)
+        except Exception as e:
+            record["error"] = f"{e.__class__.__name__}: {e}"
+        record["seconds"] = round(time.perf_counter() - start, 3)
+        return record
+
+    with open(output_path, "a", encoding="utf-8") as out, ThreadPoolExecutor(max_workers=workers) as pool:
+        def write(record):
+            with lock:
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                out.flush()  # a crash loses at most the in-flight queries
+                if "error" in record:
+                    stats.failed += 1
+                else:
+                    stats.completed += 1
+                    stats.steps.append(record["steps"])
+            if on_progress is not None:
+                on_progress(record, stats)
+
+        pending = set()
+        try:
+            for query_id, query in read_queries(input_path):
+                if query_id in done:
+                    stats.skipped += 1
+                    continue
+                # bounded window: wait for a slot before reading further
+                if len(pending) >= workers * 2:
+                    finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        write(future.result())
+                pending.add(pool.submit(one, query_id, query))
+            for future in as_completed(pending):
+                write(future.result())
+        except KeyboardInterrupt:
+            # queued work is dropped; finished results are on disk already
+            for future in pending:
+                future.cancel()
+            raise
+    return stats.report()
+
+
+def print_report(report: dict):
+    print(f"\n{report['completed']} answered, {report['failed']} failed, {report['skipped']} skipped "
+          f"(done in an earlier run) in {report['elapsed_s']}s")
+    print(f"throughput: {report['queries_per_minute']} queries/minute")
+    print(f"steps per query: mean {report['steps_mean']}, p50 {report['steps_p50']}, "
+          f"p95 {report['steps_p95']}, max {report['steps_max']}")
@@ -0,0 +1,236 @@
+# bench_agents.py
+# End-to-end benchmark of the agents on scripted scenarios, without network:
+# the model is the local mock server (mock_llm_server.py) or responses
+# recorded with llm_replay.py, weather lookups go to the mock wttr endpoint.
+#
+# Per scenario it reports model calls per task, wall time, time spent in
+# tools (summed over parallel tools) and peak Python memory, compares them
+# with bench_baseline.json and exits with status 1 on a regression.
+#
+#   python bench_agents.py                          # against the mock server
+#   python bench_agents.py --record fixtures/       # also store every scenario's traffic
+#   python bench_agents.py --replay fixtures/       # answer from the stored traffic
+#   python bench_agents.py --provider gemini --record fixtures/   # record the real model
+#   python bench_agents.py --update-baseline        # accept the current numbers
+#   python bench_agents.py cursor_plan_cache        # a subset (prerequisites run unmeasured)
+#
+# history_manager counts tokens with tiktoken; for runs without any network
+# its BPE files must already be in the tiktoken cache (TIKTOKEN_CACHE_DIR).
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from mock_llm_server import MockServer
+
+PORT = 8766
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_baseline.json")
+# wall time and memory may grow this much over the baseline before the run fails;
+# model calls per task must not grow at all (the mock answers deterministically)
+TOLERANCE = float(os.getenv("BENCH_TOLERANCE", "0.5"))
+# plus an absolute allowance, so scenarios that take a few ms are not flagged for noise
+SLACK = {"wall_s": 0.25, "peak_kb": 256}
+
+WORKDIR = tempfile.mkdtemp(prefix="bench_agents_")
+TRACE_PATH = os.path.join(WORKDIR, "trace.jsonl")
+
+# must be set before the agents are imported
+os.environ.setdefault("WEATHER_BASE_URL", f"http://127.0.0.1:{PORT}/wttr")
+os.environ.setdefault("GOOGLE_API_KEY", "mock")
+os.environ.setdefault("LLM_RPM", "1000000")
+os.environ.setdefault("LLM_TPM", "1000000000")
+os.environ["PLAN_CACHE_DIR"] = os.path.join(WORKDIR, "plan_cache")
+os.environ["LLM_CACHE_PATH"] = os.path.join(WORKDIR, "llm_cache.sqlite3")
+os.environ["SESSION_DB"] = os.path.join(WORKDIR, "sessions.sqlite3")
+os.environ["AGENT_TRACE"] = TRACE_PATH  # calls and tool time are read from the spans
+
+import httpx  # noqa: E402
+from openai import OpenAI  # noqa: E402
+
+import chat_3_auto  # noqa: E402
+import cursor_like_agent  # noqa: E402
+import weather_agent  # noqa: E402
+from llm_clients import PROVIDERS  # noqa: E402
+from llm_replay import FixtureStore, RecordingTransport, ReplayTransport  # noqa: E402
+from project_manifest import get_manifest  # noqa: E402
+from tracing import load_spans  # noqa: E402
+
+WEATHER_TASKS = [
+    "what is the weather of London?",
+    "what is the weather in New York?",
+    "what is the weather of Paris and Rome?",
+]
+COT_TASKS = ["what is 3 + 4 * 2", "is 91 a prime number?"]
+
+
+# ------------------ Scenarios ------------------
+# each takes the model client and returns (tasks, tasks that produced an answer)
+def cursor_scenario(project_name: str, language: str, engine: str, fresh: bool = True):
+    def run(client):
+        cursor_like_agent.client = client
+        cursor_like_agent.ENGINE = engine
+        cursor_like_agent.BASE_WORKDIR = WORKDIR
+        answers = iter([project_name, language, ""])
+        cursor_like_agent.run_interactive(fresh=fresh, ask=lambda prompt: next(answers, "y"))
+        manifest = get_manifest(os.path.join(WORKDIR, project_name))
+        return 1, int(manifest.completed)
+    return run
+
+
+def weather_json(client):
+    answers = 0
+    for task in WEATHER_TASKS:
+        weather_agent.weather_cache.clear()
+        answer = weather_agent.run_turn([{"role": "system", "content": weather_agent.system_prompt}], task,
+                                        client=client)
+        answers += answer is not None
+    return len(WEATHER_TASKS), answers
+
+
+def weather_tools(client):
+    engine = weather_agent.build_engine(client)
+    answers = 0
+    for task in WEATHER_TASKS:
+        weather_agent.weather_cache.clear()
+        answers += engine.run([{"role": "system", "content": weather_agent.tools_system_prompt}], task) is not None
+    return len(WEATHER_TASKS), answers
+
+
+def chain_of_thought(client):
+    answers = sum(chat_3_auto.solve(task, client=client) is not None for task in COT_TASKS)
+    return len(COT_TASKS), answers
+
+
+SCENARIOS = {
+    "cursor_json_fastapi": cursor_scenario("shop", "fastapi", "json"),
+    "cursor_tools_express": cursor_scenario("blog", "express", "tools"),
+    # same spec as cursor_json_fastapi under another name: replayed from the plan cache
+    "cursor_plan_cache": cursor_scenario("store", "fastapi", "json", fresh=False),
+    "weather_json": weather_json,
+    "weather_tools": weather_tools,
+    "chat_3_auto": chain_of_thought,
+}
+# scenarios that only work after another one ran in the same process; when it
+# is not selected it runs first, unmeasured
+PREREQUISITES = {"cursor_plan_cache": "cursor_json_fastapi"}
+
+
+# ------------------ Runner ------------------
+def make_client(args, server_url: str, scenario: str):
+    if args.provider == "mock":
+        base_url, api_key = f"{server_url}/v1", "mock"
+    else:
+        config = PROVIDERS[args.provider]
+        base_url = config["base_url"]
+        api_key = os.getenv(config["api_key_env"]) if config["api_key_env"] else config["api_key"]
+    transport = None
+    if args.record:
+        path = os.path.join(args.record, f"{scenario}.jsonl")
+        if os.path.exists(path):
+            os.remove(path)  # a recording replaces the previous one
+        transport = RecordingTransport(FixtureStore(path))
+    elif args.replay:
+        transport = ReplayTransport(FixtureStore(os.path.join(args.replay, f"{scenario}.jsonl")))
+    http_client = httpx.Client(transport=transport) if transport else None
+    return OpenAI(api_key=api_key or "replay", base_url=base_url, http_client=http_client, max_retries=0)
+
+
+def run_scenario(name, scenario, client, verbose: bool) -> dict:
+    spans_before = len(load_spans(TRACE_PATH))
+    output = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        with output:
+            tasks, answered = scenario(client)
+    finally:
+        wall = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    spans = load_spans(TRACE_PATH)[spans_before:]
+    calls = sum(span["kind"] == "llm" for span in spans)
+    return {
+        "tasks": tasks,
+        "answered": answered,
+        "calls_per_task": round(calls / tasks, 2),
+        "wall_s": round(wall, 3),
+        "tool_s": round(sum(span["ms"] for span in spans if span["kind"] == "tool") / 1000, 3),
+        "peak_kb": round(peak / 1024),
+    }
+
+
+def regressions(results: dict, baseline: dict) -> list:
+    problems = []
+    for name, result in results.items():
+        if result["answered"] < result["tasks"]:
+            problems.append(f"{name}: only {result['answered']}/{result['tasks']} tasks finished")
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if result["calls_per_task"] > base["calls_per_task"]:
+            problems.append(f"{name}: {result['calls_per_task']} model calls/task, baseline {base['calls_per_task']}")
+        for metric in ("wall_s", "peak_kb"):
+            limit = base[metric] * (1 + TOLERANCE) + SLACK[metric]
+            if result[metric] > limit:
+                problems.append(f"{name}: {metric} {result[metric]} over the limit {limit:.3f} "
+                                f"(baseline {base[metric]} + {TOLERANCE:.0%} + {SLACK[metric]})")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end agent benchmark with regression checks")
+    parser.add_argument("scenarios", nargs="*", help=f"subset of {', '.join(SCENARIOS)}")
+    parser.add_argument("--provider", default="mock", choices=["mock", *PROVIDERS])
+    parser.add_argument("--record", metavar="DIR", help="store each scenario's model traffic in DIR")
+    parser.add_argument("--replay", metavar="DIR", help="answer model calls from traffic stored in DIR")
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--verbose", action="store_true", help="show the agents' output")
+    args = parser.parse_args()
+    names = args.scenarios or list(SCENARIOS)
+
+    # the tokenizer tables are loaded once per process, not part of any scenario
+    weather_agent.history.total_tokens([{"role": "user", "content": "warm up"}])
+
+    results = {}
+    # the mock also serves the weather lookups, so it runs in every mode
+    with MockServer(port=PORT) as server:
+        for name in names:
+            needed = PREREQUISITES.get(name)
+            if needed and needed not in results:
+                print(f"{name}: running {needed} first to seed it (not measured)")
+                seed_args = argparse.Namespace(**{**vars(args), "record": None})  # keep its recording
+                run_scenario(needed, SCENARIOS[needed], make_client(seed_args, server.url, needed), args.verbose)
+            results[name] = run_scenario(name, SCENARIOS[name], make_client(args, server.url, name), args.verbose)
+
+    print(f"\n{'scenario':<22}{'tasks':>6}{'ok':>4}{'calls/task':>11}{'wall s':>9}{'tool s':>9}{'peak KB':>9}")
+    for name, r in results.items():
+        print(f"{name:<22}{r['tasks']:>6}{r['answered']:>4}{r['calls_per_task']:>11.2f}{r['wall_s']:>9.3f}"
+              f"{r['tool_s']:>9.3f}{r['peak_kb']:>9}")
+
+    baseline = {}
+    if os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH, encoding="utf-8") as f:
+            baseline = json.load(f)
+    if args.update_baseline:
+        baseline.update(results)
+        with open(BASELINE_PATH, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"\nbaseline updated: {BASELINE_PATH}")
+        return 0
+
+    problems = regressions(results, baseline)
+    for problem in problems:
+        print("REGRESSION:", problem)
+    if not problems:
+        print("\nno regressions against", os.path.basename(BASELINE_PATH))
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,76 @@
+# bench_embeddings.py
+# EmbeddingService vs calling the embeddings endpoint once per text, against
+# the local mock server (no network, no API key needed). The workload repeats
+# texts like real traffic does: the same queries and unchanged chunks come back.
+#
+#   1. single texts from many threads: embed_text() per request vs the
+#      coalescing service (cold cache)
+#   2. the same requests after a restart (warm on-disk cache)
+#   3. a document collection with duplicate chunks: embed_texts() vs service.embed()
+#
+#   python bench_embeddings.py [requests]
+import random
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from openai import OpenAI
+
+from embedding_service import EmbeddingService
+from embeddings import embed_text, embed_texts
+from mock_llm_server import MockServer
+
+PORT = 8767
+REQUESTS = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+THREADS = 32
+DISTINCT = 300
+
+
+def workload(count: int, distinct: int, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    texts = [f"question {i}: what is the weather of city number {i}?" for i in range(distinct)]
+    return [rng.choice(texts) for _ in range(count)]
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def run_threads(fn, texts):
+    with ThreadPoolExecutor(THREADS) as pool:
+        return np.asarray(list(pool.map(fn, texts)), dtype=np.float32)
+
+
+if __name__ == "__main__":
+    queries = workload(REQUESTS, DISTINCT)
+    chunks = workload(REQUESTS * 4, REQUESTS, seed=1)
+    cache_dir = tempfile.mkdtemp(prefix="bench_embeddings_")
+    try:
+        with MockServer(port=PORT) as server:
+            client = OpenAI(api_key="mock", base_url=f"{server.url}/v1")
+
+            naive, naive_seconds = timed(lambda: run_threads(lambda text: embed_text(text, client=client), queries))
+            cold = EmbeddingService(client=client, cache_dir=cache_dir)
+            coalesced, cold_seconds = timed(lambda: run_threads(cold.embed_text, queries))
+            warm = EmbeddingService(client=client, cache_dir=cache_dir)  # a restarted process
+            restarted, warm_seconds = timed(lambda: run_threads(warm.embed_text, queries))
+
+            _, plain_batch_seconds = timed(lambda: embed_texts(chunks, client=client))
+            batch = EmbeddingService(client=client, cache_dir=cache_dir)
+            _, batch_seconds = timed(lambda: batch.embed(chunks))
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+    same = np.allclose(naive, coalesced) and np.allclose(naive, restarted)
+    print(f"{REQUESTS} single-text requests ({DISTINCT} distinct texts, {THREADS} threads), same vectors: {same}")
+    print(f"  one call per text : {naive_seconds * 1000:8.1f} ms, {REQUESTS} API calls")
+    print(f"  service, cold     : {cold_seconds * 1000:8.1f} ms, {cold.stats()}")
+    print(f"  service, restart  : {warm_seconds * 1000:8.1f} ms, {warm.stats()}")
+    print(f"{len(chunks)} chunks ({len(set(chunks))} distinct)")
+    print(f"  embed_texts       : {plain_batch_seconds * 1000:8.1f} ms, {-(-len(chunks) // 2048)} API calls")
+    print(f"  service.embed     : {batch_seconds * 1000:8.1f} ms, {batch.stats()}")
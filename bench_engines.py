@@ -0,0 +1,76 @@
+# bench_engines.py
+# Same scripted weather tasks through both agent engines against the local
+# mock LLM server: the JSON step protocol (weather_agent.run_turn) and native
+# function calling (FunctionCallingEngine). Counts model calls and latency.
+#
+#   python bench_engines.py [repeats]
+import os
+import sys
+import time
+
+from mock_llm_server import MockServer
+
+PORT = 8765
+REPEATS = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+
+# must be set before weather_agent is imported
+os.environ.setdefault("WEATHER_BASE_URL", f"http://127.0.0.1:{PORT}/wttr")
+os.environ.setdefault("GOOGLE_API_KEY", "mock")
+os.environ.setdefault("LLM_RPM", "1000000")
+os.environ.setdefault("LLM_TPM", "1000000000")
+os.environ.setdefault("WEATHER_PREFETCH", "0")  # compare the engines alone
+
+from openai import OpenAI  # noqa: E402
+
+import weather_agent  # noqa: E402
+
+TASKS = [
+    "what is the weather of London?",
+    "what is the weather in New York?",
+    "what is the weather of Paris and Rome?",
+]
+
+
+class CountingClient:
+    """
+    Counts chat.completions.create calls of the wrapped client.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.calls = 0
+        self.chat = self
+        self.completions = self
+
+    def create(self, **params):
+        self.calls += 1
+        return self.client.chat.completions.create(**params)
+
+
+def bench(base_url, engine: str):
+    client = CountingClient(OpenAI(api_key="mock", base_url=f"{base_url}/v1"))
+    tools_engine = weather_agent.build_engine(client)
+    latencies = []
+    for _ in range(REPEATS):
+        for task in TASKS:
+            weather_agent.weather_cache.clear()
+            start = time.perf_counter()
+            if engine == "tools":
+                tools_engine.run([{"role": "system", "content": weather_agent.tools_system_prompt}], task)
+            else:
+                weather_agent.run_turn([{"role": "system", "content": weather_agent.system_prompt}], task,
+                                       client=client)
+            latencies.append(time.perf_counter() - start)
+    return client.calls, latencies
+
+
+if __name__ == "__main__":
+    with MockServer(port=PORT) as server:
+        results = {engine: bench(server.url, engine) for engine in ("json", "tools")}
+
+    queries = REPEATS * len(TASKS)
+    print(f"\nqueries: {queries} ({len(TASKS)} tasks x {REPEATS})")
+    for engine, (calls, latencies) in results.items():
+        latencies.sort()
+        print(f"{engine:<6} engine: {calls / queries:.2f} model calls/query, "
+              f"p50 {latencies[len(latencies) // 2] * 1000:.0f} ms, total {sum(latencies):.2f}s")
@@ -0,0 +1,91 @@
+# bench_ollama_api.py
+# Load test for ollama_api.py against the stub Ollama server in mock_llm_server.py.
+# Compares the async app with the previous blocking design (sync route +
+# ollama.Client running in FastAPI's threadpool). Stub, apps and load
+# generator each run in their own process. Requests rejected with 429 by the
+# micro-batching queue count as failed.
+#
+#   python bench_ollama_api.py [requests] [concurrency]
+import asyncio
+import os
+import sys
+import time
+
+import httpx
+from fastapi import Body, FastAPI
+
+from mock_llm_server import ServerProcess
+
+STUB_PORT, APP_PORT, SYNC_APP_PORT = 8766, 8767, 8768
+SLOTS = os.getenv("OLLAMA_NUM_PARALLEL", "16")
+
+ENV = {
+    "OLLAMA_HOST": f"http://127.0.0.1:{STUB_PORT}",
+    "OLLAMA_NUM_PARALLEL": SLOTS,
+    "MOCK_OLLAMA_PARALLEL": SLOTS,
+}
+
+
+def build_sync_app():
+    """
+    The pre-async ollama_api.py route, for comparison.
+    """
+    from ollama import Client
+
+    sync_app = FastAPI()
+    client = Client(host=os.environ["OLLAMA_HOST"])
+
+    @sync_app.post("/chat")
+    def chat(message: str = Body(...)):
+        response = client.chat(
+            model="gemma3:1b",
+            messages=[
+                {"role": "system", "content": "You are a helpful assistant."},
+                {"role": "user", "content": message}
+            ]
+        )
+        return {"response": response['message']['content']}
+
+    return sync_app
+
+
+async def load_test(url: str, requests: int, concurrency: int):
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60) as http:
+        queue = asyncio.Queue()
+        for i in range(requests):
+            queue.put_nowait(f"hello {i}")
+        failures = 0
+
+        async def worker():
+            nonlocal failures
+            while not queue.empty():
+                message = queue.get_nowait()
+                try:
+                    response = await http.post("/chat", json=message)
+                    failures += response.status_code != 200
+                except httpx.HTTPError:
+                    failures += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    return requests / elapsed, failures
+
+
+if __name__ == "__main__":
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 64
+
+    with ServerProcess("mock_llm_server:app", port=STUB_PORT, env=ENV):
+        with ServerProcess("bench_ollama_api:build_sync_app", port=SYNC_APP_PORT, env=ENV, factory=True) as server:
+            sync_rps, sync_failures = asyncio.run(load_test(server.url, requests, concurrency))
+        with ServerProcess("ollama_api:app", port=APP_PORT, env=ENV) as server:
+            async_rps, async_failures = asyncio.run(load_test(server.url, requests, concurrency))
+            batcher_stats = httpx.get(f"{server.url}/metrics/batcher").json()
+
+    print(f"requests: {requests}, concurrency: {concurrency}, ollama slots: {SLOTS}")
+    print(f"sync app : {sync_rps:7.1f} req/s ({sync_failures} failed)")
+    print(f"async app: {async_rps:7.1f} req/s ({async_failures} failed)")
+    print(f"speedup  : {async_rps / sync_rps:.2f}x")
+    print(f"batcher  : {batcher_stats}")
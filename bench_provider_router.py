@@ -0,0 +1,51 @@
+# bench_provider_router.py
+# ProviderRouter against two local mock backends (no network, no API key):
+# a slower "gemini" that throttles part of its requests with 429, and a
+# faster local "ollama". Shows where requests went, the failovers and the
+# per-backend p50/p95 and error rate.
+#
+#   python bench_provider_router.py [requests] [gemini 429 rate]
+import sys
+import time
+from collections import Counter
+
+from openai import OpenAI
+
+from mock_llm_server import ServerProcess
+from provider_router import Backend, ProviderRouter
+
+GEMINI_PORT, OLLAMA_PORT = 8771, 8772
+
+
+def backend(name: str, server, model: str) -> Backend:
+    client = OpenAI(api_key="mock", base_url=f"{server.url}/v1", max_retries=0)
+    return Backend(name, client, model)
+
+
+if __name__ == "__main__":
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    throttle = sys.argv[2] if len(sys.argv) > 2 else "0.3"
+
+    gemini_env = {"MOCK_LLM_LATENCY": "0.04", "MOCK_LLM_429_RATE": throttle, "MOCK_LLM_RETRY_AFTER": "0.5"}
+    ollama_env = {"MOCK_LLM_LATENCY": "0.06"}
+    with ServerProcess("mock_llm_server:app", port=GEMINI_PORT, env=gemini_env) as gemini, \
+            ServerProcess("mock_llm_server:app", port=OLLAMA_PORT, env=ollama_env) as ollama:
+        router = ProviderRouter([
+            backend("gemini", gemini, "gemini-2.5-flash"),
+            backend("ollama", ollama, "gemma3:1b"),
+        ])
+        served_by = Counter()
+        failed = 0
+        start = time.perf_counter()
+        for i in range(requests):
+            try:
+                response = router.create(messages=[{"role": "user", "content": f"weather of city {i}?"}])
+                served_by[response.model] += 1
+            except Exception:
+                failed += 1
+        elapsed = time.perf_counter() - start
+
+    print(f"requests: {requests} in {elapsed:.2f}s, gemini 429 rate: {throttle}, failed: {failed}")
+    print(f"served by: {dict(served_by)}, failovers: {router.failovers}")
+    for name, stats in router.stats().items():
+        print(f"{name:<7} {stats}")
@@ -0,0 +1,48 @@
+# bench_startup.py
+# Cold-start cost of the agent modules, measured with `python -X importtime`
+# in a fresh interpreter per module. Reports the cumulative import time and
+# which heavy SDKs got pulled in at import (with llm_clients they should only
+# load on the first request).
+#
+#   python bench_startup.py [runs]
+import os
+import statistics
+import subprocess
+import sys
+
+MODULES = ["weather_agent", "async_weather_agent", "cursor_like_agent", "history_manager", "llm_clients"]
+HEAVY = ["openai", "google.genai", "requests", "tiktoken", "numpy", "httpx"]
+
+
+def import_profile(module: str) -> dict:
+    """
+    {imported module: cumulative microseconds} for `import module`.
+    """
+    env = {**os.environ, "GOOGLE_API_KEY": os.getenv("GOOGLE_API_KEY", "mock")}
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, env=env, cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+    profile = {}
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        profile[name.strip()] = int(cumulative)
+    return profile
+
+
+if __name__ == "__main__":
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+
+    print(f"{'module':<22} {'median ms':>10} {'min ms':>8}  heavy SDKs imported")
+    for module in MODULES:
+        times, loaded = [], []
+        for _ in range(runs):
+            profile = import_profile(module)
+            times.append(profile[module] / 1000)
+            loaded = [sdk for sdk in HEAVY if sdk in profile]
+        print(f"{module:<22} {statistics.median(times):10.1f} {min(times):8.1f}  {', '.join(loaded) or '-'}")
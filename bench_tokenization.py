@@ -0,0 +1,56 @@
+# bench_tokenization.py
+# Tokens/second of tokenization.py on a multi-megabyte corpus built from the
+# repo's own sources: one big encode() vs encode_batch() across threads vs the
+# streaming file counter. Needs the tiktoken BPE table (downloaded on first use).
+#
+#   python bench_tokenization.py [megabytes]
+import glob
+import os
+import sys
+import tempfile
+import time
+
+from tokenization import DEFAULT_MODEL, ENCODE_THREADS, count_file_tokens, encode_batch, get_encoder
+
+
+def build_corpus(megabytes: float) -> str:
+    sources = []
+    for path in sorted(glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)), "*.py"))):
+        with open(path, encoding="utf-8") as f:
+            sources.append(f.read())
+    seed = "\n".join(sources)
+    repeats = int(megabytes * 1024 * 1024 / max(1, len(seed))) + 1
+    return seed * repeats
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    megabytes = float(sys.argv[1]) if len(sys.argv) > 1 else 8
+
+    _, load_seconds = timed(lambda: get_encoder(DEFAULT_MODEL))
+    corpus = build_corpus(megabytes)
+    lines = corpus.splitlines(keepends=True)
+    # ~64 KB documents, the unit encode_batch parallelizes over
+    documents = ["".join(lines[i:i + 1500]) for i in range(0, len(lines), 1500)]
+    encoder = get_encoder(DEFAULT_MODEL)
+
+    tokens, single = timed(lambda: len(encoder.encode(corpus, disallowed_special=())))
+    _, batched = timed(lambda: encode_batch(documents, num_threads=ENCODE_THREADS))
+
+    with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False, encoding="utf-8") as f:
+        f.write(corpus)
+    try:
+        file_tokens, streamed = timed(lambda: count_file_tokens(f.name))
+    finally:
+        os.unlink(f.name)
+
+    print(f"corpus: {len(corpus) / 1024 / 1024:.1f} MB, {tokens:,} tokens, {len(documents)} documents")
+    print(f"encoder load  : {load_seconds * 1000:8.1f} ms")
+    print(f"encode()      : {tokens / single:12,.0f} tokens/s")
+    print(f"encode_batch  : {tokens / batched:12,.0f} tokens/s ({ENCODE_THREADS} threads)")
+    print(f"file counter  : {file_tokens / streamed:12,.0f} tokens/s (matches: {file_tokens == tokens})")
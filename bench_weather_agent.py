@@ -0,0 +1,91 @@
+# bench_weather_agent.py
+# Compares the blocking weather_agent loop with the asyncio engine against
+# the local mock LLM server (no network, no API key needed), and the sync
+# loop with and without speculative weather prefetch (a different city per
+# conversation, so every lookup misses the cache).
+#
+#   python bench_weather_agent.py [conversations]
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+from mock_llm_server import MockServer
+
+PORT = 8765
+CONVERSATIONS = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+
+# must be set before weather_agent is imported
+os.environ.setdefault("WEATHER_BASE_URL", f"http://127.0.0.1:{PORT}/wttr")
+os.environ.setdefault("GOOGLE_API_KEY", "mock")
+# the mock server has no quota, don't let the client-side limiter throttle it
+os.environ.setdefault("LLM_RPM", "1000000")
+os.environ.setdefault("LLM_TPM", "1000000000")
+# conversations are persisted like in production, but not next to the code
+os.environ.setdefault("SESSION_DB", os.path.join(tempfile.mkdtemp(prefix="bench_sessions_"), "sessions.sqlite3"))
+
+import httpx  # noqa: E402
+from openai import AsyncOpenAI, OpenAI  # noqa: E402
+
+import weather_agent  # noqa: E402
+from async_weather_agent import AsyncWeatherAgent  # noqa: E402
+
+QUERY = "what is the weather of London?"
+
+
+def bench_sync(base_url):
+    client = OpenAI(api_key="mock", base_url=f"{base_url}/v1")
+    start = time.perf_counter()
+    for _ in range(CONVERSATIONS):
+        messages = [{"role": "system", "content": weather_agent.system_prompt}]
+        weather_agent.run_turn(messages, QUERY, client=client)
+    return time.perf_counter() - start
+
+
+async def bench_async(base_url):
+    llm = AsyncOpenAI(api_key="mock", base_url=f"{base_url}/v1")
+    async with AsyncWeatherAgent(llm_client=llm, http_client=httpx.AsyncClient()) as agent:
+        start = time.perf_counter()
+        await asyncio.gather(*(agent.ask(f"session-{i}", QUERY) for i in range(CONVERSATIONS)))
+        return time.perf_counter() - start
+
+
+def city_name(i: int, prefix: str) -> str:
+    # letters only, the mock model (like a real one) drops digits from city names
+    letters = ""
+    while True:
+        letters = chr(ord("a") + i % 26) + letters
+        i //= 26
+        if not i:
+            return f"{prefix}{letters}ville"
+
+
+def bench_prefetch(base_url, enabled: bool):
+    client = OpenAI(api_key="mock", base_url=f"{base_url}/v1")
+    weather_agent.PREFETCH = enabled
+    weather_agent.weather_cache.clear()
+    start = time.perf_counter()
+    for i in range(CONVERSATIONS):
+        messages = [{"role": "system", "content": weather_agent.system_prompt}]
+        city = city_name(i, "Pre" if enabled else "Plain")
+        weather_agent.run_turn(messages, f"what is the weather of {city}?", client=client)
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    with MockServer(port=PORT) as server:
+        sync_seconds = bench_sync(server.url)
+        async_seconds = asyncio.run(bench_async(server.url))
+        cache_stats = weather_agent.weather_cache.stats()
+        plain_seconds = bench_prefetch(server.url, enabled=False)
+        prefetch_seconds = bench_prefetch(server.url, enabled=True)
+
+    print(f"\nconversations: {CONVERSATIONS}")
+    print(f"sync loop : {sync_seconds:.2f}s  ({CONVERSATIONS / sync_seconds:.1f} conv/s)")
+    print(f"async     : {async_seconds:.2f}s  ({CONVERSATIONS / async_seconds:.1f} conv/s)")
+    print(f"speedup   : {sync_seconds / async_seconds:.1f}x")
+    print(f"weather cache: {cache_stats}")
+    print(f"no prefetch: {plain_seconds:.2f}s, prefetch: {prefetch_seconds:.2f}s "
+          f"({(plain_seconds - prefetch_seconds) / CONVERSATIONS * 1000:.1f} ms saved per conversation)")
+    print(f"prefetcher : {dict(weather_agent.prefetch_stats)}")
@@ -1,17 +1,18 @@
-from dotenv import load_dotenv
-from openai import OpenAI
+from llm_clients import lazy_client
+from streaming import stream_completion
 
-load_dotenv()
+client = lazy_client("openai")
 
-client = OpenAI()
-
-result = client.chat.completions.create(
+print('chat completion response: ', end='', flush=True)
+# stream=True: tokens are printed as soon as they are generated
+result = stream_completion(
+    client,
     model="gpt-4o",
     messages=[
         {"role": "user", "content": "Hello! Can you provide a brief overview of the Eiffel Tower?"} # zero shot prompting
     ]
 )
 
-print('chat completion response:', result.choices[0].message.content)
+print()
 
 # single shot prompting where we provide only the user query to the model
\ No newline at end of file
@@ -1,9 +1,7 @@
-from dotenv import load_dotenv
-from openai import OpenAI
+from llm_clients import lazy_client
+from streaming import stream_completion
 
-load_dotenv()
-
-client = OpenAI()
+client = lazy_client("openai")
 
 system_prompt = """
 You are An AI assistant specialized in Maths.
@@ -23,7 +21,10 @@ Output: Sorry, I can only help with Maths related questions.
 # system prompts are used to provide context to the model about its role in the conversation
 # the above is called few short prompting where we provide examples to the model about how to respond to user queries
 
-result = client.chat.completions.create(
+print('chat completion response: ', end='', flush=True)
+# stream=True: tokens are printed as soon as they are generated
+result = stream_completion(
+    client,
     model="gpt-4o",
     # temperature=0.7,
     # max_tokens=150,
@@ -33,4 +34,4 @@ result = client.chat.completions.create(
     ]
 )
 
-print('chat completion response:', result.choices[0].message.content)
\ No newline at end of file
+print()
\ No newline at end of file
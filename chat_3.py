@@ -1,9 +1,7 @@
-from dotenv import load_dotenv
-from openai import OpenAI
+from llm_clients import lazy_client
+from streaming import stream_completion
 
-load_dotenv()
-
-client = OpenAI()
+client = lazy_client("openai")
 
 system_prompt = """
 You are an AI assistant who is expert in breaking down complex problems into simpler steps for better understanding and then resolve the user query.
@@ -37,7 +35,10 @@ Output: {{step: "result", content: "2+2 equals 4 and that is calculated by addin
 
 # the above is called as chai of though t prompting where the model is guided to think step by step
 
-result = client.chat.completions.create(
+print('chat completion response: ', end='', flush=True)
+# stream=True: tokens are printed as soon as they are generated
+result = stream_completion(
+    client,
     model="gpt-4o",
     response_format={"type": "json_object"},
     messages=[
@@ -46,4 +47,4 @@ result = client.chat.completions.create(
     ]
 )
 
-print('chat completion response:', result.choices[0].message.content)
+print()
@@ -1,14 +1,30 @@
-from dotenv import load_dotenv
-from openai import OpenAI
+import argparse
 import json
 import os
 
-load_dotenv()
+from batch_runner import DEFAULT_WORKERS, print_report, run_batch
+from history_manager import HistoryManager
+from llm_clients import lazy_client, load_env
+from provider_router import router_from_env
+from rate_limiter import call_with_retry, print_retry, shared_limiter
+from streaming import complete_text
+from tracing import tracer
 
-client = OpenAI(
-    api_key=os.getenv('GOOGLE_API_KEY'),
-    base_url="https://generativelanguage.googleapis.com/v1beta/openai/"
-)
+load_env()
+
+MODEL_NAME = "gemini-2.5-flash"
+history = HistoryManager(max_tokens=int(os.getenv("HISTORY_MAX_TOKENS", "8000")))
+# AGENT_STREAM=1 prints each step while the model is still generating it
+STREAM = os.getenv("AGENT_STREAM") == "1"
+# model replies per query before it is given up (the prompt asks for 5-7)
+MAX_STEPS = int(os.getenv("COT_MAX_STEPS", "20"))
+
+
+class StepLimitReached(Exception):
+    """Raised by run_steps when the model has not given a result after MAX_STEPS replies."""
+
+# LLM_ROUTE=gemini,ollama routes calls by latency with failover between backends
+client = router_from_env(response_cache=False) or lazy_client("gemini", max_retries=0, response_cache=False)
 
 system_prompt = """
 You are an AI assistant who is expert in breaking down complex problems into simpler steps for better understanding and then resolve the user query.
@@ -42,30 +58,93 @@ Output: {{step: "result", content: "2+2 equals 4 and that is calculated by addin
 
 # the above is called chain of thought prompting where the model is guided to think step by step
 
-messages = [
-    {"role": "system", "content": system_prompt},
-]
-
-query = input("> ")
-messages.append({"role": "user", "content": query})
-
-while True:
-    response = client.chat.completions.create(
-    model="gemini-2.5-flash",
-    response_format={"type": "json_object"},
-    messages = messages
-    )
-
-    print(response.choices[0].message.content)
-    parsed_response = json.loads(response.choices[0].message.content)
-    messages.append({"role": "assistant", "content": json.dumps(parsed_response)})
-
-    if parsed_response.get("step") == "result":
-        print(f"Final Answer: {parsed_response.get('content')}")
-        break
+def solve(query, client=client, messages=None, stream=STREAM):
+    """
+    Runs the analyse -> think -> Output -> Validate -> result loop for one
+    query and returns the final answer (None if it never reached a result).
+    messages (system prompt + history) is extended in place when given.
+    """
+    try:
+        answer, _ = run_steps(query, client=client, messages=messages, stream=stream)
+    except StepLimitReached as e:
+        print(e)
+        return None
+    return answer
+
+def run_steps(query, client=client, messages=None, stream=STREAM, echo=True, max_steps=MAX_STEPS):
+    """
+    Same as solve, returns (answer, number of model steps); echo=False keeps it quiet.
+    Raises StepLimitReached after max_steps replies without a result, so batch
+    mode records the query as failed.
+    """
+    if messages is None:
+        messages = [{"role": "system", "content": system_prompt}]
+    messages.append({"role": "user", "content": query})
+
+    steps = 0
+    while steps < max_steps:
+        history.compact(messages)
+        # AGENT_TRACE=trace.jsonl records latency/tokens/retries of every step
+        with tracer.span("llm", engine="cot", model=MODEL_NAME) as span:
+            content = call_with_retry(
+                lambda: complete_text(
+                    client,
+                    stream=stream,
+                    model=MODEL_NAME,
+                    response_format={"type": "json_object"},
+                    messages=messages
+                ),
+                limiter=shared_limiter,
+                tokens=history.total_tokens(messages),
+                on_retry=print_retry,
+            )
+
+            if echo and not stream:
+                print(content)
+            parsed_response = json.loads(content)
+            span.set(step=parsed_response.get("step"))
+        steps += 1
+        messages.append({"role": "assistant", "content": json.dumps(parsed_response)})
+
+        if parsed_response.get("step") == "result":
+            if echo:
+                print(f"Final Answer: {parsed_response.get('content')}")
+            return parsed_response.get("content"), steps
+        else:
+            if echo:
+                print(f"🧠: {parsed_response.get('content')}")
+            continue
+    raise StepLimitReached(f"no result after {max_steps} steps")
+
+def run_batch_file(input_path, output_path, workers=DEFAULT_WORKERS):
+    """
+    Batch mode: every query of a JSONL file through its own conversation,
+    `workers` at a time, results appended to output_path (resumable).
+    """
+    def progress(record, stats):
+        status = "ERROR " + record["error"] if "error" in record else f"{record['steps']} steps"
+        print(f"[{stats.completed + stats.failed}] {record['id']}: {status} ({record['seconds']}s)")
+
+    report = run_batch(lambda query: run_steps(query, stream=False, echo=False),
+                       input_path, output_path, workers=workers, on_progress=progress)
+    print_report(report)
+    return report
+
+if __name__ == "__main__":
+    # python chat_3_auto.py                      -> one query from the prompt
+    # python chat_3_auto.py --batch queries.jsonl [--out results.jsonl] [--workers 8]
+    parser = argparse.ArgumentParser(description="Chain-of-thought solver")
+    parser.add_argument("--batch", metavar="JSONL", help="queries to answer, one per line")
+    parser.add_argument("--out", metavar="JSONL", help="results file (default: <batch>.results.jsonl)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="concurrent conversations")
+    args = parser.parse_args()
+    if args.batch:
+        try:
+            run_batch_file(args.batch, args.out or os.path.splitext(args.batch)[0] + ".results.jsonl", args.workers)
+        except KeyboardInterrupt:
+            print("\nInterrupted. Run the same command again to resume.")
     else:
-        print(f"🧠: {parsed_response.get('content')}")
-        continue
+        solve(input("> "))
 
 
 # result = client.chat.completions.create(
@@ -1,13 +1,11 @@
-from dotenv import load_dotenv
-import os
-from google import genai
-from google.genai import types
+from llm_clients import get_genai_client
 
-load_dotenv()  # Loads variables from .env into environment
+# loads .env and imports google.genai only here
+client = get_genai_client()
 
-client = genai.Client(api_key=os.getenv('GOOGLE_API_KEY'))
-
-response = client.models.generate_content(
+# stream the answer chunk by chunk instead of waiting for the full text
+for chunk in client.models.generate_content_stream(
     model='gemini-2.5-flash-lite', contents='Why is the sky blue?'
-)
-print(response.text)
\ No newline at end of file
+):
+    print(chunk.text or "", end="", flush=True)
+print()
\ No newline at end of file
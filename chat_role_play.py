@@ -1,13 +1,8 @@
-from dotenv import load_dotenv
-from openai import OpenAI
-import os
+from llm_clients import lazy_client
+from streaming import stream_completion
 
-load_dotenv()
-
-client = OpenAI(
-    api_key=os.getenv('GOOGLE_API_KEY'),
-    base_url="https://generativelanguage.googleapis.com/v1beta/openai/"
-)
+# a conversation must not get the same reply twice, so no response cache
+client = lazy_client("gemini", response_cache=False)
 
 system_prompt = """
 You are Elon Musk. You are direct, use memes, love rockets and free speech.
@@ -15,7 +10,11 @@ You sometimes reply in all caps for emphasis.
 Never break character.
 """
 
-response = client.chat.completions.create(
+print("Input: Should I learn Python in 2025?")
+print("Elon Musk says: ", end="", flush=True)
+# stream=True: tokens are printed as soon as they are generated
+response = stream_completion(
+    client,
     model="gemini-2.5-flash",
     response_format={"type": "json_object"},
     messages=[
@@ -24,5 +23,4 @@ response = client.chat.completions.create(
     ]
 )
 
-print("Input: Should I learn Python in 2025?")
-print("Elon Musk says:", response.choices[0].message.content)
\ No newline at end of file
+print()
\ No newline at end of file
@@ -0,0 +1,214 @@
+# command_executor.py
+# Runs the agents' run_command tool in a bounded subprocess instead of os.system.
+#
+# - asyncio.create_subprocess_exec, so the agent loop keeps running meanwhile
+# - stdout/stderr are captured concurrently; only the first `max_output` bytes
+#   of each are kept, the rest is drained and counted so the pipe never fills up
+# - wall-clock timeout: the whole process group is killed when it expires
+# - CPU / memory / file size rlimits are applied in the child (POSIX only), by a
+#   small Python launcher that sets them and execs the shell. preexec_fn is
+#   not safe in a process with threads (the agents run tools from a pool)
+# - at most COMMAND_MAX_CONCURRENT commands run at once
+#
+#   result = await run_command_async("ls -la")
+#   result.as_dict()  -> {"exit_code": 0, "stdout": "...", "stderr": "", ...}
+import asyncio
+import os
+import signal
+import sys
+import threading
+import time
+import weakref
+
+try:
+    import resource
+except ImportError:  # Windows: no rlimits, timeout and output caps still apply
+    resource = None
+
+DEFAULT_TIMEOUT = float(os.getenv("COMMAND_TIMEOUT", "30"))
+DEFAULT_MAX_OUTPUT = int(os.getenv("COMMAND_MAX_OUTPUT", str(64 * 1024)))
+DEFAULT_CPU_SECONDS = int(os.getenv("COMMAND_CPU_SECONDS", "10"))
+DEFAULT_MEMORY_MB = int(os.getenv("COMMAND_MEMORY_MB", "512"))
+DEFAULT_FILE_SIZE_MB = int(os.getenv("COMMAND_FILE_SIZE_MB", "64"))
+MAX_CONCURRENT = int(os.getenv("COMMAND_MAX_CONCURRENT", "4"))
+READ_CHUNK = 8192
+# after a kill, how long to wait for the exit and the pipes (a daemonized
+# grandchild may keep them open forever)
+KILL_GRACE = 2.0
+
+
+class CommandResult:
+    def __init__(self, command: str):
+        self.command = command
+        self.exit_code = None
+        self.stdout = ""
+        self.stderr = ""
+        self.stdout_truncated = 0  # bytes dropped beyond max_output
+        self.stderr_truncated = 0
+        self.timed_out = False
+        self.error = None
+        self.duration = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return self.exit_code == 0 and not self.timed_out and self.error is None
+
+    def as_dict(self) -> dict:
+        """
+        Observation for the model: only the fields that carry information.
+        """
+        result = {"command": self.command, "exit_code": self.exit_code, "stdout": self.stdout,
+                  "stderr": self.stderr, "duration_s": round(self.duration, 3)}
+        if self.stdout_truncated:
+            result["stdout_truncated_bytes"] = self.stdout_truncated
+        if self.stderr_truncated:
+            result["stderr_truncated_bytes"] = self.stderr_truncated
+        if self.timed_out:
+            result["timed_out"] = True
+        if self.error:
+            result["error"] = self.error
+        return result
+
+
+# argv: cpu seconds, memory bytes, file size bytes (0 = no limit), then the
+# program to exec with its arguments. -I -S keeps its startup to a few ms
+_LAUNCHER = """
+import os, resource, sys
+for name, value in zip(("RLIMIT_CPU", "RLIMIT_AS", "RLIMIT_FSIZE"), map(int, sys.argv[1:4])):
+    if value:
+        resource.setrlimit(getattr(resource, name), (value, value))
+os.execv(sys.argv[4], sys.argv[4:])
+"""
+
+
+def _limited(argv, cpu_seconds: int, memory_bytes: int, file_size_bytes: int) -> list:
+    """
+    argv wrapped in the rlimit launcher.
+    """
+    return [sys.executable, "-I", "-S", "-c", _LAUNCHER,
+            str(cpu_seconds), str(memory_bytes), str(file_size_bytes), *argv]
+
+
+class _Capture:
+    """
+    Reads a pipe to EOF, keeping the first `max_output` bytes. What was read
+    stays available even if the reader is cancelled.
+    """
+
+    def __init__(self, max_output: int):
+        self.max_output = max_output
+        self.kept = bytearray()
+        self.dropped = 0
+
+    async def read(self, stream):
+        while True:
+            chunk = await stream.read(READ_CHUNK)
+            if not chunk:
+                return
+            room = self.max_output - len(self.kept)
+            if room > 0:
+                self.kept += chunk[:room]
+            self.dropped += max(0, len(chunk) - max(room, 0))
+
+    def text(self) -> str:
+        return self.kept.decode("utf-8", errors="replace")
+
+
+def _kill_group(process):
+    try:
+        if sys.platform != "win32":
+            os.killpg(process.pid, signal.SIGKILL)
+        else:
+            process.kill()
+    except ProcessLookupError:
+        pass  # already gone
+
+
+# one semaphore per event loop (asyncio primitives are bound to their loop)
+_slots = weakref.WeakKeyDictionary()
+
+
+def _loop_slots() -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    if loop not in _slots:
+        _slots[loop] = asyncio.Semaphore(MAX_CONCURRENT)
+    return _slots[loop]
+
+
+async def run_command_async(command: str, timeout: float = DEFAULT_TIMEOUT, max_output: int = DEFAULT_MAX_OUTPUT,
+                            cpu_seconds: int = DEFAULT_CPU_SECONDS, memory_mb: int = DEFAULT_MEMORY_MB,
+                            file_size_mb: int = DEFAULT_FILE_SIZE_MB, cwd: str = None) -> CommandResult:
+    """
+    Runs `command` through /bin/sh (like os.system did) with the limits above.
+    Never raises for command failures; they are reported in the result.
+    """
+    result = CommandResult(command)
+    if not isinstance(command, str) or not command.strip():
+        result.error = "empty command"
+        return result
+
+    async with _loop_slots():
+        start = time.perf_counter()
+        kwargs = {}
+        if sys.platform != "win32":
+            kwargs["start_new_session"] = True  # own process group, so a timeout kills its children too
+            argv = ["/bin/sh", "-c", command]
+            if resource is not None:
+                argv = _limited(argv, cpu_seconds, memory_mb * 1024 * 1024, file_size_mb * 1024 * 1024)
+        else:
+            argv = ["cmd.exe", "/c", command]
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *argv, stdin=asyncio.subprocess.DEVNULL, stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE, cwd=cwd, **kwargs,
+            )
+        except OSError as e:
+            result.error = f"could not start command: {e}"
+            return result
+
+        out, err = _Capture(max_output), _Capture(max_output)
+        # one deadline for the output and the exit: a command can close its
+        # pipes early and keep running
+        finished = asyncio.gather(out.read(process.stdout), err.read(process.stderr), process.wait())
+        try:
+            await asyncio.wait_for(asyncio.shield(finished), timeout)
+        except asyncio.TimeoutError:
+            result.timed_out = True
+            _kill_group(process)
+            try:
+                await asyncio.wait_for(finished, KILL_GRACE)
+            except asyncio.TimeoutError:
+                result.error = "process did not exit after being killed"  # keep what was captured so far
+        except asyncio.CancelledError:
+            _kill_group(process)
+            finished.cancel()
+            raise
+        result.exit_code = process.returncode
+
+        result.stdout, result.stdout_truncated = out.text(), out.dropped
+        result.stderr, result.stderr_truncated = err.text(), err.dropped
+        result.duration = time.perf_counter() - start
+        return result
+
+
+# ------------------ sync callers ------------------
+# one background loop shared by all threads, so MAX_CONCURRENT holds for them too
+_loop = None
+_loop_lock = threading.Lock()
+
+
+def _background_loop():
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="command-executor", daemon=True).start()
+        return _loop
+
+
+def run_command(command: str, **limits) -> CommandResult:
+    """
+    Blocking variant of run_command_async for the sync agents.
+    """
+    future = asyncio.run_coroutine_threadsafe(run_command_async(command, **limits), _background_loop())
+    return future.result()
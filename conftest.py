@@ -0,0 +1,6 @@
+# conftest.py
+# The modules live at the top level of the repo, so tests/ imports them from here.
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
@@ -1,20 +1,31 @@
 # llm_project_creator.py
 import os
+import sys
 import json
-import time
 import pathlib
 import traceback
-from dotenv import load_dotenv
-from openai import OpenAI
+from concurrent.futures import ThreadPoolExecutor
+
+from function_calling import FunctionCallingEngine
+from history_manager import HistoryManager
+from json_stream_parser import StreamParser, check_object, parse_error_message
+from project_manifest import AtomicWriter, atomic_write, content_hash, get_manifest
+from plan_cache import actions_from_manifest, plan_cache
+from llm_clients import lazy_client, load_env
+from provider_router import router_from_env
+from rate_limiter import call_with_retry, print_retry, shared_limiter
+from streaming import complete_text, print_delta, stream_completion
+from tracing import print_summary, tracer
 
 # load .env if present
-load_dotenv()
+load_env()
 
 
-client = OpenAI(
-    api_key=os.getenv('GOOGLE_API_KEY'),
-    base_url="https://generativelanguage.googleapis.com/v1beta/openai/"
-)
+# retries are done by rate_limiter, so the SDK's own retries are off.
+# the SDK is imported on the first call, not at startup.
+# no response cache: each step depends on the tool results before it
+# LLM_ROUTE=gemini,ollama routes calls by latency with failover between backends
+client = router_from_env(response_cache=False) or lazy_client("gemini", max_retries=0, response_cache=False)
 
 
 # base working directory where projects will be created
@@ -68,67 +79,298 @@ def create_folder_tool(project_root: str, tool_input):
     except Exception as e:
         return f"ERROR create_folder: {e}"
 
+def normalize_content(content: str) -> str:
+    """
+    Undo common LLM output artefacts in file content.
+    """
+    # Unescape escaped JSON content from LLM. Only when the whole file came in
+    # as one escaped line: real code legitimately contains "\\n" literals.
+    if "\\" in content and "\n" not in content:
+        # latin-1 + backslashreplace keeps non-ASCII characters intact
+        content = content.encode("latin-1", "backslashreplace").decode("unicode_escape")
+
+    # Remove accidental model-added comment prefixes
+    if content.startswith("// ") or content.startswith("# "):
+        # Only remove if the entire file gets commented accidentally
+        head = content.split("\n", 5)[:5]
+        if all(line.strip().startswith("//") or line.strip().startswith("#") for line in head):
+            lines = [line.lstrip("/# ").rstrip() for line in content.split("\n")]
+            content = "\n".join(lines)
+    return content
+
+def parse_payload(tool_input, tool_name: str):
+    """
+    tool_input as dict, or an error string.
+    """
+    if isinstance(tool_input, str):
+        try:
+            return json.loads(tool_input)
+        except Exception:
+            return f"ERROR: {tool_name} expects a JSON string or dict."
+    if isinstance(tool_input, dict):
+        return tool_input
+    return f"ERROR: invalid input type for {tool_name}"
+
 def write_file_tool(project_root: str, tool_input):
     """
     tool_input: {"path": "...", "content": "..."}
     Safe file writing without escaped characters or commented-out code.
+    Writes are atomic (temp file + rename); an identical rewrite is detected
+    from the content hash in the project manifest without reading the file.
     """
     try:
-        # Normalize input
-        if isinstance(tool_input, str):
-            try:
-                payload = json.loads(tool_input)
-            except Exception:
-                return "ERROR: write_file expects a JSON string or dict."
-        elif isinstance(tool_input, dict):
-            payload = tool_input
-        else:
-            return "ERROR: invalid input type for write_file"
+        payload = parse_payload(tool_input, "write_file")
+        if isinstance(payload, str):
+            return payload
 
         rel = payload.get("path", "").strip()
         content = payload.get("content", "")
 
         if not rel:
             return "ERROR: 'path' is required for write_file"
+        if not isinstance(content, str):
+            return "ERROR: 'content' must be a string for write_file"
+
+        return _write_file(project_root, rel, normalize_content(content).encode("utf-8"))
 
-        # Unescape escaped JSON content from LLM
-        if isinstance(content, str):
-            content = content.encode("utf-8").decode("unicode_escape")
+    except Exception as e:
+        return f"ERROR write_file: {e}\n{traceback.format_exc()}"
 
-        # Normalize newlines
-        content = content.replace("\\n", "\n")
+def _write_file(project_root: str, rel: str, data: bytes) -> str:
+    digest = content_hash(data)
 
-        # Remove accidental model-added comment prefixes
-        if content.startswith("// ") or content.startswith("# "):
-            # Only remove if the entire file gets commented accidentally
-            lines = content.split("\n")
-            if all(line.strip().startswith("//") or line.strip().startswith("#") for line in lines[:5]):
-                lines = [line.lstrip("/# ").rstrip() for line in lines]
-                content = "\n".join(lines)
+    # Build safe path
+    full_path = safe_join_project(project_root, rel)
+    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+
+    # Idempotent write:
+    # Prevents rewriting identical content on retries
+    manifest = get_manifest(project_root)
+    if manifest.is_current(rel, full_path, digest):
+        return f"File already up-to-date: {rel}"
+
+    atomic_write(full_path, data)
+    manifest.record(rel, full_path, digest)
+
+    return f"File written: {rel} ({len(data)} bytes)"
+
+def patch_file_tool(project_root: str, tool_input):
+    """
+    tool_input: {"path": "...", "edits": [{"old": "...", "new": "..."}, ...]}
+    Applies search/replace hunks to an existing file so the model does not have
+    to re-send the whole file. Every "old" text must occur exactly once.
+    """
+    try:
+        payload = parse_payload(tool_input, "patch_file")
+        if isinstance(payload, str):
+            return payload
+
+        rel = payload.get("path", "").strip()
+        edits = payload.get("edits")
+        if not rel:
+            return "ERROR: 'path' is required for patch_file"
+        if not isinstance(edits, list) or not edits:
+            return "ERROR: 'edits' must be a non-empty list of {\"old\", \"new\"} objects"
 
-        # Build safe path
         full_path = safe_join_project(project_root, rel)
-        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        if not os.path.isfile(full_path):
+            return f"ERROR: patch_file target does not exist: {rel} (use write_file to create it)"
+        with open(full_path, "r", encoding="utf-8") as f:
+            text = f.read()
+
+        for i, edit in enumerate(edits):
+            old = edit.get("old", "") if isinstance(edit, dict) else ""
+            new = edit.get("new", "") if isinstance(edit, dict) else ""
+            if not old:
+                return f"ERROR: edit {i} has no 'old' text"
+            count = text.count(old)
+            if count != 1:
+                return f"ERROR: edit {i} 'old' text found {count} times in {rel}, it must match exactly once"
+            text = text.replace(old, new, 1)
+
+        data = text.encode("utf-8")
+        atomic_write(full_path, data)
+        get_manifest(project_root).record(rel, full_path, content_hash(data))
+        return f"File patched: {rel} ({len(edits)} edits, {len(data)} bytes)"
 
-        # Idempotent write:
-        # Prevents rewriting identical content on retries
-        if os.path.exists(full_path):
-            try:
-                with open(full_path, "r", encoding="utf-8") as f:
-                    existing = f.read()
-                if existing == content:
-                    return f"File already up-to-date: {rel}"
-            except:
-                pass
+    except Exception as e:
+        return f"ERROR patch_file: {e}\n{traceback.format_exc()}"
+
+# ------------------ Tool dispatch ------------------
+TOOLS = {
+    "create_folder": create_folder_tool,
+    "write_file": write_file_tool,
+    "patch_file": patch_file_tool,
+}
 
-        # Write file
-        with open(full_path, "w", encoding="utf-8") as f:
-            f.write(content)
+# upper bounds for one "batch" action
+MAX_BATCH_ACTIONS = 25
+MAX_BATCH_WORKERS = 8
+
+def parse_tool_input(tool_input):
+    """
+    Parse tool input into a python object if it's a JSON string.
+    """
+    if isinstance(tool_input, str):
+        try:
+            return json.loads(tool_input)
+        except Exception:
+            return tool_input
+    return tool_input
 
-        return f"File written: {rel} ({len(content)} bytes)"
+def tool_input_path(tool_input) -> str:
+    """
+    Best-effort relative path of a tool input (used for labels and duplicate checks).
+    """
+    if isinstance(tool_input, dict):
+        return str(tool_input.get("path", "")).strip()
+    if isinstance(tool_input, str):
+        return tool_input.strip()
+    return ""
 
+def execute_tool(project_root: str, func: str, tool_input) -> str:
+    """
+    Run a single tool and always return an observation string.
+    """
+    with tracer.span("tool", tool=func) as span:
+        obs = _run_tool(project_root, func, tool_input)
+        span.set(ok=not obs.startswith("ERROR"))
+    return obs
+
+def _run_tool(project_root: str, func: str, tool_input) -> str:
+    tool_fn = TOOLS.get(func)
+    if tool_fn is None:
+        return f"ERROR: Unknown function '{func}'"
+    try:
+        return tool_fn(project_root, parse_tool_input(tool_input))
     except Exception as e:
-        return f"ERROR write_file: {e}\n{traceback.format_exc()}"
+        return f"ERROR executing tool {func}: {e}\n{traceback.format_exc()}"
+
+class BatchRun:
+    """
+    One "batch" action. submit() starts an entry right away, so a streamed batch
+    runs its first entries while the model is still generating the rest;
+    finish() waits for all of them and returns one aggregated observation.
+    Actions targeting the same path as an earlier action in the batch are rejected,
+    since their order would not be deterministic.
+    on_result(func, tool_input, observation) is called for each executed action.
+    """
+
+    def __init__(self, project_root: str, on_result=None):
+        self.project_root = project_root
+        self.on_result = on_result
+        self.actions = []
+        self.results = []  # observation or Future, per action
+        self.jobs = []
+        self.seen_paths = set()
+        self.pool = None
+
+    def submit(self, action):
+        i = len(self.actions)
+        self.actions.append(action)
+        if i >= MAX_BATCH_ACTIONS:
+            # only reachable when streamed, execute_batch rejects large batches up front
+            self.results.append(f"ERROR: batch too large (max {MAX_BATCH_ACTIONS} actions), action skipped")
+            return
+        if not isinstance(action, dict):
+            self.results.append("ERROR: batch entry must be an object with 'function' and 'tool_input'")
+            return
+        func = action.get("function", "")
+        tinput = parse_tool_input(action.get("tool_input", ""))
+        rel = tool_input_path(tinput)
+        key = os.path.normpath(rel) if rel else rel  # "a.py" and "./a.py" are the same file
+        if key and key in self.seen_paths:
+            self.results.append(f"ERROR: duplicate path in batch: {rel}")
+            return
+        self.seen_paths.add(key)
+        if self.pool is None:
+            self.pool = ThreadPoolExecutor(max_workers=MAX_BATCH_WORKERS)
+        self.jobs.append((i, func, tinput))
+        self.results.append(self.pool.submit(execute_tool, self.project_root, func, tinput))
+
+    def finish(self) -> str:
+        if not self.actions:
+            return "ERROR: batch expects a non-empty list of actions"
+        results = [r if isinstance(r, str) else r.result() for r in self.results]
+        if self.pool is not None:
+            self.pool.shutdown()
+
+        if self.on_result is not None:
+            for i, func, tinput in self.jobs:
+                self.on_result(func, tinput, results[i])
+
+        failed = sum(1 for r in results if r.startswith("ERROR"))
+        lines = [f"Batch finished: {len(results) - failed} ok, {failed} failed"]
+        for i, (action, obs) in enumerate(zip(self.actions, results)):
+            func = action.get("function", "") if isinstance(action, dict) else ""
+            lines.append(f"[{i}] {func}: {obs}")
+        return "\n".join(lines)
+
+    def cancel(self):
+        """
+        For a reply that broke off and will be requested again: entries not
+        started yet are dropped instead of run, so the retried reply does not
+        run them a second time. Running ones finish and are reported to on_result.
+        """
+        if self.pool is None:
+            return
+        self.pool.shutdown(cancel_futures=True)  # waits for the running ones
+        if self.on_result is not None:
+            for i, func, tinput in self.jobs:
+                if not self.results[i].cancelled():
+                    self.on_result(func, tinput, self.results[i].result())
+
+def execute_batch(project_root: str, actions, on_result=None) -> str:
+    """
+    actions: list of {"function": "...", "tool_input": ...}
+    Runs independent actions in a thread pool and returns one aggregated observation.
+    Every path still goes through safe_join_project inside the tools.
+    """
+    actions = parse_tool_input(actions)
+    if not isinstance(actions, list) or not actions:
+        return "ERROR: batch expects a non-empty list of actions"
+    if len(actions) > MAX_BATCH_ACTIONS:
+        return f"ERROR: batch too large ({len(actions)} actions, max {MAX_BATCH_ACTIONS})"
+
+    batch = BatchRun(project_root, on_result=on_result)
+    for action in actions:
+        batch.submit(action)
+    return batch.finish()
+
+def replay_file(project_root: str, action) -> str:
+    """
+    One action of a cached plan. write_file content is the final file as it
+    was on disk, so it is written byte for byte: normalize_content must not
+    run a second time over it.
+    """
+    if action["function"] != "write_file":
+        return execute_tool(project_root, action["function"], action["tool_input"])
+    with tracer.span("tool", tool="write_file") as span:
+        tinput = action["tool_input"]
+        try:
+            obs = _write_file(project_root, tinput["path"].strip(), tinput["content"].encode("utf-8"))
+        except Exception as e:
+            obs = f"ERROR write_file: {e}"
+        span.set(ok=not obs.startswith("ERROR"))
+    return obs
+
+def replay_actions(project_root: str, actions, on_result=None) -> int:
+    """
+    Runs a cached plan locally: folders first, then the files in parallel.
+    Returns the number of failed actions.
+    """
+    folders = [a for a in actions if a["function"] == "create_folder"]
+    files = [a for a in actions if a["function"] != "create_folder"]
+    observations = [execute_tool(project_root, a["function"], a["tool_input"]) for a in folders]
+    if files:
+        with ThreadPoolExecutor(max_workers=MAX_BATCH_WORKERS) as pool:
+            observations += pool.map(lambda action: replay_file(project_root, action), files)
+    failed = 0
+    for action, obs in zip(folders + files, observations):
+        failed += obs.startswith("ERROR")
+        if on_result is not None:
+            on_result(action["function"], action["tool_input"], obs)
+    return failed
 
 # ------------------ LLM conversation helpers ------------------
 SYSTEM_PROMPT = """
@@ -137,22 +379,30 @@ You MUST plan and then create the project by issuing ACTION JSON objects that ca
 You are allowed ONLY the following tools (use exactly their names):
 - create_folder
 - write_file
+- patch_file
 
 Protocol:
 - Every assistant response MUST be a single JSON object (no extra text) matching this schema:
   {
     "step": "<start|plan|action|observe|result>",
-    "function": "<create_folder | write_file | empty string>",
+    "function": "<create_folder | write_file | patch_file | batch | empty string>",
     "tool_input": "<string or JSON object>",
     "content": "<human-readable text>"
   }
 
 - "plan" responses explain what you will do.
 - "action" responses call ONE tool per response. Set "function" to the tool name and "tool_input" to the argument.
+- To save round trips, an "action" may instead set "function" to "batch" and "tool_input" to a list of
+  independent actions, e.g. [{"function": "write_file", "tool_input": {"path": "app/main.py", "content": "..."}}, ...].
+  Batched actions run in parallel, so never put two actions for the same path in one batch.
+  Use at most 25 actions per batch. You get one combined observation for the whole batch.
 - After each action, wait for the tool observation, and then plan the next step or finish with "result".
 - When creating files, create the project root folder first (project_name), then subfolders, then files.
 - All paths must be relative to the project root folder. Never use absolute paths or "..".
 - Use small, focused file-write actions: create each file separately with write_file.
+- To change a file that already exists, prefer patch_file over re-sending the whole file:
+  {"path": "app/main.py", "edits": [{"old": "<exact existing text>", "new": "<replacement>"}]}
+  Each "old" text must appear exactly once in the file.
 - Use deterministic setting: keep responses concise and focused.
 
 When asked to create a project, produce the full set of actions necessary to create a working boilerplate (folder + files). For JavaScript/Express, include server.js, src/app.js, routes, controllers, models, package.json. For FastAPI, include app/main.py, routers, models/schemas/services, requirements.txt, README.
@@ -163,67 +413,294 @@ Also add code in all created files and each folder should have atleast one file
 """
 
 MODEL_NAME = "gemini-2.5-flash"
+# AGENT_STREAM=1 echoes plans and file contents while the model is still generating them
+STREAM = os.getenv("AGENT_STREAM") == "1"
+# AGENT_ENGINE=tools uses native function calling instead of the JSON step protocol
+ENGINE = os.getenv("AGENT_ENGINE", "json")
+# replies are parsed while they stream, so write_file/batch actions start before
+# the model has finished generating them (AGENT_EARLY_DISPATCH=0 to disable)
+EARLY_DISPATCH = os.getenv("AGENT_EARLY_DISPATCH", "1") == "1"
+# invalid JSON replies in a row before run_steps gives up
+MAX_INVALID_REPLIES = 3
+
+# the first user message holds the project spec, so it is pinned with the system prompt
+history = HistoryManager(
+    max_tokens=int(os.getenv("HISTORY_MAX_TOKENS", "12000")),
+    keep_recent=10,
+    pin_first_user=True,
+)
 
 def call_model_with_retry(messages):
+    """
+    Returns the assistant content (a JSON string) of one completion.
+    Waits for the shared requests/tokens-per-minute budget first and retries
+    429/5xx/connection errors with exponential backoff + jitter.
+    """
     try:
-        response = client.chat.completions.create(
-            model=MODEL_NAME,
-            response_format={"type": "json_object"},
-            messages=messages
+        return call_with_retry(
+            lambda: complete_text(
+                client,
+                stream=STREAM,
+                model=MODEL_NAME,
+                response_format={"type": "json_object"},
+                messages=messages
+            ),
+            limiter=shared_limiter,
+            tokens=history.total_tokens(messages),
+            on_retry=print_retry,
         )
-        return response
     except Exception as e:
-        # Detect rate limit 429
-        if "429" in str(e):
-            print("Rate limit exceeded. Retrying in 5 seconds...")
-            time.sleep(5)
-            return call_model_with_retry(messages)
-
         print("Error:", e)
         raise e
 
-# ------------------ Main interactive flow ------------------
-def run_interactive():
-    print("LLM Project Creator — local mode")
-    project_name = input("Project name (single word, e.g., ecommerce): ").strip()
-    if not project_name:
-        print("Project name required.")
-        return
-    language = input("Language/framework (javascript | express | python | fastapi): ").strip().lower()
-    if language not in ("javascript", "express", "js", "python", "fastapi", "py"):
-        print("Unsupported language. Use 'javascript' or 'python' or 'fastapi' or 'express'.")
-        return
+# ------------------ Streamed steps (early dispatch) ------------------
+class StreamedFile:
+    """
+    write_file content piped to disk while the model is still generating it.
+    Chunks go to a temp file next to the target (held in memory until the path
+    has streamed in); finish() commits it the way write_file_tool would.
+    """
 
-    project_root = os.path.join(BASE_WORKDIR, project_name)
-    if os.path.exists(project_root):
-        confirmed = input(f"Folder {project_root} already exists — overwrite? (y/N): ").strip().lower()
-        if confirmed != "y":
-            print("Aborting.")
+    def __init__(self, project_root: str):
+        self.project_root = project_root
+        self.rel = None
+        self.writer = None
+        self.pending = []  # chunks streamed before the path
+        self.error = None
+        # what normalize_content looks at
+        self.head = ""
+        self.has_backslash = False
+        self.has_newline = False
+
+    def set_path(self, rel):
+        if not isinstance(rel, str) or not rel.strip() or self.writer is not None or self.error is not None:
             return
+        try:
+            full_path = safe_join_project(self.project_root, rel.strip())
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            self.writer = AtomicWriter(full_path)
+            self.rel = rel.strip()
+        except Exception as e:
+            self.error = e  # finish() reports it through write_file_tool
+            return
+        pending, self.pending = self.pending, []
+        for chunk in pending:
+            self._put(chunk)
+
+    def write(self, chunk: str):
+        if len(self.head) < 3:
+            self.head = (self.head + chunk)[:3]
+        self.has_backslash = self.has_backslash or "\\" in chunk
+        self.has_newline = self.has_newline or "\n" in chunk
+        if self.writer is None:
+            self.pending.append(chunk)
+        else:
+            self._put(chunk)
 
-    # start conversation
-    messages = [
-        {"role": "system", "content": SYSTEM_PROMPT},
-        {"role": "user", "content": json.dumps({"project_name": project_name, "language": language})}
-    ]
+    def _put(self, chunk: str):
+        if self.error is not None:
+            return
+        try:
+            self.writer.write(chunk.encode("utf-8"))
+        except Exception as e:
+            self.error = e
+
+    def finish(self, tool_input) -> str:
+        """
+        Observation for the completed write_file action.
+        """
+        writer, self.writer = self.writer, None
+        rel = tool_input.get("path", "").strip() if isinstance(tool_input, dict) else ""
+        unusual = (self.has_backslash and not self.has_newline) or self.head.startswith(("// ", "# "))
+        # content that is not a string (a number, an object) streamed no chunks
+        complete = isinstance(tool_input, dict) and isinstance(tool_input.get("content"), str)
+        if writer is None or self.error is not None or unusual or not complete or rel != self.rel:
+            # anything out of the ordinary is redone from the parsed reply
+            if writer is not None:
+                writer.abort()
+            return write_file_tool(self.project_root, tool_input)
+        try:
+            manifest = get_manifest(self.project_root)
+            if manifest.is_current(rel, writer.full_path, writer.digest):
+                writer.abort()
+                return f"File already up-to-date: {rel}"
+            writer.commit()
+            manifest.record(rel, writer.full_path, writer.digest)
+            return f"File written: {rel} ({writer.size} bytes)"
+        except Exception as e:
+            writer.abort()
+            return f"ERROR write_file: {e}\n{traceback.format_exc()}"
 
-    print("\nRequesting plan from LLM (this will instruct it to create folders & files)...\n")
+    def abort(self):
+        if self.writer is not None:
+            self.writer.abort()
+            self.writer = None
+
+
+class StepStream:
+    """
+    Parses one streamed reply and starts its action before the reply is complete:
+    - write_file: the content is written to disk while it streams (StreamedFile)
+    - batch: every entry runs as soon as its JSON object is closed (BatchRun)
+    Other steps are handled once the whole reply has arrived, as before.
+    """
 
+    def __init__(self, project_root: str, record, echo: bool = False):
+        self.project_root = project_root
+        self.record = record
+        self.echo = echo
+        self.text = ""
+        self.step = self.func = None
+        self.file = None
+        self.batch = None
+        self.parser = StreamParser(on_value=self.on_value, on_chunk=self.on_chunk, streamed=self.streamed)
+
+    def on_delta(self, text: str):
+        if self.echo:
+            print_delta(text)
+        self.parser.push(text)
+
+    def on_value(self, path, value):
+        if path == ("step",):
+            self.step = value
+        elif path == ("function",):
+            self.func = value
+        elif path == ("tool_input", "path") and self.file is not None:
+            self.file.set_path(value)
+            return
+        elif len(path) == 2 and path[0] == "tool_input" and isinstance(path[1], int) and self.batch is not None:
+            self.batch.submit(value)
+            return
+        else:
+            return
+        # both known -> start the action (usually before "tool_input" begins)
+        if self.step == "action" and self.file is None and self.batch is None:
+            if self.func == "write_file":
+                self.file = StreamedFile(self.project_root)
+            elif self.func == "batch":
+                self.batch = BatchRun(self.project_root, on_result=self.record)
+
+    def streamed(self, path) -> bool:
+        return self.file is not None and path == ("tool_input", "content")
+
+    def on_chunk(self, path, text: str):
+        self.file.write(text)
+
+    def result(self):
+        """
+        (parsed reply, None) or (None, error).
+        """
+        try:
+            return check_object(self.parser.close()), None
+        except ValueError as e:  # JSONStreamError carries the position
+            return None, e
+
+    def observation(self, tool_input):
+        """
+        Observation of the action started while streaming, or None if none was.
+        """
+        if self.batch is not None and isinstance(tool_input, list):
+            return self.batch.finish()
+        if self.file is not None:
+            with tracer.span("tool", tool="write_file", streamed=True) as span:
+                obs = self.file.finish(tool_input)
+                span.set(ok=not obs.startswith("ERROR"))
+            self.record("write_file", parse_tool_input(tool_input), obs)
+            return obs
+        return None
+
+    def abort(self):
+        """
+        For an invalid reply: drops a partly streamed file; batch entries already
+        submitted still run to the end and their aggregated observation is
+        returned (or None).
+        """
+        if self.file is not None:
+            self.file.abort()
+        if self.batch is not None and self.batch.actions:
+            return self.batch.finish()
+        return None
+
+    def cancel(self):
+        """
+        For a reply that failed mid-stream and is retried: drops a partly
+        streamed file and the batch entries that have not started.
+        """
+        if self.file is not None:
+            self.file.abort()
+        if self.batch is not None:
+            self.batch.cancel()
+
+def stream_step(project_root: str, messages, record) -> StepStream:
+    """
+    One streamed completion through StepStream, with the same rate limiting and
+    retries as call_model_with_retry. A retried attempt starts from scratch.
+    """
+    def attempt():
+        stream = StepStream(project_root, record, echo=STREAM)
+        try:
+            stream.text = stream_completion(
+                client,
+                on_delta=stream.on_delta,
+                model=MODEL_NAME,
+                response_format={"type": "json_object"},
+                messages=messages,
+            )
+        except BaseException:
+            stream.cancel()
+            raise
+        if STREAM:
+            print()
+        return stream
+
+    return call_with_retry(attempt, limiter=shared_limiter, tokens=history.total_tokens(messages),
+                           on_retry=print_retry)
+
+def run_steps(project_root: str, messages, record) -> bool:
+    """
+    JSON step protocol: one model call per plan/action/observe step.
+    record(func, tool_input, observation) is called for every executed tool.
+    An invalid JSON reply is reported back to the model with its position;
+    MAX_INVALID_REPLIES of them in a row end the run.
+    Returns True once the model reports a result.
+    """
+    invalid = 0
     while True:
+        # drop/summarize old steps once the prompt is over budget
+        history.compact(messages)
         # call model to get assistant JSON (plan or action)
-        resp = call_model_with_retry(messages)
-        # the client returns a JSON object in resp.choices[0].message.content
-        try:
-            assistant_json = resp.choices[0].message.content
-            if isinstance(assistant_json, dict):
-                parsed = assistant_json
+        # AGENT_TRACE=trace.jsonl records latency/tokens/retries of every step
+        stream = None
+        with tracer.span("llm", engine="json", model=MODEL_NAME) as span:
+            if EARLY_DISPATCH:
+                stream = stream_step(project_root, messages, record)
+                assistant_json = stream.text
+                parsed, error = stream.result()
             else:
-                # JSON string
-                parsed = json.loads(assistant_json)
-        except Exception as e:
-            print("ERROR parsing model JSON:", e)
-            print("Raw assistant content:", resp.choices[0].message.content)
-            return
+                assistant_json = call_model_with_retry(messages)
+                # the client returns a JSON object as the assistant content
+                try:
+                    parsed, error = check_object(json.loads(assistant_json)), None
+                except (TypeError, ValueError) as e:  # JSONDecodeError carries the position
+                    parsed, error = None, e
+            span.set(step="invalid_json" if error else parsed.get("step"))
+
+        if error is not None:
+            # the position tells the model (and the user) where the reply broke
+            print("ERROR parsing model JSON:", error)
+            raw = str(assistant_json)
+            print("Raw assistant content:", raw if len(raw) < 2000 else raw[:2000] + "...")
+            obs = parse_error_message(error)
+            started = stream.abort() if stream is not None else None
+            if started:
+                obs += "\nActions of that reply that had already run:\n" + started
+            invalid += 1
+            if invalid >= MAX_INVALID_REPLIES:
+                print(f"ERROR: {invalid} invalid replies in a row, giving up")
+                return False
+            messages.append({"role": "assistant", "content": json.dumps({"step": "observe", "content": obs})})
+            continue
+        invalid = 0
 
         # append assistant message to history (as JSON string for traceability)
         messages.append({"role": "assistant", "content": json.dumps(parsed)})
@@ -239,32 +716,17 @@ def run_interactive():
             continue
 
         elif step == "action":
-            # execute exactly one tool
             print("ACTION ->", func, "| tool_input:", tool_input if len(str(tool_input)) < 500 else "(large payload)")
 
-            # prepare tool execution
-            try:
-                # parse tool input into python object if it's a JSON string
-                if isinstance(tool_input, str):
-                    try:
-                        tinput_obj = json.loads(tool_input)
-                    except Exception:
-                        tinput_obj = tool_input
-                else:
-                    tinput_obj = tool_input
-
-                # call appropriate tool
-                if func == "create_folder":
-                    print("Creating folder...", tinput_obj, 'tinput object')
-                    obs = create_folder_tool(project_root, tinput_obj)
-                elif func == "write_file":
-                    print("Writing file...", tinput_obj, 'tinput object')
-                    obs = write_file_tool(project_root, tinput_obj)
-                else:
-                    obs = f"ERROR: Unknown function '{func}'"
-
-            except Exception as e:
-                obs = f"ERROR executing tool {func}: {e}\n{traceback.format_exc()}"
+            # already started while the reply was streaming?
+            obs = stream.observation(tool_input) if stream is not None else None
+            if obs is None and func == "batch":
+                # run every independent action of the batch concurrently
+                obs = execute_batch(project_root, tool_input, on_result=record)
+            elif obs is None:
+                # execute exactly one tool
+                obs = execute_tool(project_root, func, tool_input)
+                record(func, parse_tool_input(tool_input), obs)
 
             print("🔧 TOOL:", obs)
 
@@ -279,18 +741,164 @@ def run_interactive():
 
         elif step == "result":
             print("RESULT:", content)
-            print("\nDone. Project created at:", project_root)
-            # append final assistant message then break
+            # append final assistant message then stop
             messages.append({"role": "assistant", "content": json.dumps(parsed)})
-            break
+            return True
 
         else:
             print("ERROR: Unknown step returned by model:", step)
             print("Full parsed:", parsed)
-            break
+            return False
+
+# ------------------ Function calling engine ------------------
+TOOLS_SYSTEM_PROMPT = """
+You are a file-creation coding assistant. The user gives you a project_name and a language/framework.
+Create a working boilerplate project by calling the create_folder, write_file and patch_file tools.
+- Call many independent tools in one response (they run in parallel), but never two for the same path.
+- All paths are relative to the project root, which already exists. Never use absolute paths or "..".
+- Prefer patch_file over write_file to change a file you already wrote.
+- For JavaScript/Express, include server.js, src/app.js, routes, controllers, models, package.json.
+  For FastAPI, include app/main.py, routers, models/schemas/services, requirements.txt, README.
+- Put code in every file; every folder needs at least one file.
+- When everything is created, reply with a short summary and no tool calls.
+"""
+
+def run_with_tools(project_root: str, messages, record) -> bool:
+    """
+    Native function calling: one completion can create many files at once.
+    Falls back to run_steps if the backend does not support tools.
+    """
+    def tool(func):
+        def call(**arguments):
+            tool_input = arguments.get("path", "") if func == "create_folder" else arguments
+            obs = execute_tool(project_root, func, tool_input)
+            record(func, tool_input, obs)
+            print("🔧 TOOL:", obs)
+            return obs
+        return call
+
+    def json_fallback(messages, query):
+        messages[0] = {"role": "system", "content": SYSTEM_PROMPT}
+        return run_steps(project_root, messages, record)
+
+    path = {"type": "string", "description": "Path relative to the project root"}
+    tools = {
+        "create_folder": {
+            "fn": tool("create_folder"),
+            "description": "Create a folder inside the project",
+            "parameters": {"type": "object", "properties": {"path": path}, "required": ["path"]},
+        },
+        "write_file": {
+            "fn": tool("write_file"),
+            "description": "Create or overwrite a file with the given content",
+            "parameters": {"type": "object", "properties": {"path": path, "content": {"type": "string"}},
+                           "required": ["path", "content"]},
+        },
+        "patch_file": {
+            "fn": tool("patch_file"),
+            "description": "Replace text in an existing file; every 'old' text must occur exactly once",
+            "parameters": {"type": "object", "properties": {"path": path, "edits": {
+                "type": "array",
+                "items": {"type": "object", "properties": {"old": {"type": "string"}, "new": {"type": "string"}},
+                          "required": ["old", "new"]},
+            }}, "required": ["path", "edits"]},
+        },
+    }
+    engine = FunctionCallingEngine(client, MODEL_NAME, tools, fallback=json_fallback, history=history, max_steps=40)
+    messages[0] = {"role": "system", "content": TOOLS_SYSTEM_PROMPT}
+    answer = engine.run(messages, "Create the project now.")
+    if answer is True or answer is False:
+        return answer  # came from the JSON fallback
+    if answer is None:
+        print("ERROR: the model did not finish within", engine.max_steps, "steps")
+        return False
+    print("RESULT:", answer)
+    return True
+
+# ------------------ Main interactive flow ------------------
+def run_interactive(fresh: bool = False, ask=input):
+    """
+    fresh=True skips the plan cache and always asks the model.
+    ask(prompt) -> answer reads the user's answers (input() by default,
+    scripted answers in benchmarks).
+    """
+    print("LLM Project Creator — local mode")
+    project_name = ask("Project name (single word, e.g., ecommerce): ").strip()
+    if not project_name:
+        print("Project name required.")
+        return
+    language = ask("Language/framework (javascript | express | python | fastapi): ").strip().lower()
+    if language not in ("javascript", "express", "js", "python", "fastapi", "py"):
+        print("Unsupported language. Use 'javascript' or 'python' or 'fastapi' or 'express'.")
+        return
+    requirements = ask("Extra requirements (optional, Enter to skip): ").strip()
+
+    project_root = os.path.join(BASE_WORKDIR, project_name)
+    spec = {"project_name": project_name, "language": language}
+    if requirements:
+        spec["requirements"] = requirements
+    manifest = get_manifest(project_root)
+    resume = False
+    if os.path.exists(project_root):
+        if manifest.can_resume(spec):
+            answer = ask(f"Found an unfinished run in {project_root} ({len(manifest.actions)} steps done) — resume? (Y/n): ")
+            resume = answer.strip().lower() != "n"
+        if not resume:
+            confirmed = ask(f"Folder {project_root} already exists — overwrite? (y/N): ").strip().lower()
+            if confirmed != "y":
+                print("Aborting.")
+                return
+    manifest.start(spec, resume=resume)
+
+    # start conversation
+    messages = [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": json.dumps(spec)}
+    ]
+    if resume:
+        # a compact summary of finished work replaces the lost conversation
+        messages.append({"role": "user", "content": manifest.resume_summary()})
+
+    def record(func, tinput, obs):
+        # only successful steps are remembered for resuming
+        if func in TOOLS and not obs.startswith("ERROR"):
+            manifest.record_action(func, tool_input_path(tinput))
+
+    # same scaffold generated before -> replay it locally instead of asking the model
+    cached, exact = (None, False) if (fresh or resume) else plan_cache.lookup(spec, MODEL_NAME)
+    if cached is not None:
+        actions = plan_cache.replay(cached, project_name)
+        print(f"Replaying cached {'plan' if exact else 'base scaffold'} ({len(actions)} actions)...")
+        with tracer.span("replay", exact=exact, actions=len(actions)):
+            failed = replay_actions(project_root, actions, on_result=record)
+        if failed == 0 and exact:
+            manifest.mark_completed()
+            print("\nDone. Project created at:", project_root, "(from plan cache, use --fresh to regenerate)")
+            return
+        # partial replay: the model only adds what differs from the cached scaffold
+        messages.append({"role": "user", "content": manifest.resume_summary(
+            intro="A cached scaffold for this language was already created.",
+            instruction="Only add or patch what the requirements (or failed files) still need",
+        )})
+
+    print("\nRequesting plan from LLM (this will instruct it to create folders & files)...\n")
+    with tracer.span("generate", engine=ENGINE) as span:
+        if ENGINE == "tools":
+            done = run_with_tools(project_root, messages, record)
+        else:
+            done = run_steps(project_root, messages, record)
+        span.set(ok=done)
+    if done:
+        print("\nDone. Project created at:", project_root)
+        manifest.mark_completed()
+        plan_cache.store(spec, MODEL_NAME, actions_from_manifest(manifest))
 
 if __name__ == "__main__":
     try:
-        run_interactive()
+        # --fresh (or PLAN_CACHE=0) ignores cached scaffolds
+        run_interactive(fresh="--fresh" in sys.argv[1:] or os.getenv("PLAN_CACHE") == "0")
     except KeyboardInterrupt:
-        print("\nInterrupted.")
\ No newline at end of file
+        print("\nInterrupted.")
+    finally:
+        if tracer.enabled:
+            print_summary(tracer.path, tracer.trace_id)
\ No newline at end of file
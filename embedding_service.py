@@ -0,0 +1,356 @@
+# embedding_service.py
+# Embeddings that are computed once: a content-addressed on-disk cache in front
+# of the embeddings endpoint, plus request coalescing.
+#
+#   service = EmbeddingService()                     # EMBEDDING_CACHE_DIR, ...
+#   service.embed(["chunk one", "chunk two", ...])   # float32 matrix, one API call per 2048 new texts
+#                                                    # (or EMBEDDING_MAX_BATCH_TOKENS tokens)
+#   service.embed_text("a single query")             # from any thread, batched with its neighbours
+#   await service.aembed_text("a single query")      # same, from asyncio code
+#   service.stats()                                  # hit rate, API calls saved, ...
+#
+# - key = BLAKE2 hash of the text; every (model, dim) pair has its own files,
+#   so a vector is never served for another model or size
+# - disk: <model>-<dim>.f32 holds the vectors as raw float32 rows (read through
+#   a memory map, only the rows actually used are paged in) and <model>-<dim>.keys
+#   the 16-byte hash of each row. Both are append-only; several processes can
+#   share the directory
+# - duplicates inside one call, and texts another caller is already waiting
+#   for, are embedded once
+# - embed_text() calls arriving within EMBEDDING_BATCH_WINDOW_MS of each other
+#   go out as one request of up to MAX_INPUTS_PER_REQUEST inputs and
+#   EMBEDDING_MAX_BATCH_TOKENS tokens
+#
+# The service has `dim` and `embed(texts)`, so it can back a Retriever in place
+# of OpenAIEmbedder; re-indexing unchanged documents then costs no API calls.
+import asyncio
+import hashlib
+import os
+import re
+import threading
+from concurrent.futures import Future
+
+import numpy as np
+
+from embeddings import EMBEDDING_MODEL, MAX_INPUTS_PER_REQUEST, embed_texts
+
+try:
+    import fcntl
+except ImportError:  # Windows: appends are only serialized within one process
+    fcntl = None
+
+DEFAULT_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", ".embedding_cache")
+DEFAULT_WINDOW_MS = float(os.getenv("EMBEDDING_BATCH_WINDOW_MS", "5"))
+# the embeddings endpoint also rejects requests over 300k tokens in total
+DEFAULT_MAX_BATCH_TOKENS = int(os.getenv("EMBEDDING_MAX_BATCH_TOKENS", "300000"))
+KEY_SIZE = 16
+# OpenAIEmbedder's default; any other dim is requested via `dimensions`
+FULL_DIM = 1536
+
+
+def content_key(text: str) -> bytes:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=KEY_SIZE).digest()
+
+
+class EmbeddingStore:
+    """
+    Append-only vector file of one (model, dim): row i of the .f32 file is the
+    vector whose key is entry i of the .keys file.
+    """
+
+    def __init__(self, directory: str, model: str, dim: int):
+        name = f"{re.sub(r'[^A-Za-z0-9._-]', '_', model)}-{dim}"
+        self.directory = directory
+        self.dim = dim
+        self.vectors_path = os.path.join(directory, name + ".f32")
+        self.keys_path = os.path.join(directory, name + ".keys")
+        self._rows = {}  # key -> row
+        self._count = 0  # rows of the keys file read so far
+        self._matrix = None  # read-only mapping of the first _matrix.shape[0] rows
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        with self._lock:
+            self._refresh()
+            return len(self._rows)
+
+    def _refresh(self):
+        # rows appended since the last look, by this process or another one
+        try:
+            count = os.path.getsize(self.keys_path) // KEY_SIZE
+        except OSError:
+            return
+        if count <= self._count:
+            return
+        with open(self.keys_path, "rb") as f:
+            f.seek(self._count * KEY_SIZE)
+            data = f.read((count - self._count) * KEY_SIZE)
+        for row, start in enumerate(range(0, len(data) - KEY_SIZE + 1, KEY_SIZE), self._count):
+            # two processes may both have appended a text, the first row wins
+            self._rows.setdefault(data[start:start + KEY_SIZE], row)
+        self._count += len(data) // KEY_SIZE
+
+    def lookup(self, key: bytes):
+        """
+        Row of key, or None.
+        """
+        with self._lock:
+            row = self._rows.get(key)
+            if row is None:
+                self._refresh()
+                row = self._rows.get(key)
+            return row
+
+    def _mapped(self, last_row: int) -> np.ndarray:
+        # call with lock held; remaps once rows past the current mapping are needed
+        if self._matrix is None or last_row >= self._matrix.shape[0]:
+            # a plain ndarray view: indexing an np.memmap costs several times more
+            self._matrix = np.memmap(self.vectors_path, dtype=np.float32, mode="r",
+                                     shape=(self._count, self.dim)).view(np.ndarray)
+        return self._matrix
+
+    def vector(self, row: int) -> np.ndarray:
+        with self._lock:
+            return self._mapped(row)[row].copy()
+
+    def vectors(self, rows) -> np.ndarray:
+        """
+        Copies the given rows out of the memory map.
+        """
+        if not rows:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        with self._lock:
+            return self._mapped(max(rows))[rows]
+
+    def append(self, keys, vectors: np.ndarray):
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(self.keys_path, "ab") as keys_file:
+                if fcntl is not None:
+                    fcntl.flock(keys_file, fcntl.LOCK_EX)  # released when the file is closed
+                self._refresh()
+                # a crash in the middle of a key leaves a partial one at the end;
+                # without this every later key would be read shifted
+                keys_file.truncate(self._count * KEY_SIZE)
+                # vectors first, then keys: a key on disk always has its row.
+                # A crash in between leaves vectors without keys, overwritten here
+                fd = os.open(self.vectors_path, os.O_RDWR | os.O_CREAT, 0o644)
+                with os.fdopen(fd, "r+b") as vectors_file:
+                    vectors_file.truncate(self._count * self.dim * 4)
+                    vectors_file.seek(0, os.SEEK_END)
+                    vectors_file.write(vectors.tobytes())
+                keys_file.write(b"".join(keys))
+                keys_file.flush()
+                self._refresh()
+
+
+class EmbeddingService:
+    def __init__(self, client=None, model: str = EMBEDDING_MODEL, dim: int = FULL_DIM,
+                 cache_dir: str = DEFAULT_CACHE_DIR, batch_size: int = MAX_INPUTS_PER_REQUEST,
+                 window_ms: float = DEFAULT_WINDOW_MS, max_batch_tokens: int = DEFAULT_MAX_BATCH_TOKENS):
+        self._client = client  # default client created on the first miss, keeps imports fast
+        self.model = model
+        self.dim = dim
+        self.batch_size = batch_size
+        self.max_batch_tokens = max_batch_tokens
+        self.window = window_ms / 1000
+        self.store = EmbeddingStore(cache_dir, model, dim)
+        self._inflight = {}  # key -> Future of the vector, while its API call runs
+        self._queue = []  # (key, text) waiting for the next coalesced call
+        self._timer = None
+        self._lock = threading.Lock()
+        # metrics
+        self.requested = 0  # texts asked for
+        self.hits = 0  # served from the store
+        self.deduplicated = 0  # repeats within a call, or already being embedded for another caller
+        self.embedded = 0  # texts sent to the API
+        self.api_calls = 0
+        self.failed_calls = 0
+
+    @property
+    def client(self):
+        if self._client is None:
+            from llm_clients import get_client
+
+            self._client = get_client("openai", response_cache=False)
+        return self._client
+
+    # ------------------ lookups ------------------
+    def _claim(self, items):
+        """
+        Splits (key, text) pairs into stored rows and futures. Keys nobody is
+        embedding yet get a new future and are returned as `owned`; the caller
+        has to fetch them.
+        """
+        found, owned = {}, []
+        with self._lock:
+            for key, text in items:
+                self.requested += 1
+                if key in found:
+                    self.deduplicated += 1
+                    continue
+                # in-flight first: a finished fetch is in the store before it leaves _inflight
+                future = self._inflight.get(key)
+                if future is not None:
+                    self.deduplicated += 1
+                    found[key] = future
+                    continue
+                row = self.store.lookup(key)
+                if row is not None:
+                    self.hits += 1
+                    found[key] = row
+                    continue
+                future = self._inflight[key] = Future()
+                found[key] = future
+                owned.append((key, text))
+        return found, owned
+
+    def _batches(self, items):
+        """
+        Splits (key, text) pairs into requests of at most batch_size inputs
+        and max_batch_tokens tokens.
+        """
+        for start in range(0, len(items), self.batch_size):
+            chunk = items[start:start + self.batch_size]
+            sizes = [len(text.encode("utf-8")) for _, text in chunk]
+            if sum(sizes) > self.max_batch_tokens:
+                # a token is at least one byte, so only batches this large are tokenized
+                from tokenization import count_tokens_batch
+
+                try:
+                    sizes = count_tokens_batch([text for _, text in chunk], self.model)
+                except Exception:
+                    pass  # no tokenizer tables (offline): the byte counts are an upper bound
+            batch, tokens = [], 0
+            for item, size in zip(chunk, sizes):
+                if batch and tokens + size > self.max_batch_tokens:
+                    yield batch
+                    batch, tokens = [], 0
+                batch.append(item)
+                tokens += size
+            if batch:
+                yield batch
+
+    def _fetch(self, items):
+        """
+        Embeds the texts of (key, text) pairs, stores them and resolves their futures.
+        """
+        from rate_limiter import call_with_retry
+
+        dimensions = self.dim if self.dim != FULL_DIM else None
+        for batch in self._batches(items):
+            keys = [key for key, _ in batch]
+            texts = [text for _, text in batch]
+            try:
+                matrix = call_with_retry(lambda: embed_texts(texts, client=self.client, model=self.model,
+                                                             batch_size=len(texts), dimensions=dimensions))
+                if matrix.shape != (len(texts), self.dim):
+                    raise ValueError(f"expected {self.dim}-d embeddings from {self.model}, "
+                                     f"got shape {matrix.shape}")
+                self.store.append(keys, matrix)
+            except Exception as e:
+                with self._lock:
+                    self.failed_calls += 1
+                    futures = [self._inflight.pop(key) for key in keys]
+                for future in futures:
+                    future.set_exception(e)
+                continue
+            with self._lock:
+                self.api_calls += 1
+                self.embedded += len(batch)
+                futures = [self._inflight.pop(key) for key in keys]
+            for future, vector in zip(futures, matrix):
+                future.set_result(vector)
+
+    # ------------------ embedder protocol ------------------
+    def embed(self, texts) -> np.ndarray:
+        """
+        float32 matrix with one row per text (same order). Only texts that are
+        neither stored nor already being embedded reach the API, in calls of
+        up to batch_size inputs made right away from this thread.
+        """
+        texts = list(texts)
+        keys = [content_key(text) for text in texts]
+        found, owned = self._claim(zip(keys, texts))
+        if owned:
+            self._fetch(owned)
+        stored_keys = [key for key, value in found.items() if not isinstance(value, Future)]
+        stored = self.store.vectors([found[key] for key in stored_keys])  # one read for all hits
+        position = {key: i for i, key in enumerate(stored_keys)}
+        matrix = np.empty((len(texts), self.dim), dtype=np.float32)
+        for i, key in enumerate(keys):
+            value = found[key]
+            matrix[i] = value.result() if isinstance(value, Future) else stored[position[key]]
+        return matrix
+
+    # ------------------ single texts, coalesced ------------------
+    def _submit(self, text: str):
+        # vector of a stored text, or a Future resolved by the next coalesced call
+        key = content_key(text)
+        found, owned = self._claim([(key, text)])
+        value = found[key]
+        if not isinstance(value, Future):
+            return self.store.vector(value)
+        if owned:
+            with self._lock:
+                self._queue.extend(owned)
+                if len(self._queue) >= self.batch_size:
+                    # a full request: no reason to wait for the window
+                    batch, self._queue = self._queue[:self.batch_size], self._queue[self.batch_size:]
+                    threading.Thread(target=self._fetch, args=(batch,), daemon=True).start()
+                if self._queue and self._timer is None:
+                    self._timer = threading.Timer(self.window, self._flush)
+                    self._timer.daemon = True
+                    self._timer.start()
+        return value
+
+    def _flush(self):
+        with self._lock:
+            batch, self._queue = self._queue, []
+            self._timer = None
+        if batch:
+            self._fetch(batch)
+
+    def embed_text(self, text: str) -> np.ndarray:
+        """
+        Vector of one text. Concurrent calls from other threads share API requests.
+        """
+        value = self._submit(text)
+        return value.result() if isinstance(value, Future) else value
+
+    async def aembed_text(self, text: str) -> np.ndarray:
+        value = self._submit(text)
+        return await asyncio.wrap_future(value) if isinstance(value, Future) else value
+
+    def stats(self) -> dict:
+        with self._lock:
+            saved = self.hits + self.deduplicated
+            return {
+                "stored": len(self.store),
+                "requested": self.requested,
+                "hits": self.hits,
+                "deduplicated": self.deduplicated,
+                "embedded": self.embedded,
+                "hit_rate": round(saved / self.requested, 3) if self.requested else 0.0,
+                "api_calls": self.api_calls,
+                "failed_calls": self.failed_calls,
+                # against one request per text, which is what embed_text() used to cost
+                "api_calls_saved": self.requested - self.api_calls - self.failed_calls,
+                "avg_batch_size": round(self.embedded / self.api_calls, 1) if self.api_calls else 0.0,
+            }
+
+
+_default_service = None
+_default_service_lock = threading.Lock()
+
+
+def default_service() -> EmbeddingService:
+    """
+    Process-wide service for EMBEDDING_MODEL at full size.
+    """
+    global _default_service
+    with _default_service_lock:
+        if _default_service is None:
+            _default_service = EmbeddingService()
+        return _default_service
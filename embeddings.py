@@ -1,14 +1,78 @@
-from dotenv import load_dotenv
-from openai import OpenAI
+import hashlib
+import re
 
-load_dotenv()
+import numpy as np
 
-client = OpenAI()
+from llm_clients import get_client
 
-text = 'Eiffel Tower is in Paris and it is one of the most famous landmarks in the world.'
-response = client.embeddings.create(
-    input=text,
-    model="text-embedding-3-small"
-)
+EMBEDDING_MODEL = "text-embedding-3-small"
+# the embeddings endpoint accepts up to 2048 inputs per request
+MAX_INPUTS_PER_REQUEST = 2048
 
-print('vector embedding:', response.data[0].embedding)
\ No newline at end of file
+def embed_text(text: str, client=None, model: str = EMBEDDING_MODEL) -> list:
+    client = client or get_client("openai", response_cache=False)
+    response = client.embeddings.create(
+        input=text,
+        model=model
+    )
+    return response.data[0].embedding
+
+def embed_texts(texts, client=None, model: str = EMBEDDING_MODEL, batch_size: int = MAX_INPUTS_PER_REQUEST,
+                dimensions: int = None) -> np.ndarray:
+    """
+    Embeds a whole collection with one API call per batch of `batch_size` texts.
+    Returns a float32 matrix with one row per text (same order as texts).
+    `dimensions` asks text-embedding-3 models for shortened vectors.
+    """
+    client = client or get_client("openai", response_cache=False)
+    extra = {"dimensions": dimensions} if dimensions else {}
+    rows = []
+    for start in range(0, len(texts), batch_size):
+        batch = list(texts[start:start + batch_size])
+        response = client.embeddings.create(input=batch, model=model, **extra)
+        # the API documents data[i].index, don't rely on response order
+        for item in sorted(response.data, key=lambda d: d.index):
+            rows.append(item.embedding)
+    return np.asarray(rows, dtype=np.float32).reshape(len(rows), -1)
+
+# ------------------ Pluggable embedders ------------------
+# anything with `dim` and `embed(texts) -> float32 matrix` can back the vector index
+
+class OpenAIEmbedder:
+    # text-embedding-3-small is 1536-d; a smaller dim (e.g. 256) keeps a
+    # million-chunk index at 1 GB and its brute-force queries fast
+    def __init__(self, client=None, model: str = EMBEDDING_MODEL, dim: int = 1536, batch_size: int = MAX_INPUTS_PER_REQUEST):
+        self.client = client or get_client("openai", response_cache=False)
+        self.model = model
+        self.dim = dim
+        self.batch_size = batch_size
+
+    def embed(self, texts) -> np.ndarray:
+        dimensions = self.dim if self.dim != 1536 else None
+        return embed_texts(texts, client=self.client, model=self.model, batch_size=self.batch_size,
+                           dimensions=dimensions)
+
+class HashEmbedder:
+    """
+    Deterministic local stand-in (no network): hashed bag of words.
+    Texts that share words get similar vectors, which is enough for offline tests.
+    """
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+
+    def _bucket(self, token: str):
+        digest = hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest()
+        value = int.from_bytes(digest, "little")
+        return value % self.dim, 1.0 if (value >> 63) & 1 else -1.0
+
+    def embed(self, texts) -> np.ndarray:
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for token in re.findall(r"\w+", text.lower()):
+                col, sign = self._bucket(token)
+                matrix[row, col] += sign
+        return matrix
+
+if __name__ == "__main__":
+    text = 'Eiffel Tower is in Paris and it is one of the most famous landmarks in the world.'
+    print('vector embedding:', embed_text(text))
@@ -0,0 +1,184 @@
+# function_calling.py
+# Agent engine on the OpenAI-compatible tools / tool_calls API.
+#
+# The JSON step protocol (plan -> action -> observe -> result) costs one model
+# round trip per step. With native function calling a single completion
+# carries the tool calls (several at once when they are independent) and the
+# next one already sees their results as "tool" messages, so a weather
+# question takes two calls instead of four.
+#
+# Backends that reject `tools` are handed to a fallback, normally the JSON
+# protocol engine of the agent.
+#
+#   engine = FunctionCallingEngine(client, "gemini-2.5-flash", {
+#       "get_weather": {"fn": get_weather, "description": "...",
+#                       "parameters": string_parameter("city", "City name")},
+#   })
+#   answer = engine.run(messages, "weather of Paris and Rome?")
+import json
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+from rate_limiter import call_with_retry, print_retry, shared_limiter, status_code
+from tracing import record_usage, tracer
+
+# what OpenAI-compatible servers answer when they do not support `tools`:
+# one of these statuses, with a message naming tools as the problem
+# ("gemma:2b does not support tools", "tools are not supported",
+# "\"auto\" tool choice requires --enable-auto-tool-choice ...").
+# Any other 400 (bad message, context too long) is a real error.
+TOOLS_UNSUPPORTED_STATUS = {400, 404, 422}
+TOOLS_MENTION = re.compile(r"\btools?\b|tool[ _]choice|tool use|function[ _]?call", re.IGNORECASE)
+UNSUPPORTED_MENTION = re.compile(r"not supported|unsupported|(?:does ?n[o']t|not) support|requires --",
+                                 re.IGNORECASE)
+
+
+def tools_unsupported(error) -> bool:
+    if status_code(error) not in TOOLS_UNSUPPORTED_STATUS:
+        return False
+    text = str(error)  # the SDK errors include the response body
+    return bool(TOOLS_MENTION.search(text) and UNSUPPORTED_MENTION.search(text))
+
+
+def string_parameter(name: str, description: str) -> dict:
+    """
+    JSON schema for a tool taking a single required string argument.
+    """
+    return {
+        "type": "object",
+        "properties": {name: {"type": "string", "description": description}},
+        "required": [name],
+    }
+
+
+def tool_schemas(tools: dict) -> list:
+    return [{
+        "type": "function",
+        "function": {
+            "name": name,
+            "description": tool["description"],
+            "parameters": tool.get("parameters", {"type": "object", "properties": {}}),
+        },
+    } for name, tool in tools.items()]
+
+
+class FunctionCallingEngine:
+    """
+    tools: {name: {"fn": callable(**arguments) -> result, "description": str, "parameters": json schema}}
+    fallback(messages, query) -> answer is used when the backend rejects tools.
+    """
+
+    def __init__(self, client, model: str, tools: dict, fallback=None, history=None, limiter=shared_limiter,
+                 max_steps: int = 10, max_workers: int = 8, on_retry=print_retry):
+        self.client = client
+        self.model = model
+        self.tools = tools
+        self.schemas = tool_schemas(tools)
+        self.fallback = fallback
+        self.history = history
+        self.limiter = limiter
+        self.max_steps = max_steps
+        self.max_workers = max_workers
+        self.on_retry = on_retry
+        self.tools_supported = True
+        # counters
+        self.calls = 0
+        self.tool_calls = 0
+        self.fallbacks = 0
+
+    def _complete(self, messages):
+        self.calls += 1
+        tokens = self.history.total_tokens(messages) if self.history is not None else 0
+        with tracer.span("llm", engine="tools", model=self.model) as span:
+            response = call_with_retry(
+                lambda: self.client.chat.completions.create(
+                    model=self.model,
+                    messages=messages,
+                    tools=self.schemas,
+                    tool_choice="auto",
+                ),
+                limiter=self.limiter,
+                tokens=tokens,
+                on_retry=self.on_retry,
+            )
+            record_usage(response)
+            span.set(step="tool_calls" if response.choices[0].message.tool_calls else "answer")
+        return response
+
+    def _run_tool(self, call) -> str:
+        with tracer.span("tool", tool=call.function.name) as span:
+            result = self._call_tool(call)
+            span.set(ok=not result.startswith("ERROR"))
+        return result
+
+    def _call_tool(self, call) -> str:
+        tool = self.tools.get(call.function.name)
+        if tool is None:
+            return f"ERROR: unknown tool '{call.function.name}'"
+        try:
+            arguments = json.loads(call.function.arguments or "{}")
+        except ValueError as e:
+            return f"ERROR: arguments for {call.function.name} are not valid JSON: {e}"
+        try:
+            result = tool["fn"](**arguments)
+        except Exception as e:
+            return f"ERROR: {call.function.name} failed: {e}"
+        return result if isinstance(result, str) else json.dumps(result)
+
+    def _run_tools(self, calls) -> list:
+        self.tool_calls += len(calls)
+        if len(calls) == 1:
+            return [self._run_tool(calls[0])]
+        # independent calls from one completion run concurrently
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(calls))) as pool:
+            return list(pool.map(self._run_tool, calls))
+
+    def _use_fallback(self, messages, user_message):
+        self.fallbacks += 1
+        # drop this turn (compaction may have moved it), the fallback appends the query itself
+        turn_start = next(i for i, m in enumerate(messages) if m is user_message)
+        del messages[turn_start:]
+        return self.fallback(messages, user_message["content"])
+
+    def run(self, messages, query: str):
+        """
+        Resolve one user query; messages is extended in place.
+        Returns the final answer, or None if max_steps was reached.
+        """
+        user_message = {"role": "user", "content": query}
+        messages.append(user_message)
+        if not self.tools_supported and self.fallback is not None:
+            return self._use_fallback(messages, user_message)
+
+        for _ in range(self.max_steps):
+            if self.history is not None:
+                self.history.compact(messages)
+            try:
+                response = self._complete(messages)
+            except Exception as e:
+                if self.fallback is not None and tools_unsupported(e):
+                    self.tools_supported = False
+                    return self._use_fallback(messages, user_message)
+                raise
+
+            message = response.choices[0].message
+            if not message.tool_calls:
+                messages.append({"role": "assistant", "content": message.content or ""})
+                return message.content
+
+            messages.append({
+                "role": "assistant",
+                "content": message.content or "",
+                "tool_calls": [{
+                    "id": call.id,
+                    "type": "function",
+                    "function": {"name": call.function.name, "arguments": call.function.arguments},
+                } for call in message.tool_calls],
+            })
+            for call, result in zip(message.tool_calls, self._run_tools(message.tool_calls)):
+                messages.append({"role": "tool", "tool_call_id": call.id, "content": result})
+
+        return None
+
+    def stats(self) -> dict:
+        return {"calls": self.calls, "tool_calls": self.tool_calls, "fallbacks": self.fallbacks}
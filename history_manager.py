@@ -0,0 +1,225 @@
+# history_manager.py
+# Keeps agent conversations inside a token budget.
+#
+# The agents append every plan/action/observe step to `messages`, so without
+# compaction the prompt (and the latency of every call) grows with the session.
+import json
+
+from tokenization import DEFAULT_MODEL, count_tokens, get_encoder
+
+SUMMARY_PREFIX = "Summary of earlier steps (older messages were compacted):"
+
+# rough per-message overhead of the chat format (role, separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+# tool call arguments longer than this are elided in old messages (paths stay)
+ELIDE_ARGUMENT_CHARS = 200
+
+
+class HistoryManager:
+    """
+    compact(messages) edits the list in place:
+
+    1. leading system messages (and optionally the first user message) are pinned
+    2. the most recent `keep_recent` messages are never touched, and the latest
+       user message (the question of the current turn) is kept as it is
+    3. older messages get their write_file payloads (in content or tool_calls
+       arguments) elided and are truncated to `max_message_tokens`
+    4. if the total is still over `max_tokens`, the oldest messages are dropped
+       and replaced by one summary message right after the pinned ones
+
+    summarizer(dropped_messages, previous_summary) -> str can be plugged in
+    (e.g. an LLM call); the default is a cheap local one-line-per-step digest.
+    """
+
+    def __init__(self, max_tokens: int = 8000, keep_recent: int = 8, max_message_tokens: int = 600,
+                 summary_tokens: int = 600, pin_first_user: bool = False, summarizer=None,
+                 model: str = DEFAULT_MODEL):
+        self.max_tokens = max_tokens
+        self.keep_recent = keep_recent
+        self.max_message_tokens = max_message_tokens
+        self.summary_tokens = summary_tokens
+        self.pin_first_user = pin_first_user
+        self.summarizer = summarizer or summarize_steps
+        self.model = model
+        self.compactions = 0
+        self.dropped_messages = 0
+
+    # ------------------ measuring ------------------
+    def message_tokens(self, message) -> int:
+        tokens = count_tokens(str(message.get("content") or ""), self.model) + MESSAGE_OVERHEAD_TOKENS
+        if message.get("tool_calls"):
+            tokens += count_tokens(json.dumps(message["tool_calls"]), self.model)
+        return tokens
+
+    def total_tokens(self, messages) -> int:
+        return sum(self.message_tokens(m) for m in messages)
+
+    # ------------------ compaction ------------------
+    def _pinned_count(self, messages) -> int:
+        pinned = 0
+        while pinned < len(messages) and messages[pinned]["role"] == "system" \
+                and not is_summary(messages[pinned]):
+            pinned += 1
+        if self.pin_first_user and pinned < len(messages) and messages[pinned]["role"] == "user":
+            pinned += 1
+        return pinned
+
+    def _truncate(self, text: str) -> str:
+        encoder = get_encoder(self.model)
+        tokens = encoder.encode(text, disallowed_special=())
+        if len(tokens) <= self.max_message_tokens:
+            return text
+        kept = encoder.decode(tokens[:self.max_message_tokens])
+        return f"{kept}... [truncated {len(tokens) - self.max_message_tokens} tokens]"
+
+    def compact(self, messages):
+        if self.total_tokens(messages) <= self.max_tokens:
+            return messages
+
+        pinned = self._pinned_count(messages)
+        start = pinned
+        previous_summary = ""
+        if start < len(messages) and is_summary(messages[start]):
+            previous_summary = messages[start]["content"][len(SUMMARY_PREFIX):].strip()
+            start += 1
+        recent_start = max(start, len(messages) - self.keep_recent)
+        # tool results must stay with the assistant message that requested them
+        while recent_start > start and messages[recent_start].get("role") == "tool":
+            recent_start -= 1
+        # a long turn keeps the question it is answering, even once its own
+        # steps are compacted; it is moved right behind the summary
+        question = None
+        for i in range(len(messages) - 1, start - 1, -1):
+            if messages[i].get("role") == "user":
+                question = i if i < recent_start else None
+                break
+
+        # shrink old messages first, that alone is often enough
+        for i in range(start, recent_start):
+            if i == question:
+                continue
+            content = messages[i].get("content")
+            if isinstance(content, str):
+                messages[i] = {**messages[i], "content": self._truncate(elide_payloads(content))}
+            if messages[i].get("tool_calls"):
+                messages[i] = {**messages[i], "tool_calls": elide_tool_calls(messages[i]["tool_calls"])}
+
+        total = self.total_tokens(messages)
+        drop_end = start
+        while total > self.max_tokens and drop_end < recent_start:
+            if drop_end != question:
+                total -= self.message_tokens(messages[drop_end])
+            drop_end += 1
+        while drop_end < recent_start and messages[drop_end].get("role") == "tool":
+            total -= self.message_tokens(messages[drop_end])
+            drop_end += 1
+
+        dropped = [m for i, m in enumerate(messages[start:drop_end], start) if i != question]
+        if dropped or previous_summary:
+            kept = [messages[question]] if question is not None and question < drop_end else []
+            if dropped:
+                self.compactions += 1
+                self.dropped_messages += len(dropped)
+                summary = self.summarizer(dropped, previous_summary)
+            else:
+                summary = previous_summary
+            summary_message = {"role": "system", "content": f"{SUMMARY_PREFIX}\n{self._summary_tail(summary)}"}
+            messages[pinned:drop_end] = [summary_message, *kept]
+        return messages
+
+    def _summary_tail(self, summary: str) -> str:
+        # keep the newest part of the digest when it outgrows its budget
+        encoder = get_encoder(self.model)
+        tokens = encoder.encode(summary, disallowed_special=())
+        if len(tokens) <= self.summary_tokens:
+            return summary
+        return "..." + encoder.decode(tokens[-self.summary_tokens:])
+
+
+def is_summary(message) -> bool:
+    return message.get("role") == "system" and str(message.get("content", "")).startswith(SUMMARY_PREFIX)
+
+
+def elide_payloads(content: str) -> str:
+    """
+    Replaces file bodies inside write_file / batch action JSON with a size marker.
+    """
+    try:
+        parsed = json.loads(content)
+    except (TypeError, ValueError):
+        return content
+    if not isinstance(parsed, dict):
+        return content
+
+    def elide(action):
+        tool_input = action.get("tool_input") if isinstance(action, dict) else None
+        if isinstance(tool_input, dict) and isinstance(tool_input.get("content"), str):
+            size = len(tool_input["content"])
+            action["tool_input"] = {**tool_input, "content": f"<{size} chars elided>"}
+            return True
+        return False
+
+    changed = elide(parsed)
+    if parsed.get("function") == "batch" and isinstance(parsed.get("tool_input"), list):
+        changed = any([elide(action) for action in parsed["tool_input"]]) or changed
+    return json.dumps(parsed) if changed else content
+
+
+def elide_tool_calls(tool_calls) -> list:
+    """
+    Same for native tool calls: long strings in the JSON arguments (file
+    bodies, patch texts) are replaced with a size marker.
+    """
+    def elide(value):
+        if isinstance(value, str) and len(value) > ELIDE_ARGUMENT_CHARS:
+            return f"<{len(value)} chars elided>"
+        if isinstance(value, list):
+            return [elide(item) for item in value]
+        if isinstance(value, dict):
+            return {key: elide(item) for key, item in value.items()}
+        return value
+
+    elided = []
+    for call in tool_calls:
+        function = call.get("function") if isinstance(call, dict) else None
+        if isinstance(function, dict) and isinstance(function.get("arguments"), str):
+            try:
+                arguments = json.loads(function["arguments"])
+            except ValueError:
+                arguments = None
+            if arguments is not None and elide(arguments) != arguments:
+                call = {**call, "function": {**function, "arguments": json.dumps(elide(arguments))}}
+        elided.append(call)
+    return elided
+
+
+def summarize_steps(dropped, previous_summary: str = "") -> str:
+    """
+    Local digest: one short line per dropped step.
+    """
+    lines = [previous_summary] if previous_summary else []
+    for message in dropped:
+        content = str(message.get("content") or "")
+        try:
+            parsed = json.loads(content)
+        except (TypeError, ValueError):
+            parsed = None
+        if message.get("tool_calls"):
+            calls = ", ".join(f"{call['function']['name']}({call['function']['arguments'][:60]})"
+                              for call in message["tool_calls"])
+            line = f"called {calls}"
+        elif isinstance(parsed, dict):
+            step = parsed.get("step", "")
+            if step == "action":
+                target = parsed.get("tool_input")
+                if isinstance(target, dict):
+                    target = target.get("path", "")
+                elif isinstance(target, list):
+                    target = f"{len(target)} actions"
+                line = f"action {parsed.get('function', '')}: {str(target)[:80]}"
+            else:
+                line = f"{step}: {str(parsed.get('content', ''))[:120]}"
+        else:
+            line = f"{message.get('role')}: {content[:120]}"
+        lines.append(" ".join(line.split()))
+    return "\n".join(lines)
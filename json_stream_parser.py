@@ -0,0 +1,371 @@
+# json_stream_parser.py
+# Incremental JSON parser for streamed step-protocol replies.
+#
+# The agents used to json.loads() the reply once the whole completion had
+# arrived. Fed with the stream deltas instead, the parser reports every value
+# as soon as it is closed, so an agent knows `step` and `function` after the
+# first few tokens and can start the tool while the model is still generating
+# the rest (e.g. the content of a write_file):
+#
+#   parser = StreamParser(on_value=..., on_chunk=..., streamed=lambda path: path == ("tool_input", "content"))
+#   for delta in stream: parser.feed(delta)
+#   step = parser.close()
+#
+# - on_value(path, value): a value was completed; path is the tuple of keys /
+#   list indices from the top, e.g. ("step",) or ("tool_input", 3)
+# - on_chunk(path, text): the next decoded piece of a string for which
+#   streamed(path) is true, while it is still open (on_value follows at the end)
+#
+# Errors are raised as JSONStreamError, a json.JSONDecodeError with the same
+# "msg: line L column C (char N)" position as json.loads, counted over
+# everything fed so far. Complete replies are still parsed with json.loads,
+# which is much faster when there is nothing to start early.
+import json
+import re
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+# a run of string characters that need no decoding
+_STRING_RUN = re.compile(r'[^"\\\x00-\x1f]*')
+_LITERAL_RUN = re.compile(r"[-+.0-9a-zA-Z]*")
+_HEX = re.compile(r"[0-9a-fA-F]{4}")
+_NUMBER = re.compile(r"-?(?:0|[1-9][0-9]*)(\.[0-9]+)?([eE][-+]?[0-9]+)?")
+_CONSTANTS = {"true": True, "false": False, "null": None}
+_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+# structural states
+_VALUE = 0           # a value must follow (after ':' or ',' in a list)
+_VALUE_OR_END = 1    # after '['
+_KEY = 2             # after ',' in an object
+_KEY_OR_END = 3      # after '{'
+_COLON = 4
+_COMMA_OR_END = 5
+_DONE = 6
+# what json.loads reports when the text ends in each state
+_EXPECTING = {
+    _VALUE: "Expecting value",
+    _VALUE_OR_END: "Expecting value",
+    _KEY: "Expecting property name enclosed in double quotes",
+    _KEY_OR_END: "Expecting property name enclosed in double quotes",
+    _COLON: "Expecting ':' delimiter",
+    _COMMA_OR_END: "Expecting ',' delimiter",
+}
+
+
+class JSONStreamError(json.JSONDecodeError):
+    """
+    Parse error with its absolute position in the streamed text.
+    """
+
+    def __init__(self, msg: str, pos: int, lineno: int, colno: int):
+        ValueError.__init__(self, f"{msg}: line {lineno} column {colno} (char {pos})")
+        self.msg = msg
+        self.doc = None  # the text is not kept
+        self.pos = pos
+        self.lineno = lineno
+        self.colno = colno
+
+    def __reduce__(self):
+        return self.__class__, (self.msg, self.pos, self.lineno, self.colno)
+
+
+class StreamParser:
+    def __init__(self, on_value=None, on_chunk=None, streamed=None):
+        self.on_value = on_value
+        self.on_chunk = on_chunk
+        self.streamed = streamed
+        self.value = None
+        self.error = None
+        self._state = _VALUE
+        self._stack = []  # [container, key] per open object/list
+        # open string
+        self._in_string = False
+        self._is_key = False
+        self._parts = []
+        self._sent = 0  # parts already handed to on_chunk
+        self._string_path = None  # set while a streamed string is open
+        self._string_at = None  # _mark() of the opening quote
+        self._escape = None  # characters after a backslash, while incomplete
+        self._escape_at = None
+        self._high = None  # pending high surrogate of a \\uXXXX pair
+        # open number / true / false / null
+        self._literal = None
+        self._literal_at = None
+        # position bookkeeping
+        self._offset = 0  # characters fed before the current chunk
+        self._lines = 1
+        self._line_start = 0
+
+    # ------------------ Public API ------------------
+    def feed(self, text: str):
+        if self.error is not None:
+            raise self.error
+        try:
+            self._feed(text)
+        except JSONStreamError as e:
+            self.error = e
+            raise
+        lines = text.count("\n")
+        if lines:
+            self._lines += lines
+            self._line_start = self._offset + text.rfind("\n") + 1
+        self._offset += len(text)
+
+    def push(self, text: str):
+        """
+        feed() for stream callbacks: after an error the rest of the stream is
+        ignored, and close() raises the error.
+        """
+        if self.error is None:
+            try:
+                self.feed(text)
+            except JSONStreamError:
+                pass
+
+    def close(self):
+        """
+        Checks that the document is complete and returns it.
+        """
+        if self.error is not None:
+            raise self.error
+        try:
+            if self._literal is not None:
+                self._end_literal("", 0)
+            if self._in_string:
+                self._fail("Unterminated string starting at", "", 0, at=self._string_at)
+            if self._state != _DONE:
+                self._fail(_EXPECTING[self._state], "", 0)
+        except JSONStreamError as e:
+            self.error = e
+            raise
+        return self.value
+
+    @property
+    def path(self) -> tuple:
+        """
+        Path of the value being parsed right now.
+        """
+        return tuple(key if isinstance(container, dict) else len(container) for container, key in self._stack)
+
+    # ------------------ Scanner ------------------
+    def _feed(self, text: str):
+        i, n = 0, len(text)
+        while i < n:
+            if self._in_string:
+                i = self._scan_string(text, i)
+                continue
+            if self._literal is not None:
+                end = _LITERAL_RUN.match(text, i).end()
+                self._literal += text[i:end]
+                if end == n:
+                    break  # the number may go on in the next chunk
+                self._end_literal(text, end)
+                i = end
+                continue
+            i = _WHITESPACE.match(text, i).end()
+            if i == n:
+                break
+            c = text[i]
+            state = self._state
+            if state in (_VALUE, _VALUE_OR_END):
+                if c == '"':
+                    self._start_string(False, self._mark(text, i))
+                elif c == "{":
+                    self._stack.append([{}, None])
+                    self._state = _KEY_OR_END
+                elif c == "[":
+                    self._stack.append([[], None])
+                    self._state = _VALUE_OR_END
+                elif c == "]" and state == _VALUE_OR_END:
+                    self._close_container()
+                elif c == "-" or c.isdigit() or c in "tfn":
+                    self._literal = ""
+                    self._literal_at = self._mark(text, i)
+                    continue  # read by the literal branch
+                else:
+                    self._fail("Expecting value", text, i)
+            elif state in (_KEY, _KEY_OR_END):
+                if c == '"':
+                    self._start_string(True, self._mark(text, i))
+                elif c == "}" and state == _KEY_OR_END:
+                    self._close_container()
+                else:
+                    self._fail("Expecting property name enclosed in double quotes", text, i)
+            elif state == _COLON:
+                if c != ":":
+                    self._fail("Expecting ':' delimiter", text, i)
+                self._state = _VALUE
+            elif state == _COMMA_OR_END:
+                container = self._stack[-1][0]
+                if c == ",":
+                    self._state = _KEY if isinstance(container, dict) else _VALUE
+                elif c == ("}" if isinstance(container, dict) else "]"):
+                    self._close_container()
+                else:
+                    self._fail("Expecting ',' delimiter", text, i)
+            else:
+                self._fail("Extra data", text, i)
+            i += 1
+        if self._in_string and self._string_path is not None:
+            self._send_chunk()
+
+    def _start_string(self, is_key: bool, at: tuple):
+        self._in_string = True
+        self._is_key = is_key
+        self._parts = []
+        self._sent = 0
+        self._string_at = at
+        path = None
+        if not is_key and self.streamed is not None and self.on_chunk is not None:
+            path = self.path
+            if not self.streamed(path):
+                path = None
+        self._string_path = path
+
+    def _scan_string(self, text: str, i: int) -> int:
+        """
+        Consumes string characters from text[i:]; returns where to continue.
+        """
+        if self._escape is not None:
+            return self._scan_escape(text, i)
+        end = _STRING_RUN.match(text, i).end()
+        if end > i:
+            self._add(text[i:end])
+        if end == len(text):
+            return end
+        c = text[end]
+        if c == '"':
+            self._end_string()
+        elif c == "\\":
+            escaped = _ESCAPES.get(text[end + 1:end + 2])
+            if escaped is not None:  # the common case, both characters in this chunk
+                self._add(escaped)
+                return end + 2
+            self._escape = ""
+            self._escape_at = self._mark(text, end)
+        else:
+            self._fail("Invalid control character at", text, end)
+        return end + 1
+
+    def _scan_escape(self, text: str, i: int) -> int:
+        n = len(text)
+        while i < n:
+            self._escape += text[i]
+            i += 1
+            escape = self._escape
+            if escape[0] != "u":
+                if escape not in _ESCAPES:
+                    self._fail("Invalid \\escape", text, i, at=self._escape_at)
+                self._escape = None
+                self._add(_ESCAPES[escape])
+                return i
+            if len(escape) == 5:
+                if not _HEX.fullmatch(escape, 1):
+                    at = self._escape_at  # json points at the "u"
+                    self._fail("Invalid \\uXXXX escape", text, i, at=(at[0], at[1] + 1, *at[2:]))
+                self._escape = None
+                self._add_code_unit(int(escape[1:], 16))
+                return i
+        return i
+
+    def _add_code_unit(self, code: int):
+        if self._high is not None:
+            high, self._high = self._high, None
+            if 0xDC00 <= code <= 0xDFFF:
+                self._add(chr(0x10000 + ((high - 0xD800) << 10) + (code - 0xDC00)))
+                return
+            self._add(chr(high))  # lone surrogate, as json.loads keeps it
+        if 0xD800 <= code <= 0xDBFF:
+            self._high = code
+        else:
+            self._add(chr(code))
+
+    def _add(self, piece: str):
+        if self._high is not None:
+            high, self._high = self._high, None
+            self._parts.append(chr(high))
+        self._parts.append(piece)
+
+    def _send_chunk(self):
+        if self._sent < len(self._parts):
+            chunk = "".join(self._parts[self._sent:])
+            self._sent = len(self._parts)
+            self.on_chunk(self._string_path, chunk)
+
+    def _end_string(self):
+        if self._high is not None:
+            self._add("")  # flushes the lone surrogate
+        if self._string_path is not None:
+            self._send_chunk()
+        self._in_string = False
+        value = "".join(self._parts)
+        self._parts = []
+        if self._is_key:
+            self._stack[-1][1] = value
+            self._state = _COLON
+        else:
+            self._value_done(value)
+
+    def _end_literal(self, text: str, i: int):
+        token, self._literal = self._literal, None
+        if token in _CONSTANTS:
+            self._value_done(_CONSTANTS[token])
+            return
+        match = _NUMBER.match(token)
+        length = match.end() if match else next((len(c) for c in _CONSTANTS if token.startswith(c)), 0)
+        if not length:
+            self._fail("Expecting value", text, i, at=self._literal_at)
+        if length < len(token):
+            # "1x", "3.", "truex": a value followed by something that cannot follow a value
+            at = self._literal_at
+            self._fail("Expecting ',' delimiter" if self._stack else "Extra data", text, i,
+                       at=(at[0], at[1] + length, *at[2:]))
+        self._value_done(float(token) if match.group(1) or match.group(2) else int(token))
+
+    def _close_container(self):
+        container, _ = self._stack.pop()
+        self._value_done(container)
+
+    def _value_done(self, value):
+        path = self.path
+        if self._stack:
+            container, key = self._stack[-1]
+            if isinstance(container, dict):
+                container[key] = value
+            else:
+                container.append(value)
+            self._state = _COMMA_OR_END
+        else:
+            self.value = value
+            self._state = _DONE
+        if self.on_value is not None:
+            self.on_value(path, value)
+
+    def _mark(self, text: str, i: int) -> tuple:
+        # line/column are only worked out if the mark ends up in an error
+        return text, i, self._offset, self._lines, self._line_start
+
+    def _fail(self, msg: str, text: str, i: int, at: tuple = None):
+        text, i, offset, lineno, line_start = at or self._mark(text, i)
+        newlines = text.count("\n", 0, i)
+        if newlines:
+            lineno += newlines
+            line_start = offset + text.rfind("\n", 0, i) + 1
+        pos = offset + i
+        raise JSONStreamError(msg, pos, lineno, pos - line_start + 1)
+
+
+def check_object(value) -> dict:
+    """
+    A step-protocol reply must be one JSON object.
+    """
+    if not isinstance(value, dict):
+        raise ValueError(f"expected a JSON object, got {type(value).__name__}")
+    return value
+
+
+def parse_error_message(error: Exception) -> str:
+    """
+    Observation handed back to the model when its reply was not valid JSON.
+    """
+    return (f"ERROR: your last reply was not a valid JSON object ({error}). "
+            "Reply again with exactly one JSON object that follows the protocol.")
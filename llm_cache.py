@@ -0,0 +1,292 @@
+# llm_cache.py
+# Response cache for chat completions.
+#
+#   client = CachedChatClient(OpenAI())
+#   client.chat.completions.create(model=..., messages=...)   # same call as before
+#
+# - exact layer: key = sha256(model + messages + other params)
+# - semantic layer (optional): same model/params/earlier messages and a last
+#   user message whose embedding is within `similarity_threshold` (cosine)
+# - everything lives in one SQLite file, least recently used entries are
+#   evicted once the stored responses exceed `max_bytes`
+# - stream=True works too: hits are replayed as a one-chunk stream, misses are
+#   stored once the live stream has been fully consumed
+import hashlib
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from types import SimpleNamespace
+
+import rate_limiter
+import tracing
+
+DEFAULT_CACHE_PATH = os.getenv("LLM_CACHE_PATH", ".llm_cache.sqlite3")
+DEFAULT_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+
+def _stable_json(value) -> str:
+    return json.dumps(value, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+def request_key(params: dict) -> str:
+    return hashlib.sha256(_stable_json(params).encode("utf-8")).hexdigest()
+
+
+def context_key(params: dict) -> str:
+    """
+    Everything except the last message: semantic matches are only allowed
+    between requests that share model, settings and earlier conversation.
+    """
+    context = {**params, "messages": list(params.get("messages", []))[:-1]}
+    return request_key(context)
+
+
+def _normalize(vector) -> array:
+    norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+    return array("f", (x / norm for x in vector))
+
+
+class ResponseCache:
+    """
+    SQLite-backed store of serialized chat completions.
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, max_bytes: int = DEFAULT_MAX_BYTES,
+                 embed_fn=None, similarity_threshold: float = 0.95):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.embed_fn = embed_fn  # text -> list[float]; None disables the semantic layer
+        self.similarity_threshold = similarity_threshold
+        self._lock = threading.Lock()
+        # several agent processes share the file: WAL lets them read while one
+        # writes, and a writer waits for the lock instead of failing at once
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                context TEXT NOT NULL,
+                response TEXT NOT NULL,
+                embedding BLOB,
+                size INTEGER NOT NULL,
+                last_access REAL NOT NULL
+            )"""
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_context ON responses(context)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_access ON responses(last_access)")
+        self._db.commit()
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _touch(self, key):
+        self._db.execute("UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), key))
+        self._db.commit()
+
+    def get_exact(self, key: str):
+        with self._lock:
+            row = self._db.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                self._touch(key)
+            return row[0] if row else None
+
+    def get_similar(self, context: str, vector: array):
+        """
+        Best cached response in the same context with cosine >= threshold.
+        Vectors are stored normalized, so cosine is a plain dot product.
+        """
+        best_key, best_response, best_score = None, None, self.similarity_threshold
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT key, response, embedding FROM responses WHERE context = ? AND embedding IS NOT NULL",
+                (context,),
+            ).fetchall()
+            for key, response, blob in rows:
+                candidate = array("f")
+                candidate.frombytes(blob)
+                if len(candidate) != len(vector):
+                    continue
+                score = sum(a * b for a, b in zip(vector, candidate))
+                if score >= best_score:
+                    best_key, best_response, best_score = key, response, score
+            if best_key is not None:
+                self._touch(best_key)
+        return best_response
+
+    def put(self, key: str, context: str, response: str, vector=None):
+        blob = vector.tobytes() if vector is not None else None
+        size = len(response.encode("utf-8")) + (len(blob) if blob else 0)
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, context, response, embedding, size, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, context, response, blob, size, time.time()),
+            )
+            self._evict()
+            self._db.commit()
+
+    def _evict(self):
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self._db.execute("SELECT key, size FROM responses ORDER BY last_access").fetchall():
+            if total <= self.max_bytes:
+                break
+            self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+            self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM responses")
+            self._db.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries, size = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        return {
+            "entries": entries,
+            "bytes": size,
+            "hits": self.hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+class CachedChatClient:
+    """
+    Drop-in wrapper: exposes client.chat.completions.create and forwards every
+    other attribute to the wrapped OpenAI-compatible client.
+    """
+
+    def __init__(self, client, cache: ResponseCache = None):
+        self.client = client
+        self.cache = cache or default_cache()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+    def _semantic_vector(self, messages):
+        if self.cache.embed_fn is None or not messages:
+            return None
+        last = messages[-1]
+        if last.get("role") != "user" or not isinstance(last.get("content"), str):
+            return None
+        return _normalize(self.cache.embed_fn(last["content"]))
+
+    def create(self, **params):
+        # multi-choice requests are passed straight through
+        if params.get("n") not in (None, 1):
+            return self.client.chat.completions.create(**params)
+
+        stream = bool(params.get("stream"))
+        # streamed and non-streamed calls share cache entries
+        lookup = {k: v for k, v in params.items() if k not in ("stream", "stream_options")}
+        key = request_key(lookup)
+        cached = self.cache.get_exact(key)
+        if cached is not None:
+            self.cache.hits += 1
+            tracing.annotate(cache="hit")
+            rate_limiter.report_cache_hit()
+            return self._from_cache(cached, stream)
+
+        messages = list(params.get("messages", []))
+        context = context_key(lookup)
+        vector = self._semantic_vector(messages)
+        if vector is not None:
+            cached = self.cache.get_similar(context, vector)
+            if cached is not None:
+                self.cache.semantic_hits += 1
+                tracing.annotate(cache="semantic")
+                rate_limiter.report_cache_hit()
+                return self._from_cache(cached, stream)
+
+        self.cache.misses += 1
+        tracing.annotate(cache="miss")
+        response = self.client.chat.completions.create(**params)
+        if stream:
+            return self._record_stream(response, key, context, vector)
+        self.cache.put(key, context, response.model_dump_json(), vector)
+        return response
+
+    def _from_cache(self, cached: str, stream: bool):
+        # the SDK types are imported late so a cache-only import stays cheap
+        from openai.types.chat import ChatCompletion, ChatCompletionChunk
+
+        completion = ChatCompletion.model_validate_json(cached)
+        if not stream:
+            return completion
+        return iter([ChatCompletionChunk.model_validate({
+            "id": completion.id,
+            "object": "chat.completion.chunk",
+            "created": completion.created,
+            "model": completion.model,
+            "choices": [{
+                "index": choice.index,
+                "delta": {"role": "assistant", "content": choice.message.content},
+                "finish_reason": choice.finish_reason,
+            } for choice in completion.choices],
+        })])
+
+    def _record_stream(self, stream, key, context, vector):
+        """
+        Yields the live chunks and stores the assembled completion at the end.
+        Interrupted streams are not cached.
+        """
+        parts, first, finish_reason = [], None, None
+        for chunk in stream:
+            first = first or chunk
+            if chunk.choices:
+                choice = chunk.choices[0]
+                parts.append(choice.delta.content or "")
+                finish_reason = choice.finish_reason or finish_reason
+            yield chunk
+        if first is None or finish_reason is None:
+            return
+        from openai.types.chat import ChatCompletion
+
+        completion = ChatCompletion.model_validate({
+            "id": first.id,
+            "object": "chat.completion",
+            "created": first.created,
+            "model": first.model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": "".join(parts)},
+                "finish_reason": finish_reason,
+            }],
+        })
+        self.cache.put(key, context, completion.model_dump_json(), vector)
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def default_cache() -> ResponseCache:
+    """
+    Process-wide cache at LLM_CACHE_PATH. LLM_SEMANTIC_CACHE=1 turns on the
+    embedding layer (threshold from LLM_SEMANTIC_THRESHOLD).
+    """
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            embed_fn = None
+            if os.getenv("LLM_SEMANTIC_CACHE") == "1":
+                # repeated prompts are embedded once, concurrent ones share requests
+                from embedding_service import default_service
+
+                embed_fn = default_service().embed_text
+            _default_cache = ResponseCache(
+                embed_fn=embed_fn,
+                similarity_threshold=float(os.getenv("LLM_SEMANTIC_THRESHOLD", "0.95")),
+            )
+        return _default_cache
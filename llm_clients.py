@@ -0,0 +1,121 @@
+# llm_clients.py
+# One place that builds the LLM clients used by the scripts and agents.
+#
+# SDKs are imported only for the backend that is actually used, and only when
+# the first request is made: `import openai` alone takes most of a second, and
+# google.genai is not needed at all by the OpenAI-compatible scripts.
+#
+#   client = lazy_client("gemini", max_retries=0)   # nothing imported yet
+#   client.chat.completions.create(...)              # SDK loaded + client built here
+#
+# LLM_REPLAY=record:<file> / replay:<file> records or replays the traffic (llm_replay.py).
+import os
+import threading
+from functools import lru_cache
+
+GEMINI_BASE_URL = "https://generativelanguage.googleapis.com/v1beta/openai/"
+OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://localhost:11434")
+
+# OpenAI-compatible backends: where to send requests and which env var holds the key
+PROVIDERS = {
+    "openai": {"base_url": None, "api_key_env": "OPENAI_API_KEY"},
+    "gemini": {"base_url": GEMINI_BASE_URL, "api_key_env": "GOOGLE_API_KEY"},
+    # Ollama ignores the key, but the SDK insists on one
+    "ollama": {"base_url": f"{OLLAMA_HOST.rstrip('/')}/v1", "api_key_env": None, "api_key": "ollama"},
+}
+
+_env_loaded = False
+_env_lock = threading.Lock()
+
+
+def load_env():
+    """
+    Reads .env once per process (python-dotenv is imported on first call).
+    """
+    global _env_loaded
+    with _env_lock:
+        if not _env_loaded:
+            from dotenv import load_dotenv
+
+            load_dotenv()
+            _env_loaded = True
+
+
+def create_client(provider: str = "gemini", asynchronous: bool = False, max_retries: int = None,
+                  response_cache: bool = True):
+    """
+    A new OpenAI-compatible client for `provider`. Sync clients are wrapped in
+    the local response cache unless response_cache=False, which agent loops
+    and multi-turn chats need: a replayed answer would freeze their state.
+    Use get_client() unless the caller owns (and closes) the client.
+    """
+    if provider not in PROVIDERS:
+        raise ValueError(f"unknown provider '{provider}', expected one of {sorted(PROVIDERS)}")
+    load_env()
+    config = PROVIDERS[provider]
+    kwargs = {"api_key": os.getenv(config["api_key_env"]) if config["api_key_env"] else config["api_key"]}
+    if config["base_url"]:
+        kwargs["base_url"] = config["base_url"]
+    if max_retries is not None:
+        kwargs["max_retries"] = max_retries
+    if os.getenv("LLM_REPLAY"):
+        # record/replay fixtures (llm_replay.py) at the HTTP level
+        import httpx
+        from llm_replay import transport_from_env
+
+        transport = transport_from_env()
+        kwargs["http_client"] = (httpx.AsyncClient if asynchronous else httpx.Client)(transport=transport)
+        kwargs["api_key"] = kwargs["api_key"] or "replay"  # a replayed run needs no real key
+
+    if asynchronous:
+        from openai import AsyncOpenAI
+
+        return AsyncOpenAI(**kwargs)
+
+    from openai import OpenAI
+
+    client = OpenAI(**kwargs)
+    if response_cache:
+        from llm_cache import CachedChatClient
+
+        client = CachedChatClient(client)
+    return client
+
+
+# shared client per argument combination (connection pools are reused)
+get_client = lru_cache(maxsize=None)(create_client)
+
+
+@lru_cache(maxsize=None)
+def get_genai_client():
+    """
+    Native google-genai client (for scripts using generate_content directly).
+    """
+    load_env()
+    from google import genai
+
+    return genai.Client(api_key=os.getenv("GOOGLE_API_KEY"))
+
+
+class LazyClient:
+    """
+    Stands in for a client at module level; the real one is built by
+    get_client() on first attribute access.
+    """
+
+    def __init__(self, provider: str = "gemini", **options):
+        self.provider = provider
+        self.options = options
+
+    def resolve(self):
+        return get_client(self.provider, **self.options)
+
+    def __getattr__(self, name):
+        return getattr(self.resolve(), name)
+
+    def __repr__(self):
+        return f"LazyClient({self.provider!r}, {self.options})"
+
+
+def lazy_client(provider: str = "gemini", **options) -> LazyClient:
+    return LazyClient(provider, **options)
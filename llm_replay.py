@@ -0,0 +1,203 @@
+# llm_replay.py
+# Record/replay of LLM HTTP traffic, so agent runs can be reproduced offline.
+#
+# It hooks in at the httpx transport, which both the OpenAI SDK (Gemini,
+# OpenAI and Ollama's /v1 endpoint) and the ollama client sit on:
+#
+#   LLM_REPLAY=record:fixtures/weather.jsonl   real requests, every response appended to the file
+#   LLM_REPLAY=replay:fixtures/weather.jsonl   answered from the file, no network at all
+#
+# Fixtures are keyed by method + path + canonical JSON body. Identical
+# requests are answered in the order they were recorded (the last answer is
+# repeated once they run out). In replay mode a request that was never
+# recorded is answered with 501, so a changed prompt fails fast with a clear
+# error instead of silently reaching the network.
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque
+
+import httpx
+
+# dropped when storing: the body is stored decoded and re-framed on replay
+HOP_HEADERS = {"content-encoding", "content-length", "transfer-encoding", "connection", "keep-alive"}
+# not retryable (rate_limiter) and not "tools unsupported" (function_calling); an
+# exception raised in the transport would reach callers as a retryable connection error
+MISS_STATUS = 501
+
+
+def canonical_body(content: bytes) -> str:
+    text = content.decode("utf-8", errors="surrogateescape")
+    try:
+        return json.dumps(json.loads(text), sort_keys=True, separators=(",", ":"))
+    except ValueError:
+        return text
+
+
+def request_key(request: httpx.Request) -> str:
+    raw = f"{request.method} {request.url.path}\n{canonical_body(request.content)}"
+    return hashlib.blake2b(raw.encode("utf-8", errors="surrogateescape"), digest_size=16).hexdigest()
+
+
+class FixtureStore:
+    """
+    One JSONL file of {"key", "method", "path", "status", "headers", "body", "elapsed_ms"} records.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.responses = defaultdict(deque)
+        self.recorded = 0
+        self.replayed = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self.responses[entry["key"]].append(entry)
+
+    def add(self, request: httpx.Request, status: int, headers, body: bytes, elapsed: float):
+        entry = {
+            "key": request_key(request),
+            "method": request.method,
+            "path": request.url.path,
+            "status": status,
+            "headers": _end_to_end(headers),
+            "body": body.decode("utf-8", errors="surrogateescape"),
+            "elapsed_ms": round(elapsed * 1000, 3),
+        }
+        with self._lock:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+            self.recorded += 1
+
+    def next(self, request: httpx.Request):
+        with self._lock:
+            queue = self.responses.get(request_key(request))
+            if not queue:
+                self.misses += 1
+                return None
+            self.replayed += 1
+            # keep the last answer for requests repeated more often than recorded
+            return queue.popleft() if len(queue) > 1 else queue[0]
+
+
+def _end_to_end(headers) -> dict:
+    return {k: v for k, v in headers.items() if k.lower() not in HOP_HEADERS}
+
+
+def _response(entry: dict, request: httpx.Request) -> httpx.Response:
+    return httpx.Response(entry["status"], headers=entry["headers"],
+                          content=entry["body"].encode("utf-8", errors="surrogateescape"), request=request)
+
+
+class RecordingTransport(httpx.BaseTransport, httpx.AsyncBaseTransport):
+    """
+    Sends requests for real and stores the responses. Streamed responses are
+    read completely before they are handed on.
+    """
+
+    def __init__(self, store: FixtureStore, transport=None, async_transport=None):
+        self.store = store
+        self.transport = transport or httpx.HTTPTransport()
+        self.async_transport = async_transport or httpx.AsyncHTTPTransport()
+
+    def handle_request(self, request):
+        start = time.perf_counter()
+        response = self.transport.handle_request(request)
+        try:
+            body = response.read()
+        finally:
+            response.close()
+        self.store.add(request, response.status_code, response.headers, body, time.perf_counter() - start)
+        return httpx.Response(response.status_code, headers=_end_to_end(response.headers), content=body,
+                              request=request)
+
+    async def handle_async_request(self, request):
+        start = time.perf_counter()
+        response = await self.async_transport.handle_async_request(request)
+        try:
+            body = await response.aread()
+        finally:
+            await response.aclose()
+        self.store.add(request, response.status_code, response.headers, body, time.perf_counter() - start)
+        return httpx.Response(response.status_code, headers=_end_to_end(response.headers), content=body,
+                              request=request)
+
+    def close(self):
+        self.transport.close()
+
+    async def aclose(self):
+        await self.async_transport.aclose()
+
+
+class ReplayTransport(httpx.BaseTransport, httpx.AsyncBaseTransport):
+    """
+    Answers from a FixtureStore. latency=True waits as long as the recorded
+    call took, for wall-time comparisons.
+    """
+
+    def __init__(self, store: FixtureStore, latency: bool = False):
+        self.store = store
+        self.latency = latency
+
+    def _lookup(self, request):
+        entry = self.store.next(request)
+        if entry is None:
+            message = f"no recorded response for {request.method} {request.url.path} in {self.store.path}"
+            return {"status": MISS_STATUS, "headers": {"content-type": "application/json"},
+                    "body": json.dumps({"error": {"message": message, "type": "replay_miss"}})}
+        return entry
+
+    def handle_request(self, request):
+        entry = self._lookup(request)
+        if self.latency:
+            time.sleep(entry.get("elapsed_ms", 0) / 1000)
+        return _response(entry, request)
+
+    async def handle_async_request(self, request):
+        entry = self._lookup(request)
+        if self.latency:
+            await asyncio.sleep(entry.get("elapsed_ms", 0) / 1000)
+        return _response(entry, request)
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def replay_mode(variable: str = "LLM_REPLAY"):
+    """
+    ("record" | "replay", fixture path) from e.g. LLM_REPLAY=replay:fixtures/run.jsonl, or None.
+    """
+    value = os.getenv(variable, "").strip()
+    if not value:
+        return None
+    mode, _, path = value.partition(":")
+    if mode not in ("record", "replay") or not path:
+        raise ValueError(f"{variable} must be record:<file> or replay:<file>, got {value!r}")
+    return mode, path
+
+
+def transport_from_env(variable: str = "LLM_REPLAY"):
+    """
+    The transport selected by LLM_REPLAY, or None when it is not set.
+    All clients of a process share one store per fixture file.
+    """
+    selected = replay_mode(variable)
+    if selected is None:
+        return None
+    mode, path = selected
+    with _stores_lock:
+        store = _stores.get(path)
+        if store is None:
+            store = _stores[path] = FixtureStore(path)
+    if mode == "record":
+        return RecordingTransport(store)
+    return ReplayTransport(store, latency=os.getenv("LLM_REPLAY_LATENCY") == "1")
@@ -0,0 +1,13 @@
+# metrics.py
+# Summary statistics shared by the modules that report latencies or counts
+# (tracing, provider_router, ollama_batcher, batch_runner).
+
+
+def percentile(values, pct: float) -> float:
+    """
+    Nearest-rank percentile of values; 0.0 when there are none.
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
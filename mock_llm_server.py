@@ -0,0 +1,441 @@
+# mock_llm_server.py
+# A tiny local stand-in for the OpenAI-compatible chat and embeddings API, the
+# Ollama API and wttr.in so the agents can be benchmarked without network
+# access or API quota.
+#
+# Answers are scripted from the request alone (ids included), so the same
+# conversation always gets the same responses and can be recorded/replayed.
+#
+# run it standalone:  python mock_llm_server.py   (listens on 127.0.0.1:8765)
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import uvicorn
+from fastapi import FastAPI, Body
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+
+# simulated latency of one model call / one weather lookup / one embeddings request (seconds)
+LLM_LATENCY = float(os.getenv("MOCK_LLM_LATENCY", "0.05"))
+WEATHER_LATENCY = float(os.getenv("MOCK_WEATHER_LATENCY", "0.02"))
+EMBEDDING_LATENCY = float(os.getenv("MOCK_EMBEDDING_LATENCY", "0.05"))
+# like OLLAMA_NUM_PARALLEL: requests beyond this many wait for a free slot
+OLLAMA_PARALLEL = int(os.getenv("MOCK_OLLAMA_PARALLEL", "4"))
+# share of chat completions answered with 429 + Retry-After (simulates a throttled provider)
+THROTTLE_RATE = float(os.getenv("MOCK_LLM_429_RATE", "0"))
+THROTTLE_RETRY_AFTER = os.getenv("MOCK_LLM_RETRY_AFTER", "1")
+# MOCK_LLM_NO_TOOLS=1 answers requests with `tools` with 400, like backends without function calling
+NO_TOOLS = os.getenv("MOCK_LLM_NO_TOOLS") == "1"
+# throttling draws from a seeded generator so runs are repeatable
+rng = random.Random(int(os.getenv("MOCK_LLM_SEED", "0")))
+
+CITY_PATTERN = re.compile(r"weather (?:of|in|for|at) ([A-Za-z][A-Za-z .'-]*)", re.IGNORECASE)
+
+app = FastAPI()
+
+
+def stable_id(*parts) -> str:
+    return hashlib.blake2b(json.dumps(parts, sort_keys=True, default=str).encode(), digest_size=6).hexdigest()
+
+
+def turn_steps(messages) -> list:
+    """
+    The JSON steps the assistant already emitted since the last user message.
+    """
+    steps = []
+    for message in reversed(messages):
+        if message["role"] == "user":
+            break
+        if message["role"] == "assistant":
+            try:
+                steps.append(json.loads(message["content"]).get("step"))
+            except (TypeError, ValueError, AttributeError):
+                steps.append(None)
+    return steps[::-1]
+
+
+def tool_call(name: str, arguments: dict, *seed):
+    return {"id": f"call_{stable_id(name, arguments, *seed)}", "type": "function",
+            "function": {"name": name, "arguments": json.dumps(arguments)}}
+
+
+def weather_protocol_step(messages):
+    """
+    Scripted replacement for the model in weather_agent.py.
+    Looks at the conversation and answers the next plan/action/result step.
+    """
+    last = messages[-1]
+    if last["role"] == "user":
+        match = CITY_PATTERN.search(last["content"])
+        city = match.group(1).strip(" ?.!") if match else "Hyderabad"
+        return {"step": "plan", "function": "", "tool_input": "",
+                "content": f"The user is interested in weather data of {city}"}
+
+    try:
+        previous = json.loads(last["content"])
+    except (TypeError, ValueError):
+        previous = {}
+
+    if previous.get("step") == "plan":
+        city = previous.get("content", "").rsplit(" of ", 1)[-1] or "Hyderabad"
+        return {"step": "action", "function": "get_weather", "tool_input": city, "content": ""}
+    if previous.get("step") == "observe":
+        return {"step": "result", "function": "", "tool_input": "",
+                "content": f"The current weather is {previous.get('content')}"}
+    return {"step": "result", "function": "", "tool_input": "", "content": "Done."}
+
+
+def weather_tools_step(messages):
+    """
+    Scripted replacement for the model when the request carries `tools`:
+    one get_weather call per city in the question (all in one message),
+    then the answer once the tool results are in.
+    Returns (content, tool_calls).
+    """
+    if messages and messages[-1]["role"] == "tool":
+        results = []
+        for message in reversed(messages):
+            if message["role"] != "tool":
+                break
+            results.append(message["content"])
+        return f"The current weather is {', '.join(reversed(results))}", None
+
+    question = messages[-1]["content"] if messages else ""
+    match = CITY_PATTERN.search(question)
+    cities = re.split(r",|\band\b", match.group(1)) if match else ["Hyderabad"]
+    calls = [tool_call("get_weather", {"city": city.strip(" ?.!")}, question, i)
+             for i, city in enumerate(cities) if city.strip(" ?.!")]
+    return "", calls
+
+
+# ------------------ chat_3_auto (chain of thought) ------------------
+COT_STEPS = ["analyse", "think", "think", "Output", "Validate", "result"]
+
+
+def cot_step(messages):
+    question = next((m["content"] for m in reversed(messages) if m["role"] == "user"), "")
+    step = COT_STEPS[min(len(turn_steps(messages)), len(COT_STEPS) - 1)]
+    return {"step": step, "content": f"{step} ({question})"}
+
+
+# ------------------ cursor_like_agent (project scaffolds) ------------------
+def project_files(spec: dict) -> dict:
+    name = spec.get("project_name", "demo")
+    if spec.get("language") in ("javascript", "express", "js"):
+        return {
+            "package.json": json.dumps({"name": name, "main": "server.js", "dependencies": {"express": "^4"}}, indent=2),
+            "server.js": "const app = require('./src/app');\napp.listen(3000);\n",
+            "src/app.js": "const express = require('express');\nconst routes = require('./routes');\n"
+                          "const app = express();\napp.use(routes);\nmodule.exports = app;\n",
+            "src/routes/index.js": "const router = require('express').Router();\n"
+                                   "router.get('/', require('../controllers/home'));\nmodule.exports = router;\n",
+            "src/controllers/home.js": f"module.exports = (req, res) => res.json({{ name: '{name}' }});\n",
+            "src/models/item.js": "module.exports = class Item {};\n",
+        }
+    return {
+        "app/main.py": "from fastapi import FastAPI\n\nfrom app.routers import items\n\n"
+                       f"app = FastAPI(title={name!r})\napp.include_router(items.router)\n",
+        "app/routers/items.py": "from fastapi import APIRouter\n\nfrom app.services import items\n\n"
+                                "router = APIRouter()\n\n\n@router.get('/items')\n"
+                                "def list_items():\n    return items.all_items()\n",
+        "app/models/item.py": "from dataclasses import dataclass\n\n\n@dataclass\nclass Item:\n    name: str\n",
+        "app/schemas/item.py": "from pydantic import BaseModel\n\n\nclass ItemOut(BaseModel):\n    name: str\n",
+        "app/services/items.py": "def all_items():\n    return []\n",
+        "requirements.txt": "fastapi\nuvicorn\n",
+        "README.md": f"# {name}\n\nuvicorn app.main:app --reload\n",
+    }
+
+
+def project_spec(messages) -> dict:
+    for message in messages:
+        if message["role"] == "user":
+            try:
+                return json.loads(message["content"])
+            except (TypeError, ValueError):
+                return {}
+    return {}
+
+
+def project_folders(files) -> list:
+    folders = set()
+    for path in files:
+        parts = path.split("/")[:-1]
+        folders.update("/".join(parts[:i]) for i in range(1, len(parts) + 1))
+    return sorted(folders)
+
+
+def project_step(messages):
+    """
+    JSON protocol: plan, one batch of folders, one batch of files, result.
+    """
+    files = project_files(project_spec(messages))
+    steps = turn_steps(messages)
+    actions = steps.count("action")
+    if not steps:
+        return {"step": "plan", "function": "", "tool_input": "",
+                "content": f"Create {len(files)} files in {len(project_folders(files))} folders"}
+    if actions == 0:
+        return {"step": "action", "function": "batch", "content": "folders",
+                "tool_input": [{"function": "create_folder", "tool_input": folder} for folder in project_folders(files)]}
+    if actions == 1:
+        return {"step": "action", "function": "batch", "content": "files",
+                "tool_input": [{"function": "write_file", "tool_input": {"path": path, "content": content}}
+                               for path, content in files.items()]}
+    return {"step": "result", "function": "", "tool_input": "", "content": f"Created {len(files)} files"}
+
+
+def project_tools_step(messages):
+    """
+    Function calling: all folders in one message, all files in the next, then the summary.
+    """
+    files = project_files(project_spec(messages))
+    rounds = sum(1 for m in messages if m["role"] == "assistant" and m.get("tool_calls"))
+    if rounds == 0:
+        return "", [tool_call("create_folder", {"path": folder}) for folder in project_folders(files)]
+    if rounds == 1:
+        return "", [tool_call("write_file", {"path": path, "content": content}) for path, content in files.items()]
+    return f"Created {len(files)} files", None
+
+
+def scripted_step(messages):
+    """
+    JSON protocol reply, picked by which agent's system prompt is in use.
+    """
+    system = messages[0]["content"] if messages and messages[0]["role"] == "system" else ""
+    if "file-creation coding assistant" in system:
+        return project_step(messages)
+    if '"analyse" -> "think"' in system:
+        return cot_step(messages)
+    return weather_protocol_step(messages)
+
+
+def chat_completion(content: str, model: str, tool_calls=None, messages=None):
+    """
+    Wrap assistant content (and tool calls) in an OpenAI chat.completion payload.
+    """
+    message = {"role": "assistant", "content": content}
+    if tool_calls:
+        message["tool_calls"] = tool_calls
+    return {
+        "id": f"chatcmpl-{stable_id(messages, content, tool_calls)}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{
+            "index": 0,
+            "message": message,
+            "finish_reason": "tool_calls" if tool_calls else "stop",
+        }],
+        "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+    }
+
+
+def sse_stream(completion: dict, size: int = 16):
+    """
+    The same completion as a stream=True response (content in `size`-char deltas).
+    """
+    content = completion["choices"][0]["message"]["content"]
+
+    def chunk(delta, finish_reason=None):
+        return "data: " + json.dumps({
+            "id": completion["id"], "object": "chat.completion.chunk", "created": completion["created"],
+            "model": completion["model"],
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+        }) + "\n\n"
+
+    async def events():
+        yield chunk({"role": "assistant", "content": ""})
+        for start in range(0, len(content), size):
+            yield chunk({"content": content[start:start + size]})
+        yield chunk({}, "stop")
+        yield "data: [DONE]\n\n"
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+@app.post("/v1/chat/completions")
+async def completions(payload: dict = Body(...)):
+    if THROTTLE_RATE and rng.random() < THROTTLE_RATE:
+        return JSONResponse(
+            {"error": {"message": "Resource has been exhausted (mock)", "type": "rate_limit_exceeded", "code": 429}},
+            status_code=429, headers={"Retry-After": THROTTLE_RETRY_AFTER},
+        )
+    if payload.get("tools"):
+        if NO_TOOLS:
+            return JSONResponse({"error": {"message": "tools are not supported (mock)", "code": 400}},
+                                status_code=400)
+        await asyncio.sleep(LLM_LATENCY)
+        messages = payload.get("messages", [])
+        names = {tool["function"]["name"] for tool in payload["tools"]}
+        step = project_tools_step if "write_file" in names else weather_tools_step
+        content, tool_calls = step(messages)
+        return chat_completion(content, payload.get("model", "mock"), tool_calls, messages)
+    await asyncio.sleep(LLM_LATENCY)
+    messages = payload.get("messages", [])
+    completion = chat_completion(json.dumps(scripted_step(messages)), payload.get("model", "mock"), messages=messages)
+    if payload.get("stream"):
+        return sse_stream(completion)
+    return completion
+
+
+def mock_embedding(text: str, dim: int) -> bytes:
+    """
+    Deterministic pseudo-random unit vector for text, as raw float32 bytes.
+    """
+    import numpy as np
+
+    seed = int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+    vector = np.random.default_rng(seed).standard_normal(dim).astype(np.float32)
+    return (vector / np.linalg.norm(vector)).tobytes()
+
+
+@app.post("/v1/embeddings")
+async def embeddings(payload: dict = Body(...)):
+    inputs = payload.get("input", [])
+    inputs = [inputs] if isinstance(inputs, str) else inputs
+    if len(inputs) > 2048:
+        return JSONResponse({"error": {"message": "too many inputs (mock)", "code": 400}}, status_code=400)
+    await asyncio.sleep(EMBEDDING_LATENCY)
+    dim = payload.get("dimensions") or 1536
+    as_base64 = payload.get("encoding_format") == "base64"  # the openai client asks for base64 by default
+    data = []
+    for index, text in enumerate(inputs):
+        raw = mock_embedding(text, dim)
+        if as_base64:
+            embedding = base64.b64encode(raw).decode("ascii")
+        else:
+            embedding = [float(x) for x in memoryview(raw).cast("f")]
+        data.append({"object": "embedding", "index": index, "embedding": embedding})
+    tokens = sum(len(text.split()) for text in inputs)
+    return {"object": "list", "data": data, "model": payload.get("model", "mock"),
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens}}
+
+
+@app.get("/wttr/{city}", response_class=PlainTextResponse)
+async def wttr(city: str):
+    await asyncio.sleep(WEATHER_LATENCY)
+    return "Sunny +25°C"
+
+
+# ------------------ Ollama stub ------------------
+ollama_slots = None
+ollama_models = {"gemma3:1b"}
+
+
+def ollama_message(content: str, model: str, done: bool):
+    return {
+        "model": model,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "message": {"role": "assistant", "content": content},
+        "done": done,
+    }
+
+
+@app.post("/api/chat")
+async def ollama_chat(payload: dict = Body(...)):
+    global ollama_slots
+    ollama_slots = ollama_slots or asyncio.Semaphore(OLLAMA_PARALLEL)
+    model = payload.get("model", "mock")
+    messages = payload.get("messages") or []
+    answer = f"echo: {messages[-1]['content']}" if messages else ""
+
+    if payload.get("stream", True):
+        async def chunks():
+            async with ollama_slots:
+                for word in answer.split(" "):
+                    await asyncio.sleep(LLM_LATENCY / 10)
+                    yield json.dumps(ollama_message(word + " ", model, False)) + "\n"
+            yield json.dumps({**ollama_message("", model, True), "done_reason": "stop"}) + "\n"
+        return StreamingResponse(chunks(), media_type="application/x-ndjson")
+
+    async with ollama_slots:
+        await asyncio.sleep(LLM_LATENCY)
+    return {**ollama_message(answer, model, True), "done_reason": "stop"}
+
+
+@app.get("/api/tags")
+async def ollama_tags():
+    return {"models": [{"name": name, "model": name, "size": 0, "digest": ""} for name in sorted(ollama_models)]}
+
+
+@app.post("/api/pull")
+async def ollama_pull(payload: dict = Body(...)):
+    ollama_models.add(payload.get("model") or payload.get("name"))
+    return {"status": "success"}
+
+
+# ------------------ Background runner (for benchmarks) ------------------
+class MockServer:
+    """
+    Runs an app with uvicorn in a daemon thread.
+
+        with MockServer(port=8765) as server:
+            base = server.url   # http://127.0.0.1:8765
+    """
+
+    def __init__(self, app=app, host="127.0.0.1", port=8765):
+        self.url = f"http://{host}:{port}"
+        config = uvicorn.Config(app, host=host, port=port, log_level="warning")
+        self.server = uvicorn.Server(config)
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self.thread.join(timeout=5)
+
+
+class ServerProcess:
+    """
+    Runs `uvicorn <target>` in a separate process, so a load test does not
+    share the GIL (or a CPU core's worth of event loop) with the server.
+
+        with ServerProcess("ollama_api:app", port=8767, env={...}) as server:
+            ...
+    """
+
+    def __init__(self, target: str, host="127.0.0.1", port=8765, env=None, factory=False):
+        self.url = f"http://{host}:{port}"
+        self.host, self.port = host, port
+        self.command = [sys.executable, "-m", "uvicorn", target, "--host", host, "--port", str(port),
+                        "--log-level", "warning"] + (["--factory"] if factory else [])
+        self.env = {**os.environ, **(env or {})}
+        self.process = None
+
+    def __enter__(self):
+        self.process = subprocess.Popen(self.command, env=self.env)
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"server exited early: {' '.join(self.command)}")
+            try:
+                with socket.create_connection((self.host, self.port), timeout=0.2):
+                    return self
+            except OSError:
+                time.sleep(0.05)
+        self.__exit__()
+        raise TimeoutError(f"server did not start: {' '.join(self.command)}")
+
+    def __exit__(self, *exc):
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+
+
+if __name__ == "__main__":
+    uvicorn.run(app, host="127.0.0.1", port=int(os.getenv("MOCK_LLM_PORT", "8765")))
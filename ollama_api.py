@@ -1,22 +1,102 @@
-from fastapi import FastAPI
-from ollama import Client
+import asyncio
+import json
+import os
+from contextlib import asynccontextmanager
+
+import httpx
+from fastapi import FastAPI, HTTPException, Response
+from fastapi.responses import StreamingResponse
+from ollama import AsyncClient
 from fastapi import Body
 
-app = FastAPI()
-client = Client(
-    host="http://localhost:11434"
+from llm_replay import transport_from_env
+from ollama_batcher import BatcherStopped, MicroBatcher, QueueFull
+
+OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://localhost:11434")
+MODEL_NAME = os.getenv("OLLAMA_MODEL", "gemma3:1b")
+# keep in sync with the server's OLLAMA_NUM_PARALLEL: more in-flight requests
+# than that just queue inside Ollama and hold connections open
+MAX_PARALLEL = int(os.getenv("OLLAMA_NUM_PARALLEL", "4"))
+# micro-batching: collect requests for BATCH_WINDOW_MS (up to BATCH_MAX_SIZE),
+# answer 429 once BATCH_MAX_QUEUE requests are waiting
+BATCH_WINDOW_MS = float(os.getenv("BATCH_WINDOW_MS", "15"))
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", str(MAX_PARALLEL)))
+BATCH_MAX_QUEUE = int(os.getenv("BATCH_MAX_QUEUE", "256"))
+
+# one pooled HTTP connection set shared by every request. The transport is
+# ours, so shutdown can close it: ollama.AsyncClient has no public close()
+transport = transport_from_env() or httpx.AsyncHTTPTransport(  # LLM_REPLAY=record:/replay:<file>
+    limits=httpx.Limits(max_connections=MAX_PARALLEL * 2, max_keepalive_connections=MAX_PARALLEL),
 )
+client = AsyncClient(host=OLLAMA_HOST, transport=transport)
+slots = asyncio.Semaphore(MAX_PARALLEL)
+
+async def ollama_chat(messages):
+    response = await client.chat(model=MODEL_NAME, messages=messages)
+    return response['message']['content']
+
+batcher = MicroBatcher(ollama_chat, slots, window_ms=BATCH_WINDOW_MS,
+                       max_batch=BATCH_MAX_SIZE, max_queue=BATCH_MAX_QUEUE)
+
+async def ensure_model(model: str = MODEL_NAME):
+    """
+    Pull (and load) the model only if the Ollama server does not have it yet.
+    """
+    available = await client.list()
+    if any(m.model == model or m.model == f"{model}:latest" for m in available.models):
+        return False
+    await client.pull(model=model)
+    # a request without messages just loads the model into memory
+    await client.chat(model=model, messages=[])
+    return True
 
-client.pull(model="gemma3:1b")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if os.getenv("OLLAMA_SKIP_WARMUP") != "1":
+        await ensure_model()
+    batcher.start()
+    yield
+    await batcher.stop()
+    await transport.aclose()
+
+app = FastAPI(lifespan=lifespan)
+
+def build_messages(message: str):
+    return [
+        {"role": "system", "content": "You are a helpful assistant."},
+        {"role": "user", "content": message}
+    ]
 
 @app.post("/chat")
-def chat(message: str = Body(..., description="The message to send to the chat model")):
-    response = client.chat(
-        model="gemma3:1b",
-        messages=[
-            {"role": "system", "content": "You are a helpful assistant."},
-            {"role": "user", "content": message}
-        ]
-    )
-    return {"response": response['message']['content']}
-    # return {"response": response}
\ No newline at end of file
+async def chat(response: Response, message: str = Body(..., description="The message to send to the chat model")):
+    try:
+        content, waited = await batcher.submit_timed(build_messages(message))
+    except QueueFull:
+        raise HTTPException(status_code=429, detail="Too many pending requests", headers={"Retry-After": "1"})
+    except BatcherStopped:
+        raise HTTPException(status_code=503, detail="Server is shutting down", headers={"Retry-After": "1"})
+    response.headers["X-Queue-Wait-Ms"] = f"{waited * 1000:.1f}"
+    return {"response": content}
+    # return {"response": response}
+
+@app.get("/metrics/batcher")
+async def batcher_metrics():
+    return batcher.stats()
+
+@app.post("/chat/stream")
+async def chat_stream(message: str = Body(..., description="The message to send to the chat model")):
+    """
+    Server-Sent Events: one `data: {"content": "..."}` event per Ollama chunk,
+    then `data: [DONE]`. The first tokens reach the caller while the model is
+    still generating.
+    """
+    async def events():
+        async with slots:
+            async for chunk in await client.chat(model=MODEL_NAME, messages=build_messages(message), stream=True):
+                content = chunk['message']['content']
+                if content:
+                    yield f"data: {json.dumps({'content': content})}\n\n"
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
@@ -0,0 +1,181 @@
+# ollama_batcher.py
+# Micro-batching scheduler in front of the Ollama backend.
+#
+# While all Ollama slots are busy, requests arriving within `window_ms` of each
+# other (up to `max_batch`) are collected into one batch and dispatched
+# together; with a slot free, a request goes out right away. Ollama has no batch
+# endpoint, so a batch is fanned out as parallel calls, gated by the same
+# semaphore that mirrors the server's OLLAMA_NUM_PARALLEL slots. Results are
+# handed back to each waiting caller through its own future.
+#
+# The handler is any `async def handler(item) -> result`, so the scheduler can
+# be driven by a fake Ollama endpoint in tests and benchmarks.
+import asyncio
+import time
+from collections import deque
+
+from metrics import percentile
+
+
+class QueueFull(Exception):
+    """Raised by submit() when the queue is at capacity (maps to HTTP 429)."""
+
+
+class BatcherStopped(Exception):
+    """Raised to callers whose request was still queued when stop() was called."""
+
+
+class MicroBatcher:
+    def __init__(self, handler, slots: asyncio.Semaphore, window_ms: float = 15, max_batch: int = 8,
+                 max_queue: int = 256):
+        self.handler = handler
+        self.slots = slots
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self.max_queue = max_queue
+        self.queue = asyncio.Queue()
+        self._held = 0  # taken off the queue by the scheduler, not dispatched yet
+        self._worker = None
+        self._tasks = set()
+        self._stopped = False
+        # metrics
+        self.queue_waits = deque(maxlen=1000)  # seconds, most recent requests
+        self.batch_sizes = deque(maxlen=1000)
+        self.submitted = 0
+        self.batches = 0
+        self.rejected = 0
+        self.failed = 0
+        self.in_flight = 0
+
+    # ------------------ lifecycle ------------------
+    def start(self):
+        self._stopped = False
+        if self._worker is None:
+            self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """
+        Stops the scheduler. Dispatched requests finish; queued ones fail
+        with BatcherStopped instead of waiting forever.
+        """
+        self._stopped = True
+        if self._worker is not None:
+            self._worker.cancel()
+            await asyncio.gather(self._worker, return_exceptions=True)
+            self._worker = None
+        while not self.queue.empty():
+            self._fail([self.queue.get_nowait()])
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def _fail(self, entries):
+        for _, future, _ in entries:
+            if not future.done():
+                future.set_exception(BatcherStopped("batcher stopped before the request was dispatched"))
+
+    # ------------------ callers ------------------
+    async def submit_timed(self, item):
+        """
+        Queue one request and wait for its result.
+        Returns (result, seconds spent waiting in the queue).
+        """
+        if self._stopped:
+            raise BatcherStopped("batcher is stopped")
+        if self.pending() >= self.max_queue:
+            self.rejected += 1
+            raise QueueFull(f"queue is full ({self.max_queue} pending requests)")
+        future = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait((item, future, time.perf_counter()))
+        self.submitted += 1
+        return await future
+
+    async def submit(self, item):
+        result, _ = await self.submit_timed(item)
+        return result
+
+    def pending(self) -> int:
+        """
+        Requests not dispatched yet, including a batch the scheduler holds.
+        """
+        return self.queue.qsize() + self._held
+
+    # ------------------ scheduler ------------------
+    async def _get(self):
+        entry = await self.queue.get()
+        self._held += 1
+        return entry
+
+    async def _collect(self):
+        batch = [await self._get()]
+        try:
+            if not self.slots.locked():
+                # a slot is free: waiting for more requests would only add latency
+                while len(batch) < self.max_batch and not self.queue.empty():
+                    batch.append(self.queue.get_nowait())
+                    self._held += 1
+                return batch
+            deadline = time.perf_counter() + self.window
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+        except asyncio.CancelledError:
+            self._held -= len(batch)
+            self._fail(batch)  # already taken off the queue, stop() would not see them
+            raise
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            self.batches += 1
+            self.batch_sizes.append(len(batch))
+            for n, (item, future, enqueued_at) in enumerate(batch):
+                # wait for a free Ollama slot; requests not yet dispatched still
+                # count toward max_queue, so backpressure kicks in
+                try:
+                    await self.slots.acquire()
+                except asyncio.CancelledError:
+                    self._held -= len(batch) - n
+                    self._fail(batch[n:])
+                    raise
+                self._held -= 1
+                task = asyncio.create_task(self._dispatch(item, future, enqueued_at))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+
+    async def _dispatch(self, item, future, enqueued_at):
+        waited = time.perf_counter() - enqueued_at
+        self.queue_waits.append(waited)
+        self.in_flight += 1
+        try:
+            if future.cancelled():
+                return
+            result = await self.handler(item)
+            if not future.done():
+                future.set_result((result, waited))
+        except Exception as e:
+            self.failed += 1
+            if not future.done():
+                future.set_exception(e)
+        finally:
+            self.in_flight -= 1
+            self.slots.release()
+
+    def stats(self) -> dict:
+        waits_ms = [w * 1000 for w in self.queue_waits]
+        return {
+            "queued": self.pending(),
+            "in_flight": self.in_flight,
+            "submitted": self.submitted,
+            "rejected": self.rejected,
+            "failed": self.failed,
+            "batches": self.batches,
+            "avg_batch_size": sum(self.batch_sizes) / len(self.batch_sizes) if self.batch_sizes else 0.0,
+            "queue_wait_ms_p50": percentile(waits_ms, 50),
+            "queue_wait_ms_p95": percentile(waits_ms, 95),
+        }
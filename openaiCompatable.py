@@ -1,17 +1,11 @@
-from dotenv import load_dotenv
-import os
-from google import genai
-from google.genai import types
-from openai import OpenAI
+from llm_clients import lazy_client
+from streaming import stream_completion
 
-load_dotenv()
+client = lazy_client("gemini")
 
-client = OpenAI(
-    api_key=os.getenv('GOOGLE_API_KEY'),
-    base_url="https://generativelanguage.googleapis.com/v1beta/openai/"
-)
-
-response = client.chat.completions.create(
+# stream=True: tokens are printed as soon as they are generated
+response = stream_completion(
+    client,
     model="gemini-2.5-flash",
     messages=[
         {"role": "system", "content": "You are a helpful assistant."},
@@ -22,4 +16,4 @@ response = client.chat.completions.create(
     ]
 )
 
-print(response.choices[0].message)
\ No newline at end of file
+print()
\ No newline at end of file
@@ -0,0 +1,159 @@
+# plan_cache.py
+# Memoized scaffolds for cursor_like_agent.py.
+#
+# After a successful run the final set of folders/files is stored under a key
+# built from (language, normalized spec, model). The project name is replaced
+# by a placeholder, so a later run for another project with the same spec can
+# replay the files locally instead of asking the model to generate the same
+# boilerplate again.
+#
+# Entries are small JSON files in PLAN_CACHE_DIR (default .plan_cache/).
+import hashlib
+import json
+import os
+import re
+import time
+
+from project_manifest import atomic_write
+
+PLAN_CACHE_DIR = os.getenv("PLAN_CACHE_DIR", ".plan_cache")
+PLACEHOLDER = "{{project_name}}"
+# a one-letter name would hit loop variables and the like, even as a whole word
+MIN_SUBSTITUTION_LENGTH = 2
+
+LANGUAGE_ALIASES = {"js": "javascript", "py": "python"}
+
+
+def normalize_spec(spec: dict) -> dict:
+    """
+    Spec without the project name, with whitespace/case-insensitive values.
+    """
+    normalized = {}
+    for key, value in spec.items():
+        if key == "project_name" or value in (None, ""):
+            continue
+        if isinstance(value, str):
+            value = " ".join(value.lower().split())
+        normalized[key] = value
+    if "language" in normalized:
+        normalized["language"] = LANGUAGE_ALIASES.get(normalized["language"], normalized["language"])
+    return normalized
+
+
+def plan_key(spec: dict, model: str) -> str:
+    normalized = normalize_spec(spec)
+    raw = json.dumps([normalized.get("language"), normalized, model], sort_keys=True)
+    return hashlib.blake2b(raw.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def _name_pattern(project_name: str):
+    # whole identifiers/words only: "blog" must not hit "weblog" or "blog_posts"
+    return re.compile(r"(?<!\w)" + re.escape(project_name) + r"(?!\w)")
+
+
+def templatize(text: str, project_name: str) -> str:
+    if len(project_name) < MIN_SUBSTITUTION_LENGTH:
+        return text
+    return _name_pattern(project_name).sub(PLACEHOLDER, text)
+
+
+def render(text: str, project_name: str) -> str:
+    return text.replace(PLACEHOLDER, project_name)
+
+
+def actions_from_manifest(manifest) -> list:
+    """
+    Final state of a finished run as create_folder / write_file actions.
+    Patched or rewritten files are stored once, with their final content.
+    """
+    folders, files = [], []
+    for action in manifest.actions:
+        path = action["path"]
+        if action["function"] == "create_folder":
+            if path not in folders:
+                folders.append(path)
+        elif path not in files:
+            files.append(path)
+
+    actions = [{"function": "create_folder", "tool_input": path} for path in folders]
+    for path in files:
+        full_path = os.path.join(manifest.project_root, path)
+        try:
+            with open(full_path, encoding="utf-8", newline="") as f:  # keep \r\n as written
+                content = f.read()
+        except OSError:
+            continue  # deleted after writing, nothing to replay
+        actions.append({"function": "write_file", "tool_input": {"path": path, "content": content}})
+    return actions
+
+
+class PlanCache:
+    def __init__(self, directory: str = PLAN_CACHE_DIR):
+        self.directory = directory
+        self.hits = 0
+        self.partial_hits = 0
+        self.misses = 0
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _load(self, key: str):
+        try:
+            with open(self._path(key), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def lookup(self, spec: dict, model: str):
+        """
+        Returns (entry, exact). An exact entry covers the whole spec. Otherwise
+        the entry for the bare language scaffold is returned (exact=False), so
+        the model only has to add what the extra requirements ask for.
+        (None, False) on a miss.
+        """
+        entry = self._load(plan_key(spec, model))
+        if entry is not None:
+            self.hits += 1
+            return entry, True
+        base_spec = {"language": spec.get("language")}
+        if normalize_spec(spec) != normalize_spec(base_spec):
+            entry = self._load(plan_key(base_spec, model))
+            if entry is not None:
+                self.partial_hits += 1
+                return entry, False
+        self.misses += 1
+        return None, False
+
+    def store(self, spec: dict, model: str, actions: list) -> str:
+        project_name = spec.get("project_name", "")
+        stored = []
+        for action in actions:
+            tool_input = action["tool_input"]
+            if isinstance(tool_input, dict):
+                tool_input = {key: templatize(value, project_name) for key, value in tool_input.items()}
+            else:
+                tool_input = templatize(tool_input, project_name)
+            stored.append({"function": action["function"], "tool_input": tool_input})
+
+        entry = {"spec": normalize_spec(spec), "model": model, "created": time.time(), "actions": stored}
+        key = plan_key(spec, model)
+        os.makedirs(self.directory, exist_ok=True)
+        atomic_write(self._path(key), json.dumps(entry, indent=2).encode("utf-8"))
+        return key
+
+    def replay(self, entry: dict, project_name: str) -> list:
+        """
+        The cached actions with the project name filled in.
+        """
+        actions = []
+        for action in entry["actions"]:
+            tool_input = action["tool_input"]
+            if isinstance(tool_input, dict):
+                tool_input = {key: render(value, project_name) for key, value in tool_input.items()}
+            else:
+                tool_input = render(tool_input, project_name)
+            actions.append({"function": action["function"], "tool_input": tool_input})
+        return actions
+
+
+plan_cache = PlanCache()
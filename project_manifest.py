@@ -0,0 +1,296 @@
+# project_manifest.py
+# Per-project record of what the agent has written, stored in
+# <project_root>/.llm_manifest.json plus an append-only .llm_manifest.log
+#
+# For every file we keep the BLAKE2 hash of its content plus the size/mtime
+# seen right after writing it. An identical rewrite can then be detected from
+# the hash alone, without reading the file back, as long as the file on disk
+# still has the size/mtime we recorded.
+#
+# The manifest also logs every completed action (function, path, content hash)
+# so an interrupted generation can be resumed instead of starting over.
+#
+# Every change is one JSON line appended to the log; the .json snapshot is only
+# rewritten when the log has grown as large as the snapshot itself, so writing
+# N files costs O(N) bytes instead of one full rewrite per file. Paths are kept
+# normalized ("./a/b" and "a/b" are the same file).
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+MANIFEST_FILE = ".llm_manifest.json"
+MANIFEST_LOG = ".llm_manifest.log"
+# the log is folded into the snapshot once it has more records than this, or
+# than the snapshot has entries
+MIN_COMPACT_RECORDS = 256
+WRITE_CHUNK_SIZE = 64 * 1024
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def atomic_write(full_path: str, data: bytes, chunk_size: int = WRITE_CHUNK_SIZE):
+    """
+    Streams data into a temp file next to full_path, then renames it over the
+    target, so readers never see a half-written file.
+    """
+    directory = os.path.dirname(full_path)
+    try:
+        mode = os.stat(full_path).st_mode & 0o777
+    except OSError:
+        mode = 0o644  # mkstemp creates 0600 files, use normal file permissions
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix="~")
+    try:
+        os.fchmod(fd, mode)
+        with os.fdopen(fd, "wb") as f:
+            view = memoryview(data)
+            for start in range(0, len(view), chunk_size):
+                f.write(view[start:start + chunk_size])
+        os.replace(tmp_path, full_path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+class AtomicWriter:
+    """
+    atomic_write for data that arrives in pieces (e.g. a file streamed by the
+    model): write() appends to the temp file and hashes as it goes, commit()
+    renames it over full_path, abort() throws it away.
+    """
+
+    def __init__(self, full_path: str):
+        self.full_path = full_path
+        self.size = 0
+        self._hash = hashlib.blake2b(digest_size=16)
+        try:
+            mode = os.stat(full_path).st_mode & 0o777
+        except OSError:
+            mode = 0o644
+        fd, self.tmp_path = tempfile.mkstemp(dir=os.path.dirname(full_path), prefix=".tmp-", suffix="~")
+        os.fchmod(fd, mode)
+        self._file = os.fdopen(fd, "wb")
+
+    def write(self, data: bytes):
+        self._file.write(data)
+        self._hash.update(data)
+        self.size += len(data)
+
+    @property
+    def digest(self) -> str:
+        # same value as content_hash() of everything written
+        return self._hash.hexdigest()
+
+    def commit(self):
+        try:
+            self._file.close()
+            os.replace(self.tmp_path, self.full_path)
+        except BaseException:
+            self.abort()
+            raise
+
+    def abort(self):
+        self._file.close()
+        try:
+            os.unlink(self.tmp_path)
+        except OSError:
+            pass
+
+
+def manifest_path(rel: str) -> str:
+    return os.path.normpath(rel.strip())
+
+
+class ProjectManifest:
+    def __init__(self, project_root: str):
+        self.project_root = project_root
+        self.path = os.path.join(project_root, MANIFEST_FILE)
+        self.log_path = os.path.join(project_root, MANIFEST_LOG)
+        self._lock = threading.RLock()
+        self.files = {}
+        self.spec = None
+        self.actions = []
+        self.completed = False
+        # the log belongs to the snapshot with the same generation; a log left
+        # over from before the last compaction is already in the snapshot
+        self.generation = 0
+        self._log_records = 0
+        self._snapshot_records = 0  # files + actions in the snapshot on disk
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, encoding="utf-8") as f:
+                    data = json.load(f)
+                self.files = data.get("files", {})
+                self.spec = data.get("spec")
+                self.actions = data.get("actions", [])
+                self.completed = data.get("completed", False)
+                self.generation = data.get("generation", 0)
+                self._snapshot_records = len(self.files) + len(self.actions)
+            except (OSError, ValueError):
+                pass  # corrupt manifest: start over, files get re-hashed on write
+        if self._replay_log():
+            self.save()  # drop the torn record before anything is appended after it
+
+    # ------------------ log ------------------
+    def _replay_log(self) -> bool:
+        """
+        Applies the log on top of the snapshot; True if it ended in a torn record.
+        """
+        try:
+            with open(self.log_path, encoding="utf-8") as f:
+                lines = f.read().split("\n")
+        except OSError:
+            return False
+        torn = lines.pop() != ""  # a complete log ends with a newline
+        records = []
+        for line in lines:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                torn = True
+                break
+        if records and records[0].get("generation") == self.generation:
+            for record in records[1:]:
+                self._apply(record)
+            self._log_records = len(records) - 1
+        return torn
+
+    def _apply(self, record: dict):
+        kind = record.pop("type")
+        if kind == "file":
+            self.files[record.pop("path")] = record
+        elif kind == "action":
+            self.actions.append(record)
+        elif kind == "start":
+            if not record["resume"]:
+                self.actions = []
+            self.spec = record["spec"]
+            self.completed = False
+        elif kind == "completed":
+            self.completed = True
+
+    def _append(self, record: dict):
+        # call with the lock held
+        self._apply(dict(record))
+        if self._log_records >= max(MIN_COMPACT_RECORDS, self._snapshot_records):
+            self.save()
+            return
+        os.makedirs(self.project_root, exist_ok=True)
+        # the first record of a generation starts the log over (a stale one may be there)
+        with open(self.log_path, "a" if self._log_records else "w", encoding="utf-8") as f:
+            if not self._log_records:
+                f.write(json.dumps({"generation": self.generation}) + "\n")
+            f.write(json.dumps(record) + "\n")
+        self._log_records += 1
+
+    # ------------------ files ------------------
+    def is_current(self, rel: str, full_path: str, digest: str) -> bool:
+        """
+        True if full_path already holds content with this digest.
+        """
+        with self._lock:
+            entry = self.files.get(manifest_path(rel))
+        if entry is None or entry["hash"] != digest:
+            return False
+        try:
+            st = os.stat(full_path)
+        except OSError:
+            return False
+        # edited outside the agent since we wrote it -> don't trust the hash
+        return st.st_size == entry["size"] and st.st_mtime_ns == entry["mtime_ns"]
+
+    def record(self, rel: str, full_path: str, digest: str):
+        st = os.stat(full_path)
+        with self._lock:
+            self._append({"type": "file", "path": manifest_path(rel), "hash": digest, "size": st.st_size,
+                          "mtime_ns": st.st_mtime_ns})
+
+    # ------------------ generation progress ------------------
+    def start(self, spec: dict, resume: bool = False):
+        """
+        Begin a generation run. Without resume the action log is cleared;
+        file hashes are kept since they still describe what is on disk.
+        """
+        with self._lock:
+            self._append({"type": "start", "spec": spec, "resume": resume})
+
+    def can_resume(self, spec: dict) -> bool:
+        return bool(self.actions) and not self.completed and self.spec == spec
+
+    def record_action(self, function: str, path: str):
+        with self._lock:
+            path = manifest_path(path) if path else path
+            record = {"type": "action", "function": function, "path": path}
+            if path in self.files:
+                record["hash"] = self.files[path]["hash"]
+            self._append(record)
+
+    def mark_completed(self):
+        with self._lock:
+            self._append({"type": "completed"})
+
+    def resume_summary(self, intro: str = "RESUME: a previous run was interrupted.",
+                       instruction: str = "Continue with the remaining folders and files") -> str:
+        """
+        Compact description of what already exists, sent to the model instead
+        of the old conversation.
+        """
+        folders, files = [], []
+        with self._lock:
+            for action in self.actions:
+                path = action["path"]
+                if action["function"] == "create_folder":
+                    if os.path.isdir(os.path.join(self.project_root, path)) and path not in folders:
+                        folders.append(path)
+                elif path in self.files and path not in files:
+                    full_path = os.path.join(self.project_root, path)
+                    if self.is_current(path, full_path, self.files[path]["hash"]):
+                        files.append(path)
+        return "\n".join([
+            f"{intro} These already exist on disk and are correct,",
+            "do not create or write them again:",
+            f"Folders: {', '.join(folders) or '(none)'}",
+            f"Files: {', '.join(files) or '(none)'}",
+            f"{instruction}, then finish with a result step.",
+        ])
+
+    def save(self):
+        """
+        Writes the full state as a new snapshot and starts an empty log.
+        """
+        with self._lock:
+            os.makedirs(self.project_root, exist_ok=True)
+            self.generation += 1
+            data = json.dumps({
+                "generation": self.generation,
+                "spec": self.spec,
+                "completed": self.completed,
+                "files": self.files,
+                "actions": self.actions,
+            }, indent=2).encode("utf-8")
+            atomic_write(self.path, data)
+            # a crash right here leaves the old log, which the new generation ignores
+            atomic_write(self.log_path, (json.dumps({"generation": self.generation}) + "\n").encode("utf-8"))
+            self._log_records = 0
+            self._snapshot_records = len(self.files) + len(self.actions)
+
+
+_manifests = {}
+_manifests_lock = threading.Lock()
+
+
+def get_manifest(project_root: str) -> ProjectManifest:
+    """
+    One manifest instance per project root (shared by parallel batch writes).
+    """
+    key = os.path.abspath(project_root)
+    with _manifests_lock:
+        if key not in _manifests:
+            _manifests[key] = ProjectManifest(key)
+        return _manifests[key]
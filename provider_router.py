@@ -0,0 +1,190 @@
+# provider_router.py
+# Spreads chat completions over several OpenAI-compatible backends
+# (Gemini's OpenAI endpoint, OpenAI, local Ollama...).
+#
+# Every backend keeps a rolling window of latencies and outcomes. A request
+# goes to the healthy backend with the lowest expected latency (p50 divided by
+# the success rate); if it is throttled (429), down (5xx, connection error) or
+# times out, the next one is tried, so e.g. a rate-limited Gemini falls over to
+# the local Ollama model. A failing backend is parked for a cooldown
+# (Retry-After when the server sends one) and probed again afterwards.
+#
+#   router = ProviderRouter([Backend("gemini", get_client("gemini", max_retries=0), "gemini-2.5-flash"),
+#                            Backend("ollama", get_client("ollama", max_retries=0), "gemma3:1b")])
+#   router.chat.completions.create(messages=[...])   # "model" is chosen per backend
+import os
+import threading
+import time
+from collections import deque
+from types import SimpleNamespace
+
+from llm_clients import PROVIDERS, lazy_client
+from metrics import percentile
+from rate_limiter import is_retryable, retry_after
+import tracing
+
+# model used when LLM_ROUTE names a provider without ":model"
+DEFAULT_MODELS = {
+    "gemini": "gemini-2.5-flash",
+    "openai": "gpt-4o-mini",
+    "ollama": os.getenv("OLLAMA_MODEL", "gemma3:1b"),
+}
+
+
+class NoBackendAvailable(Exception):
+    """Raised when a router has no backends configured."""
+
+
+class Backend:
+    def __init__(self, name: str, client, model: str, window: int = 100):
+        self.name = name
+        self.client = client
+        self.model = model
+        self.latencies = deque(maxlen=window)  # seconds, successful calls only
+        self.outcomes = deque(maxlen=window)   # True = success
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.cooldown_until = 0.0
+        self.last_attempt = None
+
+    def p50(self) -> float:
+        return percentile(self.latencies, 50)
+
+    def p95(self) -> float:
+        return percentile(self.latencies, 95)
+
+    def error_rate(self) -> float:
+        if not self.outcomes:
+            return 0.0
+        return 1 - sum(self.outcomes) / len(self.outcomes)
+
+    def expected_latency(self) -> float:
+        # a failed call costs a retry elsewhere, so flaky backends rank lower
+        return self.p50() / max(0.1, 1 - self.error_rate())
+
+
+class ProviderRouter:
+    """
+    Drop-in for a chat client: exposes chat.completions.create.
+    """
+
+    def __init__(self, backends, min_samples: int = 5, probe_interval: float = 30.0, base_cooldown: float = 2.0,
+                 max_cooldown: float = 60.0, clock=time.monotonic):
+        self.backends = list(backends)
+        self.min_samples = min_samples
+        self.probe_interval = probe_interval
+        self.base_cooldown = base_cooldown
+        self.max_cooldown = max_cooldown
+        self.clock = clock
+        self.failovers = 0
+        self._lock = threading.Lock()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    # ------------------ routing ------------------
+    def healthy(self, backend: Backend, now: float = None) -> bool:
+        now = self.clock() if now is None else now
+        return now >= backend.cooldown_until
+
+    def _needs_probe(self, backend: Backend, now: float) -> bool:
+        # too few samples to trust, or not measured for a while
+        # (a single cold-connection outlier must not starve a backend forever)
+        return len(backend.latencies) < self.min_samples or backend.last_attempt is None \
+            or now - backend.last_attempt > self.probe_interval
+
+    def ranked(self) -> list:
+        """
+        Healthy backends that need a probe first, then the others by expected
+        latency; backends in cooldown last (by when it ends), as a last resort.
+        Ties keep the configured order.
+        """
+        now = self.clock()
+        with self._lock:
+            healthy = [b for b in self.backends if self.healthy(b, now)]
+            parked = [b for b in self.backends if not self.healthy(b, now)]
+            healthy.sort(key=lambda b: (not self._needs_probe(b, now), b.expected_latency()))
+            parked.sort(key=lambda b: b.cooldown_until)
+        return healthy + parked
+
+    def _record_success(self, backend: Backend, seconds: float):
+        with self._lock:
+            backend.requests += 1
+            backend.last_attempt = self.clock()
+            backend.latencies.append(seconds)
+            backend.outcomes.append(True)
+            backend.consecutive_failures = 0
+
+    def _record_failure(self, backend: Backend, error):
+        with self._lock:
+            backend.requests += 1
+            backend.last_attempt = self.clock()
+            backend.failures += 1
+            backend.outcomes.append(False)
+            backend.consecutive_failures += 1
+            # Retry-After is a lower bound; repeated failures park the backend longer
+            cooldown = max(retry_after(error) or 0.0,
+                           self.base_cooldown * 2 ** (backend.consecutive_failures - 1))
+            backend.cooldown_until = self.clock() + min(cooldown, self.max_cooldown)
+
+    # ------------------ requests ------------------
+    def create(self, **params):
+        """
+        Sends the request to the best backend, failing over on retryable errors.
+        With stream=True, failover is only possible until the stream is opened.
+        """
+        if not self.backends:
+            raise NoBackendAvailable("no backends configured")
+        last_error = None
+        for attempt, backend in enumerate(self.ranked()):
+            if attempt:
+                self.failovers += 1
+                tracing.incr("failovers")
+            start = time.perf_counter()
+            try:
+                response = backend.client.chat.completions.create(**{**params, "model": backend.model})
+            except Exception as e:
+                if not is_retryable(e):
+                    raise  # bad request: another backend would reject it too
+                self._record_failure(backend, e)
+                last_error = e
+                continue
+            self._record_success(backend, time.perf_counter() - start)
+            tracing.annotate(backend=backend.name, model=backend.model)
+            return response
+        raise last_error
+
+    def stats(self) -> dict:
+        now = self.clock()
+        with self._lock:
+            return {
+                backend.name: {
+                    "model": backend.model,
+                    "requests": backend.requests,
+                    "failures": backend.failures,
+                    "error_rate": round(backend.error_rate(), 3),
+                    "p50_ms": round(backend.p50() * 1000, 1),
+                    "p95_ms": round(backend.p95() * 1000, 1),
+                    "healthy": self.healthy(backend, now),
+                    "cooldown_s": round(max(0.0, backend.cooldown_until - now), 1),
+                } for backend in self.backends
+            }
+
+
+def router_from_env(variable: str = "LLM_ROUTE", **options):
+    """
+    Router for e.g. LLM_ROUTE="gemini,ollama:llama3.2" (provider[:model], in
+    preference order), or None if the variable is not set. options go to
+    every backend's client (e.g. response_cache=False).
+    """
+    route = os.getenv(variable, "").strip()
+    if not route:
+        return None
+    backends = []
+    for entry in route.split(","):
+        provider, _, model = entry.strip().partition(":")
+        if provider not in PROVIDERS:
+            raise ValueError(f"{variable}: unknown provider '{provider}' in '{entry.strip()}', "
+                             f"expected one of {sorted(PROVIDERS)}")
+        # retries happen across backends and in rate_limiter, not in the SDK
+        backends.append(Backend(provider, lazy_client(provider, max_retries=0, **options), model or DEFAULT_MODELS[provider]))
+    return ProviderRouter(backends)
@@ -0,0 +1,293 @@
+# rate_limiter.py
+# Client-side rate limiting and retries for LLM calls.
+#
+# - RateLimiter: token buckets for requests/minute and tokens/minute, so
+#   callers wait *before* sending instead of getting a 429
+# - call_with_retry / acall_with_retry: iterative retries with exponential
+#   backoff + full jitter, honoring Retry-After, capped at max_attempts
+#
+#   response = call_with_retry(lambda: client.chat.completions.create(...),
+#                              limiter=shared_limiter, tokens=prompt_tokens)
+#
+# The tokens/minute bucket is charged the prompt estimate up front and
+# corrected once the real usage is known: from the usage block of fn()'s
+# result, or, when fn() returns plain text, from what the code inside it
+# passed to report_usage() (streaming.complete_text does). A reply served
+# by the response cache (report_cache_hit()) is not charged at all.
+import asyncio
+import contextvars
+import os
+import random
+import threading
+import time
+
+import tracing
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """
+    `capacity` tokens, refilled continuously at `rate` tokens per second.
+    """
+
+    def __init__(self, capacity: float, rate: float, clock=time.monotonic):
+        self.capacity = capacity
+        self.rate = rate
+        self.clock = clock
+        self.tokens = capacity
+        self.updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount: float) -> float:
+        """
+        Takes `amount` tokens (the balance may go negative) and returns how many
+        seconds the caller has to wait before it is allowed to proceed.
+        Reserving up front keeps concurrent callers in a fair queue.
+        """
+        amount = min(amount, self.capacity)
+        with self._lock:
+            self._refill()
+            self.tokens -= amount
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def refund(self, amount: float):
+        """
+        Gives back tokens (e.g. when the real usage was lower than estimated).
+        Negative amounts charge extra.
+        """
+        with self._lock:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class RateLimiter:
+    def __init__(self, rpm: float = 60, tpm: float = 250_000):
+        self.requests = TokenBucket(rpm, rpm / 60)
+        self.tokens = TokenBucket(tpm, tpm / 60)
+        self.throttled = 0
+        self.throttle_seconds = 0.0
+
+    def _reserve(self, tokens: int) -> float:
+        wait = max(self.requests.reserve(1), self.tokens.reserve(tokens))
+        if wait > 0:
+            self.throttled += 1
+            self.throttle_seconds += wait
+            tracing.incr("throttle_ms", round(wait * 1000, 3))
+        return wait
+
+    def acquire(self, tokens: int = 0):
+        wait = self._reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+
+    async def aacquire(self, tokens: int = 0):
+        wait = self._reserve(tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def record_usage(self, estimated: int, actual: int):
+        """
+        Corrects the tokens/minute bucket once the response reports real usage.
+        """
+        if actual:
+            self.tokens.refund(estimated - actual)
+
+    def settle(self, estimated: int, result, meter: "UsageMeter"):
+        """
+        Corrects the buckets after a successful call.
+        """
+        if meter.cached:
+            # nothing was sent to the provider
+            self.requests.refund(1)
+            self.tokens.refund(estimated)
+            return
+        self.record_usage(estimated, _usage_tokens(result) or meter.tokens)
+
+
+class UsageMeter:
+    """
+    Collects what one attempt inside call_with_retry reports about itself.
+    """
+
+    def __init__(self):
+        self.tokens = 0
+        self.cached = False
+
+
+_meter = contextvars.ContextVar("usage_meter", default=None)
+
+
+def metering() -> bool:
+    """
+    True inside call_with_retry, where reported usage corrects the limiter.
+    """
+    return _meter.get() is not None
+
+
+def report_usage(response):
+    """
+    Counts the usage block of a completion (or final stream chunk) for the
+    enclosing call_with_retry.
+    """
+    meter = _meter.get()
+    if meter is not None:
+        meter.tokens += _usage_tokens(response)
+
+
+def report_cache_hit():
+    meter = _meter.get()
+    if meter is not None:
+        meter.cached = True
+
+
+class RetryStats:
+    def __init__(self):
+        self.calls = 0
+        self.attempts = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self.failures = 0
+        self.backoff_seconds = 0.0
+
+    def as_dict(self) -> dict:
+        return dict(vars(self))
+
+
+def status_code(error):
+    code = getattr(error, "status_code", None)
+    if code is None:
+        code = getattr(getattr(error, "response", None), "status_code", None)
+    return code
+
+
+def is_retryable(error) -> bool:
+    code = status_code(error)
+    if code is not None:
+        return code in RETRYABLE_STATUS
+    # connection errors / timeouts carry no status code
+    name = type(error).__name__
+    return "Timeout" in name or "Connection" in name or "429" in str(error)
+
+
+def retry_after(error):
+    """
+    Seconds requested by the server via Retry-After / retry-after-ms, or None.
+    """
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except (TypeError, ValueError):
+        pass  # HTTP-date form, fall back to backoff
+    return None
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    # "full jitter": uniform in [0, min(cap, base * 2^attempt)] so workers
+    # that failed together do not retry together
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def _usage_tokens(result) -> int:
+    usage = getattr(result, "usage", None)
+    return getattr(usage, "total_tokens", 0) or 0
+
+
+def _next_delay(error, attempt, base_delay, max_delay):
+    delay = retry_after(error)
+    if delay is None:
+        delay = backoff_delay(attempt, base_delay, max_delay)
+    return min(delay, max_delay)
+
+
+def call_with_retry(fn, limiter: RateLimiter = None, tokens: int = 0, max_attempts: int = 6,
+                    base_delay: float = 1.0, max_delay: float = 60.0, stats: RetryStats = None,
+                    on_retry=None):
+    """
+    Calls fn() until it succeeds, a non-retryable error is raised, or
+    max_attempts is reached (then the last error is re-raised).
+    """
+    stats = stats or default_stats
+    stats.calls += 1
+    for attempt in range(max_attempts):
+        if limiter is not None:
+            limiter.acquire(tokens)
+        stats.attempts += 1
+        meter = UsageMeter()
+        token = _meter.set(meter)
+        try:
+            result = fn()
+        except Exception as e:
+            if not is_retryable(e) or attempt == max_attempts - 1:
+                stats.failures += 1
+                raise
+            stats.retries += 1
+            stats.rate_limited += status_code(e) == 429
+            delay = _next_delay(e, attempt, base_delay, max_delay)
+            stats.backoff_seconds += delay
+            tracing.incr("retries")
+            if on_retry is not None:
+                on_retry(e, attempt + 1, delay)
+            time.sleep(delay)
+            continue
+        finally:
+            _meter.reset(token)
+        if limiter is not None:
+            limiter.settle(tokens, result, meter)
+        return result
+
+
+async def acall_with_retry(fn, limiter: RateLimiter = None, tokens: int = 0, max_attempts: int = 6,
+                           base_delay: float = 1.0, max_delay: float = 60.0, stats: RetryStats = None,
+                           on_retry=None):
+    """
+    Async variant of call_with_retry, fn is a coroutine function.
+    """
+    stats = stats or default_stats
+    stats.calls += 1
+    for attempt in range(max_attempts):
+        if limiter is not None:
+            await limiter.aacquire(tokens)
+        stats.attempts += 1
+        meter = UsageMeter()
+        token = _meter.set(meter)
+        try:
+            result = await fn()
+        except Exception as e:
+            if not is_retryable(e) or attempt == max_attempts - 1:
+                stats.failures += 1
+                raise
+            stats.retries += 1
+            stats.rate_limited += status_code(e) == 429
+            delay = _next_delay(e, attempt, base_delay, max_delay)
+            stats.backoff_seconds += delay
+            tracing.incr("retries")
+            if on_retry is not None:
+                on_retry(e, attempt + 1, delay)
+            await asyncio.sleep(delay)
+            continue
+        finally:
+            _meter.reset(token)
+        if limiter is not None:
+            limiter.settle(tokens, result, meter)
+        return result
+
+
+def print_retry(error, attempt, delay):
+    print(f"Model call failed ({error.__class__.__name__}), retry {attempt} in {delay:.1f}s...")
+
+
+# one limiter per process for the Gemini/OpenAI quota all agents share
+shared_limiter = RateLimiter(
+    rpm=float(os.getenv("LLM_RPM", "60")),
+    tpm=float(os.getenv("LLM_TPM", "250000")),
+)
+default_stats = RetryStats()
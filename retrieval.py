@@ -0,0 +1,110 @@
+# retrieval.py
+# Document retrieval on top of embeddings.py + vector_index.py
+#
+#   retriever = Retriever(OpenAIEmbedder())          # or HashEmbedder() offline
+#   retriever = Retriever(EmbeddingService())        # OpenAI, unchanged chunks come from the embedding cache
+#   retriever.add_documents({"eiffel": "Eiffel Tower is in Paris ..."})
+#   retriever.query("where is the eiffel tower?", k=3)
+#
+#   python retrieval.py [chunks]   -> offline query latency benchmark
+import sys
+import time
+
+import numpy as np
+
+from embeddings import HashEmbedder
+from vector_index import VectorIndex
+
+
+def chunk_text(text: str, max_chars: int = 800, overlap: int = 100):
+    """
+    Splits text into overlapping chunks, preferring to cut at whitespace.
+    """
+    text = text.strip()
+    if len(text) <= max_chars:
+        return [text] if text else []
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = min(start + max_chars, len(text))
+        if end < len(text):
+            cut = text.rfind(" ", start + max_chars // 2, end)
+            end = cut if cut != -1 else end
+        chunks.append(text[start:end].strip())
+        if end >= len(text):
+            break
+        start = max(end - overlap, start + 1)
+    return chunks
+
+
+class Retriever:
+    def __init__(self, embedder, index: VectorIndex = None, chunk_chars: int = 800, overlap: int = 100):
+        self.embedder = embedder
+        self.index = index or VectorIndex(embedder.dim)
+        self.chunk_chars = chunk_chars
+        self.overlap = overlap
+        # doc_id -> its chunk ids, so replacing a document does not scan the whole index
+        self._chunks = {}
+        for chunk_id in self.index.ids:
+            if chunk_id in self.index:
+                self._chunks.setdefault(chunk_id.rsplit("#", 1)[0], []).append(chunk_id)
+
+    def add_documents(self, documents: dict):
+        """
+        documents: {doc_id: text}. Re-adding a doc_id replaces its old chunks.
+        All chunks are embedded together (one API call per embedder batch).
+        """
+        self.delete_documents(documents.keys())
+        ids, texts = [], []
+        for doc_id, text in documents.items():
+            for i, chunk in enumerate(chunk_text(text, self.chunk_chars, self.overlap)):
+                ids.append(f"{doc_id}#{i}")
+                texts.append(chunk)
+        if texts:
+            self.index.add(ids, self.embedder.embed(texts), payloads=texts)
+            for chunk_id in ids:
+                self._chunks.setdefault(chunk_id.rsplit("#", 1)[0], []).append(chunk_id)
+        return len(ids)
+
+    def delete_documents(self, doc_ids):
+        stale = []
+        for doc_id in set(doc_ids):
+            stale.extend(self._chunks.pop(doc_id, ()))
+        return self.index.delete(stale)
+
+    def query(self, text: str, k: int = 5):
+        vector = self.embedder.embed([text])[0]
+        return self.index.search(vector, k)
+
+    def save(self, directory: str):
+        self.index.save(directory)
+
+    @classmethod
+    def load(cls, embedder, directory: str, **kwargs):
+        return cls(embedder, VectorIndex.load(directory), **kwargs)
+
+
+if __name__ == "__main__":
+    n_chunks = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    dim = 256
+    rng = np.random.default_rng(0)
+
+    index = VectorIndex(dim, capacity=n_chunks)
+    batch = 100_000
+    start = time.perf_counter()
+    for offset in range(0, n_chunks, batch):
+        count = min(batch, n_chunks - offset)
+        index.add([f"chunk-{offset + i}" for i in range(count)], rng.standard_normal((count, dim), dtype=np.float32))
+    print(f"indexed {n_chunks} random vectors (dim {dim}) in {time.perf_counter() - start:.1f}s")
+
+    retriever = Retriever(HashEmbedder(dim), index)
+    retriever.add_documents({"eiffel": "Eiffel Tower is in Paris and it is one of the most famous landmarks in the world."})
+
+    timings = []
+    for _ in range(20):
+        start = time.perf_counter()
+        hits = retriever.query("famous landmarks in Paris", k=5)
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    print("top hit:", hits[0][0], round(hits[0][1], 3))
+    print(f"query latency p50={timings[len(timings) // 2]:.1f}ms max={timings[-1]:.1f}ms")
@@ -0,0 +1,283 @@
+# session_store.py
+# Conversation histories that survive restarts and can be shared by several
+# agent processes.
+#
+#   sessions = SessionStore()                       # SESSION_DB, SESSION_TTL, ...
+#   messages = sessions.get("user-42", [{"role": "system", "content": prompt}])
+#   run_turn(messages, query)                       # appends as before
+#   sessions.save(messages)                         # writes only the new messages
+#   messages = await sessions.aget(...)             # asyncio code: aget / asave / adelete
+#
+# - memory tier: the most recently used sessions stay loaded (LRU), so a
+#   follow-up question costs one indexed lookup instead of a reload
+# - disk tier: one SQLite file in WAL mode (readers never block the writer,
+#   several processes can share it). Messages are only ever appended; a
+#   session is never rewritten
+# - only the recent window is loaded (SESSION_WINDOW messages, starting at a
+#   user message); older ones stay on disk
+# - sessions idle for longer than SESSION_TTL seconds are deleted
+#
+# HistoryManager.compact() still trims the loaded list in place: that only
+# changes what is sent to the model, the stored log keeps every message.
+# A session is meant to be served by one process at a time (sticky routing);
+# other processes pick up its new messages on their next get().
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_SESSION_DB = os.getenv("SESSION_DB", ".sessions.sqlite3")  # "" keeps sessions in memory only
+DEFAULT_TTL = float(os.getenv("SESSION_TTL", str(7 * 24 * 3600)))
+DEFAULT_WINDOW = int(os.getenv("SESSION_WINDOW", "40"))
+DEFAULT_CACHE_SIZE = int(os.getenv("SESSION_CACHE_SIZE", "256"))
+# expired sessions are swept at most this often, from save()
+EXPIRE_INTERVAL = 300.0
+
+
+class SessionMessages(list):
+    """
+    The message list of one session. append()/extend() also queue the
+    message for the store; other in-place edits (compaction) do not.
+    """
+
+    def __init__(self, session_id: str, messages=(), last_id: int = 0, earlier: int = 0):
+        super().__init__(messages)
+        self.session_id = session_id
+        self.pending = []  # appended since the last save
+        self.last_id = last_id  # newest stored row this list has seen
+        self.earlier = earlier  # stored messages older than the loaded window
+        self.last_active = time.time()
+
+    def append(self, message):
+        super().append(message)
+        self.pending.append(message)
+
+    def extend(self, messages):
+        messages = list(messages)
+        super().extend(messages)
+        self.pending.extend(messages)
+
+    def __delitem__(self, index):
+        # a turn taken back (function calling falling back to the JSON
+        # protocol) must not reach the log; compaction assigns slices instead
+        removed = self[index] if isinstance(index, slice) else [self[index]]
+        self.pending = [m for m in self.pending if not any(m is r for r in removed)]
+        super().__delitem__(index)
+
+
+class SessionStore:
+    def __init__(self, path: str = DEFAULT_SESSION_DB, ttl: float = DEFAULT_TTL, window: int = DEFAULT_WINDOW,
+                 cache_size: int = DEFAULT_CACHE_SIZE, clock=time.time):
+        self.path = path
+        self.ttl = ttl
+        self.window = window
+        self.cache_size = cache_size
+        self.clock = clock
+        self._memory = OrderedDict()  # session id -> SessionMessages
+        self._lock = threading.RLock()
+        self._db = None  # opened on first use, keeps agent startup fast
+        self._next_expiry = 0.0
+        self.memory_hits = 0
+        self.loads = 0
+        self.created = 0
+        self.evictions = 0
+        self.expired = 0
+        self.appended = 0
+
+    # ------------------ SQLite tier ------------------
+    def _conn(self):
+        if self._db is None and self.path:
+            import sqlite3  # ~5 ms, paid by the first session instead of agent startup
+
+            db = sqlite3.connect(self.path, check_same_thread=False, timeout=10)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")  # WAL keeps this crash-safe, only the last commit may be lost
+            db.execute(
+                """CREATE TABLE IF NOT EXISTS sessions (
+                    id TEXT PRIMARY KEY,
+                    created REAL NOT NULL,
+                    last_active REAL NOT NULL
+                )"""
+            )
+            db.execute(
+                """CREATE TABLE IF NOT EXISTS messages (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    session TEXT NOT NULL,
+                    message TEXT NOT NULL
+                )"""
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS messages_session ON messages(session, id)")
+            db.execute("CREATE INDEX IF NOT EXISTS sessions_active ON sessions(last_active)")
+            db.commit()
+            self._db = db
+        return self._db
+
+    def _load(self, db, session_id: str, prefix) -> SessionMessages:
+        rows = db.execute(
+            "SELECT id, message FROM messages WHERE session = ? ORDER BY id DESC LIMIT ?",
+            (session_id, self.window),
+        ).fetchall()
+        rows.reverse()
+        window = [json.loads(message) for _, message in rows]
+        # start at a user message, never inside a turn (or between a tool call and its result)
+        start = next((i for i, m in enumerate(window) if m.get("role") == "user"), None)
+        if start is None:
+            start = next((i for i, m in enumerate(window) if m.get("role") != "tool"), len(window))
+        earlier = 0
+        if rows and (start or len(rows) == self.window):
+            total = db.execute("SELECT COUNT(*) FROM messages WHERE session = ?", (session_id,)).fetchone()[0]
+            earlier = total - (len(window) - start)
+        return SessionMessages(session_id, [*prefix, *window[start:]], last_id=rows[-1][0] if rows else 0,
+                               earlier=earlier)
+
+    def _catch_up(self, db, messages: SessionMessages):
+        # messages stored by another process since this one last saw the session
+        rows = db.execute(
+            "SELECT id, message FROM messages WHERE session = ? AND id > ? ORDER BY id",
+            (messages.session_id, messages.last_id),
+        ).fetchall()
+        if rows:
+            list.extend(messages, (json.loads(message) for _, message in rows))  # already stored
+            messages.last_id = rows[-1][0]
+
+    # ------------------ public API ------------------
+    def get(self, session_id: str, prefix=()) -> SessionMessages:
+        """
+        The session's messages, created on first use. prefix (usually the
+        system prompt) leads the list but is not stored.
+        """
+        now = self.clock()
+        with self._lock:
+            db = self._conn()
+            messages = self._memory.get(session_id)
+            if messages is not None and now - messages.last_active > self.ttl:
+                # idle here; with a database the stored copy decides, another
+                # process may have kept the session going
+                del self._memory[session_id]
+                messages = None
+                if db is None:
+                    self.expired += 1
+            if messages is not None:
+                self._memory.move_to_end(session_id)
+                if db is not None:
+                    self._catch_up(db, messages)
+                self.memory_hits += 1
+            if messages is None and db is not None:
+                row = db.execute("SELECT last_active FROM sessions WHERE id = ?", (session_id,)).fetchone()
+                if row is not None and now - row[0] > self.ttl:
+                    self._drop(db, session_id)
+                    self.expired += 1
+                elif row is not None:
+                    messages = self._load(db, session_id, prefix)
+                    messages.last_active = row[0]
+                    self.loads += 1
+            if messages is None:
+                messages = SessionMessages(session_id, prefix)
+                messages.last_active = now
+                self.created += 1
+            self._memory[session_id] = messages
+            while len(self._memory) > self.cache_size:
+                self._memory.popitem(last=False)  # still on disk, reloaded on demand
+                self.evictions += 1
+            return messages
+
+    def save(self, messages: SessionMessages):
+        """
+        Appends the messages added since the last save, in one transaction.
+        """
+        now = self.clock()
+        with self._lock:
+            pending, messages.pending = messages.pending, []
+            messages.last_active = now
+            db = self._conn()
+            if db is None:
+                return
+            with db:
+                db.execute(
+                    "INSERT INTO sessions (id, created, last_active) VALUES (?, ?, ?) "
+                    "ON CONFLICT(id) DO UPDATE SET last_active = excluded.last_active",
+                    (messages.session_id, now, now),
+                )
+                for message in pending:
+                    cursor = db.execute("INSERT INTO messages (session, message) VALUES (?, ?)",
+                                        (messages.session_id, json.dumps(message, ensure_ascii=False)))
+                    messages.last_id = cursor.lastrowid
+            self.appended += len(pending)
+            if now >= self._next_expiry:
+                self._next_expiry = now + EXPIRE_INTERVAL
+                self.expire()
+
+    def delete(self, session_id: str):
+        with self._lock:
+            self._drop(self._conn(), session_id)
+
+    def expire(self) -> int:
+        """
+        Deletes sessions idle for longer than ttl; returns how many.
+        """
+        cutoff = self.clock() - self.ttl
+        with self._lock:
+            stale = [sid for sid, messages in self._memory.items() if messages.last_active < cutoff]
+            for session_id in stale:
+                del self._memory[session_id]
+            db = self._conn()
+            if db is None:
+                count = len(stale)
+            else:
+                with db:
+                    db.execute("DELETE FROM messages WHERE session IN (SELECT id FROM sessions WHERE last_active < ?)",
+                               (cutoff,))
+                    count = db.execute("DELETE FROM sessions WHERE last_active < ?", (cutoff,)).rowcount
+            self.expired += count
+            return count
+
+    def _drop(self, db, session_id: str):
+        self._memory.pop(session_id, None)
+        if db is not None:
+            with db:
+                db.execute("DELETE FROM messages WHERE session = ?", (session_id,))
+                db.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+
+    # ------------------ asyncio ------------------
+    # the SQLite calls block, so coroutines run them in a worker thread and the
+    # event loop keeps serving other sessions meanwhile
+    async def aget(self, session_id: str, prefix=()) -> SessionMessages:
+        if not self.path:
+            return self.get(session_id, prefix)  # memory only, nothing blocks
+        import asyncio
+
+        return await asyncio.to_thread(self.get, session_id, prefix)
+
+    async def asave(self, messages: SessionMessages):
+        if not self.path:
+            return self.save(messages)
+        import asyncio
+
+        await asyncio.to_thread(self.save, messages)
+
+    async def adelete(self, session_id: str):
+        if not self.path:
+            return self.delete(session_id)
+        import asyncio
+
+        await asyncio.to_thread(self.delete, session_id)
+
+    def stats(self) -> dict:
+        lookups = self.memory_hits + self.loads + self.created
+        return {
+            "in_memory": len(self._memory),
+            "memory_hits": self.memory_hits,
+            "loads": self.loads,
+            "created": self.created,
+            "memory_hit_rate": round(self.memory_hits / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expired": self.expired,
+            "appended": self.appended,
+        }
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
@@ -0,0 +1,51 @@
+# streaming.py
+# Helpers for stream=True chat completions: print tokens as they arrive
+# instead of waiting for the whole answer.
+import sys
+
+import rate_limiter
+import tracing
+
+
+def print_delta(text: str):
+    sys.stdout.write(text)
+    sys.stdout.flush()
+
+
+def stream_completion(client, on_delta=print_delta, **params) -> str:
+    """
+    Calls client.chat.completions.create(stream=True, ...), hands every text
+    delta to on_delta and returns the full assistant content.
+    """
+    parts = []
+    if tracing.tracer.enabled or rate_limiter.metering():
+        # token counts for the trace / the rate limiter; otherwise the plain request
+        params.setdefault("stream_options", {"include_usage": True})
+    for chunk in client.chat.completions.create(stream=True, **params):
+        if getattr(chunk, "usage", None) is not None:
+            # only sent with stream_options={"include_usage": True}
+            tracing.record_usage(chunk)
+            rate_limiter.report_usage(chunk)
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta.content
+        if delta:
+            parts.append(delta)
+            if on_delta is not None:
+                on_delta(delta)
+    return "".join(parts)
+
+
+def complete_text(client, stream: bool = False, on_delta=print_delta, **params) -> str:
+    """
+    Assistant content of one completion, streamed (and echoed) or not.
+    """
+    if stream:
+        text = stream_completion(client, on_delta=on_delta, **params)
+        if on_delta is print_delta:
+            print()
+        return text
+    response = client.chat.completions.create(**params)
+    tracing.record_usage(response)
+    rate_limiter.report_usage(response)
+    return response.choices[0].message.content
@@ -1,11 +1,6 @@
-from openai import OpenAI
-import os
-from dotenv import load_dotenv
-from openai import OpenAI
+from llm_clients import get_client
 
-load_dotenv()
-
-client = OpenAI()
+client = get_client("openai", response_cache=False)
 
 try:
     models = client.models.list()
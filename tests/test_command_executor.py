@@ -0,0 +1,32 @@
+import sys
+
+import pytest
+
+from command_executor import run_command
+
+pytestmark = pytest.mark.skipif(sys.platform == "win32", reason="runs /bin/sh")
+
+
+def test_output_and_exit_code():
+    result = run_command("echo out; echo err >&2; exit 3", timeout=5)
+    assert (result.exit_code, result.stdout, result.stderr) == (3, "out\n", "err\n")
+    assert not result.timed_out and not result.ok
+
+
+def test_output_beyond_the_cap_is_counted_not_kept():
+    result = run_command("head -c 10000 /dev/zero", timeout=5, max_output=100)
+    assert len(result.stdout) == 100
+    assert result.stdout_truncated == 9900
+
+
+def test_timeout_kills_the_process_group():
+    result = run_command("sleep 8 & sleep 8; wait", timeout=0.5)
+    assert result.timed_out
+    assert result.duration < 3
+
+
+def test_closed_pipes_do_not_escape_the_timeout():
+    result = run_command("exec >&- 2>&-; sleep 8", timeout=0.5)
+    assert result.timed_out
+    assert result.exit_code != 0
+    assert result.duration < 3
@@ -0,0 +1,93 @@
+import json
+import os
+import threading
+import time
+
+import pytest
+
+import cursor_like_agent
+import rate_limiter
+from cursor_like_agent import BatchRun, StreamedFile, stream_step
+
+real_sleep = time.sleep  # rate_limiter.time is the time module, patched below
+
+
+class ServerError(Exception):
+    status_code = 503
+
+
+@pytest.fixture(autouse=True)
+def offline(monkeypatch):
+    monkeypatch.setattr(rate_limiter.time, "sleep", lambda seconds: None)
+    monkeypatch.setattr(cursor_like_agent.history, "total_tokens", lambda messages: 0)
+    monkeypatch.setattr(cursor_like_agent, "STREAM", False)
+
+
+@pytest.fixture
+def counting_tool(monkeypatch):
+    # a slow tool, so the pool is busy while the stream breaks off
+    calls = []
+    lock = threading.Lock()
+
+    def tool(project_root, tool_input):
+        real_sleep(0.05)
+        with lock:
+            calls.append(tool_input)
+        return f"done {tool_input['path']}"
+
+    monkeypatch.setitem(cursor_like_agent.TOOLS, "touch", tool)
+    return calls
+
+
+def test_streamed_file_is_committed_as_it_arrived(tmp_path):
+    root = str(tmp_path)
+    streamed = StreamedFile(root)
+    streamed.write("print(")
+    streamed.set_path("app.py")
+    streamed.write("1)\n")
+    obs = streamed.finish({"path": "app.py", "content": "print(1)\n"})
+    assert obs == "File written: app.py (9 bytes)"
+    assert (tmp_path / "app.py").read_text() == "print(1)\n"
+
+
+@pytest.mark.parametrize("content", [42, {"a": 1}, None])
+def test_non_string_content_is_not_committed_empty(tmp_path, content):
+    streamed = StreamedFile(str(tmp_path))
+    streamed.set_path("data.json")
+    obs = streamed.finish({"path": "data.json", "content": content})
+    assert obs.startswith("ERROR")
+    assert not (tmp_path / "data.json").exists()
+    assert [name for name in os.listdir(tmp_path) if name.startswith(".tmp-")] == []
+
+
+def test_cancelled_batch_drops_entries_that_have_not_started(tmp_path, counting_tool):
+    recorded = []
+    batch = BatchRun(str(tmp_path), on_result=lambda *args: recorded.append(args))
+    for i in range(20):
+        batch.submit({"function": "touch", "tool_input": {"path": f"f{i}"}})
+    batch.cancel()
+    assert 0 < len(counting_tool) <= cursor_like_agent.MAX_BATCH_WORKERS
+    # the ones that did run are still reported, so the manifest knows about them
+    assert len(recorded) == len(counting_tool)
+
+
+def test_retried_stream_does_not_run_the_batch_twice(tmp_path, monkeypatch, counting_tool):
+    actions = [{"function": "touch", "tool_input": {"path": f"f{i}"}} for i in range(20)]
+    reply = json.dumps({"step": "action", "function": "batch", "tool_input": actions})
+    attempts = []
+
+    def fake_stream(client, on_delta, **params):
+        attempts.append(1)
+        if len(attempts) == 1:
+            on_delta(reply[:-2])  # every entry streamed in, then the connection drops
+            raise ServerError("503 upstream reset")
+        on_delta(reply)
+        return reply
+
+    monkeypatch.setattr(cursor_like_agent, "stream_completion", fake_stream)
+    stream = stream_step(str(tmp_path), [], record=lambda *args: None)
+    parsed, error = stream.result()
+    assert error is None
+    assert stream.observation(parsed["tool_input"]).startswith("Batch finished: 20 ok")
+    assert len(attempts) == 2
+    assert len(counting_tool) <= 20 + cursor_like_agent.MAX_BATCH_WORKERS
@@ -0,0 +1,141 @@
+import asyncio
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+import tokenization
+from embedding_service import KEY_SIZE, EmbeddingService, EmbeddingStore, content_key
+
+DIM = 8
+
+
+def fake_vector(text: str) -> list:
+    seed = int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=4).digest(), "little")
+    return np.random.default_rng(seed).standard_normal(DIM).astype(np.float32).tolist()
+
+
+class FakeEmbeddings:
+    def __init__(self, fail=False):
+        self.requests = []
+        self.fail = fail
+        self.lock = threading.Lock()
+
+    def create(self, input, model, **extra):
+        with self.lock:
+            self.requests.append(list(input))
+        if self.fail:
+            raise ValueError("bad request")
+        # out of order on purpose: callers must sort by index
+        data = [SimpleNamespace(index=i, embedding=fake_vector(text)) for i, text in enumerate(input)]
+        return SimpleNamespace(data=data[::-1])
+
+
+@pytest.fixture
+def client():
+    return SimpleNamespace(embeddings=FakeEmbeddings())
+
+
+def service(tmp_path, client, **options):
+    return EmbeddingService(client=client, dim=DIM, cache_dir=str(tmp_path), **options)
+
+
+def test_vectors_match_the_api_and_repeats_are_free(tmp_path, client):
+    texts = ["a", "b", "a", "c"]
+    first = service(tmp_path, client)
+    matrix = first.embed(texts)
+    assert np.allclose(matrix, [fake_vector(t) for t in texts])
+    assert client.embeddings.requests == [["a", "b", "c"]]
+    assert first.stats()["deduplicated"] == 1
+
+    restarted = service(tmp_path, client)  # another process, same cache directory
+    assert np.allclose(restarted.embed(["c", "a"]), [fake_vector("c"), fake_vector("a")])
+    assert len(client.embeddings.requests) == 1
+    assert restarted.stats()["hits"] == 2
+
+
+def test_models_and_sizes_do_not_share_vectors(tmp_path, client):
+    service(tmp_path, client).embed(["a"])
+    other = EmbeddingService(client=client, model="other-model", dim=DIM, cache_dir=str(tmp_path))
+    other.embed(["a"])
+    assert len(client.embeddings.requests) == 2
+
+
+def test_batches_respect_input_count_and_token_budget(tmp_path, client, monkeypatch):
+    texts = [f"text number {i} " * 10 for i in range(10)]
+    service(tmp_path, client, batch_size=4).embed(texts)
+    assert [len(r) for r in client.embeddings.requests] == [4, 4, 2]
+
+    client.embeddings.requests.clear()
+    monkeypatch.setattr(tokenization, "count_tokens_batch", lambda texts, model: [100] * len(texts))
+    budget = service(tmp_path / "tokens", client, max_batch_tokens=250)
+    budget.embed(texts)
+    assert [len(r) for r in client.embeddings.requests] == [2, 2, 2, 2, 2]
+
+
+def test_small_batches_are_not_tokenized(tmp_path, client, monkeypatch):
+    def fail(*args):
+        raise AssertionError("tokenizer used")
+
+    monkeypatch.setattr(tokenization, "count_tokens_batch", fail)
+    service(tmp_path, client, max_batch_tokens=1000).embed(["short", "texts"])
+
+
+def test_failed_call_is_not_stored_and_can_be_retried(tmp_path, monkeypatch):
+    import rate_limiter
+
+    monkeypatch.setattr(rate_limiter.time, "sleep", lambda seconds: None)
+    failing = SimpleNamespace(embeddings=FakeEmbeddings(fail=True))
+    broken = service(tmp_path, failing)
+    with pytest.raises(ValueError):
+        broken.embed(["a"])
+    assert broken.stats()["failed_calls"] == 1
+    assert len(broken.store) == 0
+
+    working = SimpleNamespace(embeddings=FakeEmbeddings())
+    assert np.allclose(service(tmp_path, working).embed(["a"]), [fake_vector("a")])
+
+
+def test_concurrent_single_texts_are_coalesced(tmp_path, client):
+    svc = service(tmp_path, client, window_ms=50)
+    texts = [f"q{i % 5}" for i in range(40)]
+    with ThreadPoolExecutor(16) as pool:
+        vectors = list(pool.map(svc.embed_text, texts))
+    assert np.allclose(vectors, [fake_vector(t) for t in texts])
+    assert sum(len(r) for r in client.embeddings.requests) == 5
+    assert len(client.embeddings.requests) < 5
+
+
+def test_async_single_texts(tmp_path, client):
+    svc = service(tmp_path, client, window_ms=20)
+
+    async def main():
+        return await asyncio.gather(*(svc.aembed_text(t) for t in ["x", "y", "x"]))
+
+    vectors = asyncio.run(main())
+    assert np.allclose(vectors, [fake_vector(t) for t in ["x", "y", "x"]])
+    assert client.embeddings.requests == [["x", "y"]]
+
+
+def test_torn_key_is_dropped_before_the_next_append(tmp_path):
+    store = EmbeddingStore(str(tmp_path), "model", DIM)
+    first = np.ones((1, DIM), dtype=np.float32)
+    store.append([content_key("a")], first)
+    with open(store.keys_path, "ab") as f:
+        f.write(content_key("b")[:5])  # crash in the middle of a key
+    with open(store.vectors_path, "ab") as f:
+        f.write(b"\0" * DIM * 4)  # its vector made it to disk
+
+    reopened = EmbeddingStore(str(tmp_path), "model", DIM)
+    assert len(reopened) == 1
+    reopened.append([content_key("c")], np.full((1, DIM), 3, dtype=np.float32))
+
+    fresh = EmbeddingStore(str(tmp_path), "model", DIM)
+    assert len(fresh) == 2
+    assert fresh.lookup(content_key("c")) == 1
+    assert np.allclose(fresh.vector(1), 3)
+    with open(fresh.keys_path, "rb") as f:
+        assert len(f.read()) == 2 * KEY_SIZE
@@ -0,0 +1,30 @@
+import pytest
+
+from function_calling import tools_unsupported
+
+
+class APIError(Exception):
+    # str() of the SDK errors: status and response body
+    def __init__(self, status, message):
+        super().__init__(f"Error code: {status} - {{'error': {{'message': {message!r}}}}}")
+        self.status_code = status
+
+
+@pytest.mark.parametrize("status, message", [
+    (400, "registry.ollama.ai/library/gemma:2b does not support tools"),
+    (400, "tools are not supported (mock)"),
+    (400, '"auto" tool choice requires --enable-auto-tool-choice and --tool-call-parser to be set'),
+    (422, "Function calling is not supported for this model"),
+])
+def test_tools_rejected(status, message):
+    assert tools_unsupported(APIError(status, message))
+
+
+@pytest.mark.parametrize("status, message", [
+    (400, "This model's maximum context length is 8192 tokens"),
+    (400, "messages with role 'tool' must be a response to a preceding message with 'tool_calls'"),
+    (404, "model 'gemma:7b' not found"),
+    (500, "tools are not supported"),
+])
+def test_other_errors_are_not_a_fallback(status, message):
+    assert not tools_unsupported(APIError(status, message))
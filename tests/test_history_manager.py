@@ -0,0 +1,121 @@
+import json
+
+import pytest
+
+import history_manager
+from history_manager import SUMMARY_PREFIX, HistoryManager, is_summary
+
+
+class WordEncoder:
+    # one token per word, enough to test the budget arithmetic offline
+    def encode(self, text, disallowed_special=()):
+        return text.split()
+
+    def decode(self, tokens):
+        return " ".join(tokens)
+
+
+@pytest.fixture(autouse=True)
+def word_tokens(monkeypatch):
+    monkeypatch.setattr(history_manager, "get_encoder", lambda model: WordEncoder())
+    monkeypatch.setattr(history_manager, "count_tokens", lambda text, model: len(text.split()))
+
+
+def agent_start(*injected):
+    return [{"role": "system", "content": "prompt"}, {"role": "user", "content": "spec"}, *injected]
+
+
+def step(i, words=200):
+    action = {"step": "action", "function": "write_file",
+              "tool_input": {"path": f"f{i}.py", "content": "x " * words}}
+    return [{"role": "assistant", "content": json.dumps(action)},
+            {"role": "assistant", "content": json.dumps({"step": "observe", "content": f"File written: f{i}.py"})}]
+
+
+def long_run(*injected):
+    messages = agent_start(*injected)
+    for i in range(60):
+        messages.extend(step(i))
+    return messages
+
+
+def test_single_turn_run_after_an_injected_message_is_compacted():
+    # resume / plan-cache / "Create the project now." all land right after the pinned spec
+    resume = {"role": "user", "content": "Resuming: these files already exist ..."}
+    messages, plain = long_run(resume), long_run()
+    manager = HistoryManager(max_tokens=2000, keep_recent=10, pin_first_user=True)
+    assert manager.total_tokens(messages) > 13000
+
+    manager.compact(messages)
+    manager.compact(plain)
+    assert messages[:2] == agent_start()
+    assert is_summary(messages[2])
+    assert messages[3] == resume
+    # compacted as far as the same run without the injected message
+    assert manager.total_tokens(messages) <= manager.total_tokens(plain) + manager.message_tokens(resume)
+    assert messages[-10:] == long_run()[-10:]
+
+
+def test_latest_question_survives_but_its_turn_is_compacted():
+    messages = agent_start()
+    messages.append({"role": "assistant", "content": "earlier answer " * 300})
+    question = {"role": "user", "content": "now add tests"}
+    messages.append(question)
+    steps = [{"role": "assistant", "content": f"working on part {i} " + "y " * 100} for i in range(30)]
+    messages.extend(steps)
+    manager = HistoryManager(max_tokens=1500, keep_recent=4, summary_tokens=200, pin_first_user=True)
+
+    manager.compact(messages)
+    # the turn's own early steps went into the summary
+    assert is_summary(messages[2]) and messages[3] == question
+    assert "working on part" in messages[2]["content"]
+    assert messages[4:] == steps[-len(messages[4:]):]
+
+    # the next compaction finds the summary and the question in the same place
+    messages.extend({"role": "assistant", "content": "more " * 100} for _ in range(20))
+    manager.compact(messages)
+    assert is_summary(messages[2]) and messages[3] == question
+    assert SUMMARY_PREFIX in messages[2]["content"]
+
+
+def test_question_inside_the_recent_tail_is_left_alone():
+    messages = agent_start()
+    messages.extend({"role": "assistant", "content": "old " * 300} for _ in range(10))
+    messages.append({"role": "user", "content": "q"})
+    messages.append({"role": "assistant", "content": "a"})
+    HistoryManager(max_tokens=500, keep_recent=4, pin_first_user=True).compact(messages)
+    assert [m["content"] for m in messages[-2:]] == ["q", "a"]
+    assert is_summary(messages[2])
+
+
+def test_nothing_changes_under_the_budget():
+    messages = agent_start(*step(0, words=5))
+    assert HistoryManager(max_tokens=1000).compact(list(messages)) == messages
+
+
+def tool_call_step(i, words=200):
+    arguments = {"path": f"f{i}.py", "content": "x " * words}
+    return [{"role": "assistant", "content": None, "tool_calls": [{
+                "id": f"call_{i}", "type": "function",
+                "function": {"name": "write_file", "arguments": json.dumps(arguments)}}]},
+            {"role": "tool", "tool_call_id": f"call_{i}", "content": f"File written: f{i}.py"}]
+
+
+def test_tool_call_arguments_are_elided_before_turns_are_dropped():
+    messages = agent_start({"role": "user", "content": "Create the project now."})
+    for i in range(20):
+        messages.extend(tool_call_step(i))
+    manager = HistoryManager(max_tokens=3000, keep_recent=4, pin_first_user=True)
+    manager.compact(messages)
+
+    assert manager.dropped_messages == 0  # eliding was enough
+    arguments = json.loads(messages[3]["tool_calls"][0]["function"]["arguments"])
+    assert arguments == {"path": "f0.py", "content": "<400 chars elided>"}
+    assert messages[4] == tool_call_step(0)[1]
+    assert messages[-4:] == tool_call_step(18) + tool_call_step(19)
+
+
+def test_short_and_invalid_arguments_are_kept():
+    calls = [{"id": "a", "function": {"name": "create_folder", "arguments": '{"path": "src"}'}},
+             {"id": "b", "function": {"name": "write_file", "arguments": '{"path": "x", "content": "cut off'}}]
+    assert history_manager.elide_tool_calls(calls) == calls
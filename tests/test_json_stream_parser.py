@@ -0,0 +1,130 @@
+import json
+import random
+
+import pytest
+
+from json_stream_parser import JSONStreamError, StreamParser, check_object
+
+DOCUMENTS = [
+    '{"step": "plan", "content": "hello"}',
+    '{"a": [1, -2.5, 3e2, 0, true, false, null], "b": {"c": [], "d": {}}}',
+    '{"s": "esc \\" \\\\ \\/ \\b \\f \\n \\r \\t \\u00e9 \\ud83d\\ude00 \\ud800x"}',
+    '  [ "x" , [ [ ] ] , { "k" : "v" } ]  ',
+    '"just a string"',
+    "-0.125E-3",
+    '{"unicode": "naïve 😀 ✓"}',
+]
+
+INVALID = [
+    '{"a": 1,}',
+    '{"a" 1}',
+    '{"a": [1 2]}',
+    "[1, 2",
+    '{"a": "unterminated',
+    '{"a": tru}',
+    '{"a": 01}',
+    '{"a": 1.}',
+    '{"a": "bad \\x escape"}',
+    '{"a": "bad \\u12G4"}',
+    '{"a": "ctrl \x01"}',
+    '{"a": 1} {"b": 2}',
+    '{a: 1}',
+    "",
+    '{"x": 1,\n "y": [1,\n 2,,]}',
+    # cut off at the end of the stream, in every structural state
+    "[",
+    "{",
+    '{"a"',
+    '{"a":',
+    '{"a": 1',
+    '{"a": 1,',
+    '{"a": [1, 2]',
+]
+
+
+def feed_in_pieces(text, sizes, **callbacks):
+    parser = StreamParser(**callbacks)
+    i = 0
+    for size in sizes:
+        parser.feed(text[i:i + size])
+        i += size
+    parser.feed(text[i:])
+    return parser.close()
+
+
+@pytest.mark.parametrize("text", DOCUMENTS)
+def test_every_split_gives_the_json_loads_result(text):
+    expected = json.loads(text)
+    for cut in range(len(text) + 1):
+        assert feed_in_pieces(text, [cut]) == expected
+    one_by_one = StreamParser()
+    for c in text:
+        one_by_one.feed(c)
+    assert one_by_one.close() == expected
+
+
+@pytest.mark.parametrize("text", INVALID)
+def test_errors_have_the_json_loads_position(text):
+    with pytest.raises(json.JSONDecodeError) as expected:
+        json.loads(text)
+    rng = random.Random(0)
+    for _ in range(20):
+        sizes = [rng.randint(0, 4) for _ in range(len(text))]
+        with pytest.raises(JSONStreamError) as error:
+            feed_in_pieces(text, sizes)
+        assert str(error.value) == str(expected.value)
+        assert (error.value.lineno, error.value.colno) == (expected.value.lineno, expected.value.colno)
+
+
+def test_values_are_reported_with_their_path_when_closed():
+    seen = []
+    text = '{"step": "action", "tool_input": [{"path": "a"}, 2]}'
+    feed_in_pieces(text, [5] * 20, on_value=lambda path, value: seen.append((path, value)))
+    assert seen[0] == (("step",), "action")
+    assert (("tool_input", 0, "path"), "a") in seen
+    assert (("tool_input", 1), 2) in seen
+    assert seen[-1] == ((), json.loads(text))
+
+
+def test_streamed_string_arrives_in_chunks_before_it_closes():
+    chunks, values = [], []
+    parser = StreamParser(on_value=lambda path, value: values.append(path),
+                          on_chunk=lambda path, text: chunks.append((path, text)),
+                          streamed=lambda path: path == ("tool_input", "content"))
+    parser.feed('{"tool_input": {"path": "a.py", "content": "line 1\\nli')
+    assert chunks == [(("tool_input", "content"), "line 1\nli")]
+    assert ("tool_input", "content") not in values
+    parser.feed('ne 2 \\u00')  # an escape split across deltas is held back
+    parser.feed('e9"}}')
+    parser.close()
+    assert "".join(text for _, text in chunks) == "line 1\nline 2 é"
+    assert ("tool_input", "content") in values
+
+
+def test_numbers_split_across_deltas():
+    parser = StreamParser()
+    parser.feed('{"n": 12')
+    parser.feed("34.5")
+    parser.feed("e1}")
+    assert parser.close() == {"n": 12345.0}
+
+
+def test_push_keeps_the_first_error_for_close():
+    parser = StreamParser()
+    parser.push('{"a": ]')
+    parser.push('more text')
+    with pytest.raises(JSONStreamError, match="Expecting value"):
+        parser.close()
+
+
+def test_incomplete_document_fails_on_close():
+    parser = StreamParser()
+    parser.feed('{"a": [1, 2]')
+    with pytest.raises(JSONStreamError, match="Expecting ',' delimiter"):
+        parser.close()
+
+
+def test_check_object():
+    assert check_object({"step": "plan"}) == {"step": "plan"}
+    with pytest.raises(ValueError):
+        check_object(["not", "an", "object"])
@@ -0,0 +1,59 @@
+import asyncio
+
+import pytest
+
+from ollama_batcher import BatcherStopped, MicroBatcher, QueueFull
+
+
+def test_held_batch_counts_toward_max_queue():
+    async def main():
+        release = asyncio.Event()
+
+        async def handler(item):
+            await release.wait()
+            return item * 2
+
+        batcher = MicroBatcher(handler, asyncio.Semaphore(1), window_ms=5, max_queue=2)
+        batcher.start()
+        first = asyncio.create_task(batcher.submit(1))
+        await asyncio.sleep(0.01)  # dispatched, holds the only slot
+        waiting = [asyncio.create_task(batcher.submit(n)) for n in (2, 3)]
+        await asyncio.sleep(0.05)  # collected into a batch that waits for the slot
+        assert batcher.queue.empty()
+        assert batcher.pending() == 2
+        with pytest.raises(QueueFull):
+            await batcher.submit(4)
+
+        release.set()
+        assert await asyncio.gather(first, *waiting) == [2, 4, 6]
+        assert batcher.pending() == 0
+        assert batcher.stats()["rejected"] == 1
+        await batcher.stop()
+
+    asyncio.run(main())
+
+
+def test_stop_fails_requests_that_were_not_dispatched():
+    async def main():
+        release = asyncio.Event()
+
+        async def handler(item):
+            await release.wait()
+            return item
+
+        batcher = MicroBatcher(handler, asyncio.Semaphore(1), window_ms=5)
+        batcher.start()
+        first = asyncio.create_task(batcher.submit(1))
+        await asyncio.sleep(0.01)
+        held = asyncio.create_task(batcher.submit(2))
+        await asyncio.sleep(0.05)
+        stopping = asyncio.create_task(batcher.stop())
+        await asyncio.sleep(0.01)
+        release.set()
+        await stopping
+        assert await first == 1
+        with pytest.raises(BatcherStopped):
+            await held
+        assert batcher.pending() == 0
+
+    asyncio.run(main())
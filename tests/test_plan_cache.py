@@ -0,0 +1,110 @@
+import os
+
+import pytest
+
+from cursor_like_agent import replay_actions
+from plan_cache import PLACEHOLDER, PlanCache, actions_from_manifest, normalize_spec, plan_key, templatize
+from project_manifest import ProjectManifest
+
+# content normalize_content would change if it ran over it again
+TRICKY = {
+    "src/regex.py": 'PATTERN = r"\\d+\\s*"',  # one line with backslashes: would be unescaped
+    "src/notes.py": "# all comments\n# on purpose\n",  # would lose its "#" prefixes
+    "win.bat": "@echo off\r\necho shop\r\n",
+    "src/models.py": "NAME = 'shop'\nWORKSHOP = 'workshop'\n",
+}
+
+
+def run_project(root, files, function="write_file"):
+    # what a finished model run leaves behind: files on disk and the manifest
+    manifest = ProjectManifest(root)
+    manifest.start({"project_name": "shop", "language": "python"})
+    for rel, content in files.items():
+        full_path = os.path.join(root, rel)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        with open(full_path, "w", encoding="utf-8", newline="") as f:
+            f.write(content)
+        manifest.record_action("create_folder", os.path.dirname(rel) or ".")
+        manifest.record_action(function, rel)
+    return manifest
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return PlanCache(str(tmp_path / "plans"))
+
+
+def test_replay_is_byte_exact(tmp_path, cache):
+    spec = {"project_name": "shop", "language": "python"}
+    manifest = run_project(str(tmp_path / "shop"), TRICKY)
+    cache.store(spec, "model", actions_from_manifest(manifest))
+
+    entry, exact = cache.lookup({"project_name": "store", "language": "py"}, "model")
+    assert exact
+    root = str(tmp_path / "store")
+    assert replay_actions(root, cache.replay(entry, "store")) == 0
+
+    for rel, content in TRICKY.items():
+        with open(os.path.join(root, rel), "rb") as f:
+            expected = content.replace("'shop'", "'store'").replace("echo shop", "echo store")
+            assert f.read() == expected.encode("utf-8"), rel
+
+
+def test_replayed_files_are_in_the_manifest(tmp_path, cache):
+    manifest = run_project(str(tmp_path / "shop"), {"a.txt": "a\\nb"})
+    actions = actions_from_manifest(manifest)
+    root = str(tmp_path / "store")
+    recorded = []
+    assert replay_actions(root, actions, on_result=lambda *args: recorded.append(args)) == 0
+    assert [func for func, _, _ in recorded] == ["create_folder", "write_file"]
+    # a second replay finds everything current
+    replay_actions(root, actions, on_result=lambda *args: recorded.append(args))
+    assert recorded[-1][2] == "File already up-to-date: a.txt"
+
+
+def test_replay_rejects_paths_outside_the_project(tmp_path):
+    actions = [{"function": "write_file", "tool_input": {"path": "../escape.txt", "content": "x"}}]
+    assert replay_actions(str(tmp_path / "p"), actions) == 1
+    assert not os.path.exists(tmp_path / "escape.txt")
+
+
+def test_patched_file_is_stored_once_with_final_content(tmp_path):
+    root = str(tmp_path / "shop")
+    manifest = run_project(root, {"app.py": "v2\n"})
+    manifest.record_action("patch_file", "app.py")
+    actions = actions_from_manifest(manifest)
+    assert actions[-1] == {"function": "write_file", "tool_input": {"path": "app.py", "content": "v2\n"}}
+    assert len(actions) == 2
+
+
+def test_project_name_is_templatized_as_a_whole_word(cache, tmp_path):
+    spec = {"project_name": "shop", "language": "python"}
+    actions = [{"function": "write_file", "tool_input": {"path": "shop/x.py", "content": "shop workshop"}}]
+    cache.store(spec, "model", actions)
+    entry, _ = cache.lookup(spec, "model")
+    assert entry["actions"][0]["tool_input"] == {"path": f"{PLACEHOLDER}/x.py", "content": f"{PLACEHOLDER} workshop"}
+
+
+def test_name_inside_another_identifier_is_kept():
+    text = "from blog.models import blog_posts, BlogPost\nweblog = blog.app  # blog-api"
+    assert templatize(text, "blog") == ("from {P}.models import blog_posts, BlogPost\n"
+                                         "weblog = {P}.app  # {P}-api").replace("{P}", PLACEHOLDER)
+
+
+def test_short_names_are_templatized_but_not_single_letters():
+    assert templatize("import ui\nbuild = 1", "ui") == f"import {PLACEHOLDER}\nbuild = 1"
+    assert templatize("x = 1", "x") == "x = 1"
+
+
+def test_spec_key_ignores_name_case_and_aliases():
+    a = {"project_name": "a", "language": "py", "requirements": "Add  Auth"}
+    b = {"project_name": "b", "language": "python", "requirements": "add auth"}
+    assert normalize_spec(a) == normalize_spec(b)
+    assert plan_key(a, "m") == plan_key(b, "m") != plan_key(b, "other")
+
+
+def test_partial_hit_falls_back_to_the_language_scaffold(cache):
+    cache.store({"project_name": "x", "language": "python"}, "model", [])
+    entry, exact = cache.lookup({"project_name": "y", "language": "python", "requirements": "auth"}, "model")
+    assert entry is not None and not exact
+    assert cache.partial_hits == 1
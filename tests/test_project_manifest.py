@@ -0,0 +1,119 @@
+import json
+import os
+
+import project_manifest
+from project_manifest import MANIFEST_FILE, MANIFEST_LOG, ProjectManifest, content_hash
+
+
+def write(root, rel, data: bytes):
+    full_path = os.path.join(root, rel)
+    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+    with open(full_path, "wb") as f:
+        f.write(data)
+    return full_path, content_hash(data)
+
+
+def log_lines(root):
+    with open(os.path.join(root, MANIFEST_LOG), encoding="utf-8") as f:
+        return f.read().splitlines()
+
+
+def test_records_survive_reload_through_the_log(tmp_path):
+    root = str(tmp_path)
+    manifest = ProjectManifest(root)
+    manifest.start({"name": "demo"})
+    full_path, digest = write(root, "src/app.py", b"print(1)\n")
+    manifest.record("src/app.py", full_path, digest)
+    manifest.record_action("write_file", "src/app.py")
+
+    assert not os.path.exists(os.path.join(root, MANIFEST_FILE))  # nothing compacted yet
+    assert len(log_lines(root)) == 4  # header + 3 records
+
+    reloaded = ProjectManifest(root)
+    assert reloaded.spec == {"name": "demo"}
+    assert reloaded.is_current("src/app.py", full_path, digest)
+    assert reloaded.actions == [{"function": "write_file", "path": "src/app.py", "hash": digest}]
+    assert reloaded.can_resume({"name": "demo"})
+
+
+def test_paths_are_normalized(tmp_path):
+    root = str(tmp_path)
+    manifest = ProjectManifest(root)
+    full_path, digest = write(root, "a/b.txt", b"x")
+    manifest.record("./a//b.txt", full_path, digest)
+    assert list(manifest.files) == [os.path.normpath("a/b.txt")]
+    assert manifest.is_current("a/b.txt", full_path, digest)
+    assert manifest.is_current(" ./a/b.txt", full_path, digest)
+
+
+def test_edit_outside_the_agent_is_not_current(tmp_path):
+    root = str(tmp_path)
+    manifest = ProjectManifest(root)
+    full_path, digest = write(root, "a.txt", b"one")
+    manifest.record("a.txt", full_path, digest)
+    with open(full_path, "wb") as f:
+        f.write(b"three")
+    assert not manifest.is_current("a.txt", full_path, digest)
+
+
+def test_log_is_compacted_into_the_snapshot(tmp_path, monkeypatch):
+    monkeypatch.setattr(project_manifest, "MIN_COMPACT_RECORDS", 4)
+    root = str(tmp_path)
+    manifest = ProjectManifest(root)
+    for i in range(10):
+        full_path, digest = write(root, f"f{i}.txt", str(i).encode())
+        manifest.record(f"f{i}.txt", full_path, digest)
+
+    with open(os.path.join(root, MANIFEST_FILE), encoding="utf-8") as f:
+        snapshot = json.load(f)
+    assert snapshot["generation"] == manifest.generation >= 1
+    assert json.loads(log_lines(root)[0]) == {"generation": manifest.generation}
+    assert len(log_lines(root)) - 1 < 10  # the rest lives in the snapshot
+
+    reloaded = ProjectManifest(root)
+    assert sorted(reloaded.files) == sorted(f"f{i}.txt" for i in range(10))
+
+
+def test_torn_record_is_dropped(tmp_path):
+    root = str(tmp_path)
+    manifest = ProjectManifest(root)
+    full_path, digest = write(root, "a.txt", b"a")
+    manifest.record("a.txt", full_path, digest)
+    with open(os.path.join(root, MANIFEST_LOG), "a", encoding="utf-8") as f:
+        f.write('{"type": "file", "path": "b.t')  # crash in the middle of a write
+
+    reloaded = ProjectManifest(root)
+    assert list(reloaded.files) == ["a.txt"]
+    # rewritten without the torn record, so later appends start on a clean line
+    full_path, digest = write(root, "c.txt", b"c")
+    reloaded.record("c.txt", full_path, digest)
+    assert sorted(ProjectManifest(root).files) == ["a.txt", "c.txt"]
+
+
+def test_stale_log_is_ignored(tmp_path):
+    root = str(tmp_path)
+    manifest = ProjectManifest(root)
+    manifest.start({"name": "demo"})
+    manifest.record_action("create_folder", "src")
+    stale = log_lines(root)
+    manifest.save()
+    # crash between writing the snapshot and resetting the log
+    with open(os.path.join(root, MANIFEST_LOG), "w", encoding="utf-8") as f:
+        f.write("\n".join(stale) + "\n")
+
+    reloaded = ProjectManifest(root)
+    assert reloaded.actions == [{"function": "create_folder", "path": "src"}]  # not applied twice
+
+
+def test_start_without_resume_clears_actions(tmp_path):
+    root = str(tmp_path)
+    manifest = ProjectManifest(root)
+    manifest.start({"name": "demo"})
+    manifest.record_action("create_folder", "src")
+    manifest.mark_completed()
+    assert not manifest.can_resume({"name": "demo"})
+
+    reloaded = ProjectManifest(root)
+    assert reloaded.completed
+    reloaded.start({"name": "demo"})
+    assert ProjectManifest(root).actions == []
@@ -0,0 +1,22 @@
+import pytest
+
+from provider_router import DEFAULT_MODELS, router_from_env
+
+
+def test_route_from_env(monkeypatch):
+    monkeypatch.setenv("LLM_ROUTE", "gemini, ollama:llama3.2")
+    router = router_from_env()
+    assert [(b.name, b.model) for b in router.backends] == [("gemini", DEFAULT_MODELS["gemini"]),
+                                                             ("ollama", "llama3.2")]
+
+
+def test_unset_route(monkeypatch):
+    monkeypatch.delenv("LLM_ROUTE", raising=False)
+    assert router_from_env() is None
+
+
+@pytest.mark.parametrize("route", ["gemini,claude", "openai,:gpt-4o"])
+def test_unknown_provider_is_named(monkeypatch, route):
+    monkeypatch.setenv("LLM_ROUTE", route)
+    with pytest.raises(ValueError, match="LLM_ROUTE: unknown provider"):
+        router_from_env()
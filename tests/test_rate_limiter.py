@@ -0,0 +1,157 @@
+from types import SimpleNamespace
+
+import pytest
+
+import rate_limiter
+from rate_limiter import RateLimiter, RetryStats, TokenBucket, acall_with_retry, call_with_retry
+from streaming import complete_text
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class HTTPError(Exception):
+    def __init__(self, status, retry_after=None):
+        super().__init__(f"status {status}")
+        self.status_code = status
+        headers = {"retry-after": retry_after} if retry_after else {}
+        self.response = SimpleNamespace(status_code=status, headers=headers)
+
+
+@pytest.fixture(autouse=True)
+def no_sleep(monkeypatch):
+    slept = []
+    monkeypatch.setattr(rate_limiter.time, "sleep", slept.append)
+    return slept
+
+
+def test_bucket_waits_for_refill():
+    clock = FakeClock()
+    bucket = TokenBucket(capacity=10, rate=1, clock=clock)
+    assert bucket.reserve(10) == 0
+    assert bucket.reserve(2) == pytest.approx(2.0)
+    clock.now = 5
+    assert bucket.reserve(1) == 0  # 10 - 12 + 5 = 3 left
+
+
+def test_bucket_caps_oversized_requests():
+    bucket = TokenBucket(capacity=10, rate=1, clock=FakeClock())
+    # a request larger than the bucket must not wait forever
+    assert bucket.reserve(1000) == 0
+
+
+def test_retries_retryable_errors(no_sleep):
+    attempts = []
+
+    def fn():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise HTTPError(503)
+        return "ok"
+
+    stats = RetryStats()
+    assert call_with_retry(fn, base_delay=0.01, stats=stats) == "ok"
+    assert (stats.attempts, stats.retries, stats.failures) == (3, 2, 0)
+    assert len(no_sleep) == 2
+
+
+def test_does_not_retry_client_errors():
+    stats = RetryStats()
+    with pytest.raises(HTTPError):
+        call_with_retry(lambda: (_ for _ in ()).throw(HTTPError(400)), stats=stats)
+    assert (stats.attempts, stats.failures) == (1, 1)
+
+
+def test_honors_retry_after(no_sleep):
+    calls = []
+
+    def fn():
+        calls.append(1)
+        if len(calls) == 1:
+            raise HTTPError(429, retry_after="7")
+        return "ok"
+
+    call_with_retry(fn, stats=RetryStats())
+    assert no_sleep == [7.0]
+
+
+def test_gives_up_after_max_attempts():
+    stats = RetryStats()
+    with pytest.raises(HTTPError):
+        call_with_retry(lambda: (_ for _ in ()).throw(HTTPError(500)), max_attempts=3, stats=stats)
+    assert (stats.attempts, stats.failures) == (3, 1)
+
+
+def usage(total):
+    return SimpleNamespace(total_tokens=total, prompt_tokens=total // 2, completion_tokens=total - total // 2)
+
+
+class FakeChatClient:
+    def __init__(self, total_tokens):
+        self.total_tokens = total_tokens
+        self.params = None
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, stream=False, **params):
+        self.params = params
+        if stream:
+            return iter([
+                SimpleNamespace(usage=None, choices=[SimpleNamespace(delta=SimpleNamespace(content="hi"))]),
+                SimpleNamespace(usage=usage(self.total_tokens), choices=[]),
+            ])
+        return SimpleNamespace(usage=usage(self.total_tokens),
+                               choices=[SimpleNamespace(message=SimpleNamespace(content="hi"))])
+
+
+def test_text_results_are_charged_their_real_usage():
+    limiter = RateLimiter(rpm=60, tpm=10_000)
+    client = FakeChatClient(total_tokens=700)
+    text = call_with_retry(lambda: complete_text(client, model="m", messages=[]), limiter=limiter, tokens=100)
+    assert text == "hi"
+    assert limiter.tokens.tokens == pytest.approx(10_000 - 700, abs=1)
+
+
+def test_streamed_usage_is_requested_and_charged():
+    limiter = RateLimiter(rpm=60, tpm=10_000)
+    client = FakeChatClient(total_tokens=500)
+    call_with_retry(lambda: complete_text(client, stream=True, on_delta=None, model="m", messages=[]),
+                    limiter=limiter, tokens=100)
+    assert client.params["stream_options"] == {"include_usage": True}
+    assert limiter.tokens.tokens == pytest.approx(10_000 - 500, abs=1)
+
+
+def test_streams_outside_a_retry_keep_the_plain_request():
+    client = FakeChatClient(total_tokens=500)
+    complete_text(client, stream=True, on_delta=None, model="m", messages=[])
+    assert "stream_options" not in client.params
+
+
+def test_cache_hits_are_not_charged():
+    limiter = RateLimiter(rpm=60, tpm=10_000)
+
+    def cached():
+        rate_limiter.report_cache_hit()
+        return "from cache"
+
+    call_with_retry(cached, limiter=limiter, tokens=300)
+    assert limiter.tokens.tokens == pytest.approx(10_000, abs=1)
+    assert limiter.requests.tokens == pytest.approx(60, abs=0.1)
+
+
+def test_async_retry_meters_usage():
+    import asyncio
+
+    limiter = RateLimiter(rpm=60, tpm=10_000)
+
+    async def fn():
+        rate_limiter.report_usage(SimpleNamespace(usage=usage(400)))
+        return "text"
+
+    assert asyncio.run(acall_with_retry(fn, limiter=limiter, tokens=100)) == "text"
+    assert limiter.tokens.tokens == pytest.approx(10_000 - 400, abs=1)
+    assert not rate_limiter.metering()
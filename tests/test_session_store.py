@@ -0,0 +1,133 @@
+import asyncio
+import threading
+
+import pytest
+
+from session_store import SessionStore
+
+SYSTEM = {"role": "system", "content": "prompt"}
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def turn(n):
+    return [{"role": "user", "content": f"q{n}"}, {"role": "assistant", "content": f"a{n}"}]
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "sessions.sqlite3")
+
+
+def test_only_new_messages_are_appended(db_path):
+    store = SessionStore(db_path)
+    messages = store.get("s", [SYSTEM])
+    messages.extend(turn(1))
+    store.save(messages)
+    messages.extend(turn(2))
+    store.save(messages)
+    assert store.appended == 4  # the prefix is never stored
+
+    reloaded = SessionStore(db_path).get("s", [SYSTEM])
+    assert reloaded == [SYSTEM, *turn(1), *turn(2)]
+    assert reloaded.earlier == 0
+
+
+def test_window_starts_at_a_user_message(db_path):
+    store = SessionStore(db_path, window=5)
+    messages = store.get("s", [SYSTEM])
+    for n in range(4):
+        messages.extend(turn(n))
+    store.save(messages)
+
+    reloaded = SessionStore(db_path, window=5).get("s", [SYSTEM])
+    # the last 5 rows begin with an assistant message, which is skipped
+    assert reloaded == [SYSTEM, *turn(2), *turn(3)]
+    assert reloaded.earlier == 4
+
+
+def test_compaction_does_not_touch_the_log(db_path):
+    store = SessionStore(db_path)
+    messages = store.get("s", [SYSTEM])
+    messages.extend(turn(1) + turn(2))
+    store.save(messages)
+    messages[1:3] = [{"role": "system", "content": "summary"}]  # what HistoryManager.compact does
+    store.save(messages)
+    assert SessionStore(db_path).get("s", [SYSTEM]) == [SYSTEM, *turn(1), *turn(2)]
+
+
+def test_deleted_turn_is_not_stored(db_path):
+    store = SessionStore(db_path)
+    messages = store.get("s", [SYSTEM])
+    messages.extend(turn(1))
+    del messages[-2:]
+    store.save(messages)
+    assert SessionStore(db_path).get("s", [SYSTEM]) == [SYSTEM]
+
+
+def test_other_process_messages_are_picked_up(db_path):
+    first, second = SessionStore(db_path), SessionStore(db_path)
+    messages = first.get("s", [SYSTEM])
+    messages.extend(turn(1))
+    first.save(messages)
+
+    other = second.get("s", [SYSTEM])
+    other.extend(turn(2))
+    second.save(other)
+
+    assert first.get("s", [SYSTEM]) == [SYSTEM, *turn(1), *turn(2)]
+    assert first.memory_hits == 1
+
+
+def test_idle_sessions_expire(db_path):
+    clock = FakeClock()
+    store = SessionStore(db_path, ttl=60, clock=clock)
+    messages = store.get("s", [SYSTEM])
+    messages.extend(turn(1))
+    store.save(messages)
+    clock.now += 61
+    assert store.expire() == 1
+    assert SessionStore(db_path, clock=clock).get("s", [SYSTEM]) == [SYSTEM]
+
+
+def test_lru_eviction_keeps_sessions_on_disk(db_path):
+    store = SessionStore(db_path, cache_size=2)
+    for sid in ("a", "b", "c"):
+        messages = store.get(sid, [SYSTEM])
+        messages.extend(turn(sid))
+        store.save(messages)
+    assert store.evictions == 1
+    assert store.get("a", [SYSTEM]) == [SYSTEM, *turn("a")]
+    assert store.loads == 1
+
+
+def test_memory_only_store():
+    store = SessionStore("")
+    messages = store.get("s", [SYSTEM])
+    messages.extend(turn(1))
+    store.save(messages)
+    assert store.get("s", [SYSTEM]) is messages
+
+
+def test_async_calls_run_off_the_event_loop(db_path, monkeypatch):
+    store = SessionStore(db_path)
+    threads = []
+    get = store.get
+    monkeypatch.setattr(store, "get", lambda *args: threads.append(threading.current_thread()) or get(*args))
+
+    async def main():
+        messages = await store.aget("s", [SYSTEM])
+        messages.extend(turn(1))
+        await store.asave(messages)
+        assert SessionStore(db_path).get("s", [SYSTEM]) == [SYSTEM, *turn(1)]
+        await store.adelete("s")
+
+    asyncio.run(main())
+    assert threads and threads[0] is not threading.main_thread()
+    assert SessionStore(db_path).get("s", [SYSTEM]) == [SYSTEM]
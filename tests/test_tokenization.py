@@ -0,0 +1,23 @@
+from tokenization import _split_point, iter_text_chunks
+
+
+def test_split_before_a_word_or_number():
+    assert _split_point("a = 1\nb = 2\n") == len("a = 1\n")
+    assert _split_point("x;\n42\n") == len("x;\n")
+
+
+def test_no_split_where_punctuation_can_merge():
+    # o200k encodes ";\n//" as one pre-token
+    assert _split_point("a();\n// note") == 0
+    assert _split_point("if x:\n    y\n}") == 0
+    assert _split_point("one\ntwo();\n// note") == len("one\n")
+
+
+def test_chunks_rejoin_to_the_file(tmp_path):
+    path = tmp_path / "code.js"
+    text = "".join(f"function f{i}() {{\n  return {i};\n}}\n// {i}\n" for i in range(500))
+    path.write_text(text, encoding="utf-8")
+    chunks = list(iter_text_chunks(str(path), chunk_chars=100))
+    assert "".join(chunks) == text
+    assert len(chunks) > 1
+    assert all(chunk[0].isalnum() for chunk in chunks[1:])
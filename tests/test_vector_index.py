@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+
+import vector_index
+from vector_index import VectorIndex
+
+
+@pytest.fixture
+def index():
+    index = VectorIndex(dim=3)
+    index.add(["x", "y", "z"], np.eye(3), payloads=["px", "py", "pz"])
+    return index
+
+
+def test_search_ranks_by_cosine(index):
+    assert [hit[0] for hit in index.search([1, 0.5, 0], k=2)] == ["x", "y"]
+    index.delete(["x"])
+    assert [hit[0] for hit in index.search([1, 0.5, 0], k=5)] == ["y", "z"]
+
+
+@pytest.mark.parametrize("k", [0, -1])
+def test_no_results_for_k_below_one(index, k):
+    assert index.search([1, 0, 0], k=k) == []
+
+
+def test_save_and_load(tmp_path, index):
+    index.delete(["y"])
+    index.save(str(tmp_path))
+    loaded = VectorIndex.load(str(tmp_path))
+    assert loaded.ids == ["x", "z"]
+    assert loaded.search([0, 0, 1], k=1)[0][:1] == ("z",)
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["meta.json", "vectors.npy"]
+
+
+def test_crash_before_meta_is_detected(tmp_path, index, monkeypatch):
+    index.save(str(tmp_path))
+    index.add(["w"], [[1, 1, 1]])
+
+    def crash(*args):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(vector_index.json, "dump", crash)
+    with pytest.raises(OSError):
+        index.save(str(tmp_path))
+    with pytest.raises(ValueError, match="interrupted save"):
+        VectorIndex.load(str(tmp_path))
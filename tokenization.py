@@ -1,17 +1,161 @@
-import tiktoken
+# tokenization.py
+# Token counting for prompts, chat histories and files.
+#
+# tiktoken itself and the BPE tables are only loaded on first use, so
+# importing this module (every agent does, through history_manager) stays cheap.
+import os
+import threading
+from functools import lru_cache
 
-encoder = tiktoken.encoding_for_model("gpt-4o")
+DEFAULT_MODEL = "gpt-4o"
+# threads used by tiktoken's encode_batch (the Rust core releases the GIL)
+ENCODE_THREADS = int(os.getenv("TOKENIZER_THREADS", str(os.cpu_count() or 4)))
+FILE_CHUNK_CHARS = 1 << 20
 
-# vocab size for gpt-4 - vocab size is the total number of unique tokens for the model
-print("vocab size:", encoder.n_vocab)
+# chat format overhead, as documented by OpenAI for gpt-3.5-turbo / gpt-4 / gpt-4o:
+# every message is wrapped in <|start|>{role}\n{content}<|end|>\n, and the
+# reply is primed with <|start|>assistant<|message|>
+TOKENS_PER_MESSAGE = 3
+TOKENS_PER_NAME = 1
+REPLY_PRIMING_TOKENS = 3
 
-# input query
-text = 'the cat sat on the mat'
-# tokenization
-tokens = encoder.encode(text)
-print("tokens:", tokens) # tokens are same every time for same input
+_encoder_lock = threading.Lock()
 
-# decoding / detokenization
-my_tokens = [3086, 9059, 10139, 402, 290, 2450]
-decoded_text = encoder.decode(my_tokens)
-print("decoded text:", decoded_text) # decoded text is same every time for same tokens
\ No newline at end of file
+
+@lru_cache(maxsize=None)
+def _load_encoder(model: str):
+    import tiktoken  # lazy: pulls in regex + the Rust extension
+
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        # non-OpenAI models (gemini, gemma...) -> closest OpenAI tokenizer
+        return tiktoken.get_encoding("o200k_base")
+
+
+def get_encoder(model: str = DEFAULT_MODEL):
+    # building an encoder loads the whole BPE table, so do it once per model;
+    # the lock keeps concurrent first calls from loading it twice
+    with _encoder_lock:
+        return _load_encoder(model)
+
+
+@lru_cache(maxsize=4096)
+def count_tokens(text: str, model: str = DEFAULT_MODEL) -> int:
+    return len(get_encoder(model).encode(text, disallowed_special=()))
+
+
+def encode_batch(texts, model: str = DEFAULT_MODEL, num_threads: int = ENCODE_THREADS):
+    """
+    Token ids for many texts at once, encoded across `num_threads` threads.
+    """
+    return get_encoder(model).encode_batch(list(texts), num_threads=num_threads, disallowed_special=())
+
+
+def count_tokens_batch(texts, model: str = DEFAULT_MODEL, num_threads: int = ENCODE_THREADS) -> list:
+    return [len(tokens) for tokens in encode_batch(texts, model, num_threads)]
+
+
+def _message_texts(message) -> list:
+    texts = []
+    for key, value in message.items():
+        if key == "content" and isinstance(value, list):
+            # multi-part content: only text parts are tokenized here
+            texts.extend(part.get("text", "") for part in value if isinstance(part, dict))
+        elif isinstance(value, str):
+            texts.append(value)
+    return texts
+
+
+def count_message_tokens(messages, model: str = DEFAULT_MODEL) -> int:
+    """
+    Prompt tokens of a chat request, including the per-message framing.
+    """
+    texts, names = [], 0
+    for message in messages:
+        texts.extend(_message_texts(message))
+        names += "name" in message
+    content_tokens = sum(count_tokens_batch(texts, model)) if texts else 0
+    return content_tokens + TOKENS_PER_MESSAGE * len(messages) + TOKENS_PER_NAME * names + REPLY_PRIMING_TOKENS
+
+
+def _split_point(text: str) -> int:
+    """
+    Index just after the last newline that is followed by a letter or digit.
+    In the cl100k/o200k pre-tokenizers a newline can only end a token there:
+    a word or number never takes a newline as its prefix. (Punctuation can
+    carry newlines along, o200k keeps ";\n//" together, so a line starting
+    with "/" or "}" is not a safe place.) Encoding the two halves separately
+    then gives the same count as encoding the whole.
+    """
+    i = len(text) - 1
+    while i > 0:
+        i = text.rfind("\n", 0, i)
+        if i < 0:
+            return 0
+        if i + 1 < len(text) and text[i + 1].isalnum():
+            return i + 1
+    return 0
+
+
+def iter_text_chunks(path: str, chunk_chars: int = FILE_CHUNK_CHARS, encoding: str = "utf-8"):
+    """
+    Yields a large text file in pieces that can be tokenized independently.
+    """
+    carry = ""
+    with open(path, encoding=encoding, errors="replace", newline="") as f:
+        while True:
+            block = f.read(chunk_chars)
+            if not block:
+                break
+            text = carry + block
+            cut = _split_point(text)
+            if cut == 0:
+                carry = text  # no safe boundary yet (e.g. one huge line)
+                continue
+            yield text[:cut]
+            carry = text[cut:]
+    if carry:
+        yield carry
+
+
+def count_file_tokens(path: str, model: str = DEFAULT_MODEL, chunk_chars: int = FILE_CHUNK_CHARS,
+                      num_threads: int = ENCODE_THREADS) -> int:
+    """
+    Token count of a file without loading it into memory at once.
+    `num_threads` chunks are encoded in parallel at a time.
+    """
+    total = 0
+    pending = []
+    for chunk in iter_text_chunks(path, chunk_chars):
+        pending.append(chunk)
+        if len(pending) >= num_threads:
+            total += sum(count_tokens_batch(pending, model, num_threads))
+            pending = []
+    if pending:
+        total += sum(count_tokens_batch(pending, model, num_threads))
+    return total
+
+
+if __name__ == "__main__":
+    encoder = get_encoder("gpt-4o")
+
+    # vocab size for gpt-4 - vocab size is the total number of unique tokens for the model
+    print("vocab size:", encoder.n_vocab)
+
+    # input query
+    text = 'the cat sat on the mat'
+    # tokenization
+    tokens = encoder.encode(text)
+    print("tokens:", tokens) # tokens are same every time for same input
+
+    # decoding / detokenization
+    my_tokens = [3086, 9059, 10139, 402, 290, 2450]
+    decoded_text = encoder.decode(my_tokens)
+    print("decoded text:", decoded_text) # decoded text is same every time for same tokens
+
+    # chat request size, framing included
+    print("chat tokens:", count_message_tokens([
+        {"role": "system", "content": "You are a helpful assistant."},
+        {"role": "user", "content": text},
+    ]))
@@ -0,0 +1,227 @@
+# tracing.py
+# Structured spans for the agents: one JSON line per model call and per tool
+# call with its latency, token usage, cost, retries and cache outcome.
+#
+#   AGENT_TRACE=trace.jsonl python cursor_like_agent.py
+#   python tracing.py trace.jsonl          # p50/p95 per step type
+#
+# The agents open the spans; code further down the call (response cache,
+# retry loop, rate limiter, router) adds to whichever span is open through
+# annotate() / incr() / record_usage(), without being handed the span.
+# With AGENT_TRACE unset, span() returns one shared no-op object and the
+# helpers return after a single ContextVar lookup.
+import contextvars
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+
+from metrics import percentile
+
+TRACE_PATH = os.getenv("AGENT_TRACE", "")
+
+# USD per 1M tokens (prompt, completion), list prices; only used for the cost column.
+# Models not listed (e.g. local Ollama ones) are counted as free.
+PRICES = {
+    "gemini-2.5-flash": (0.30, 2.50),
+    "gemini-2.0-flash": (0.10, 0.40),
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+}
+# cache outcomes that did not reach the provider, so cost nothing
+CACHED = {"hit", "semantic"}
+
+_current = contextvars.ContextVar("trace_span", default=None)
+
+
+class Span:
+    __slots__ = ("tracer", "kind", "attrs", "id", "parent", "start", "_token")
+
+    def __init__(self, tracer, kind: str, attrs: dict):
+        self.tracer = tracer
+        self.kind = kind
+        self.attrs = attrs
+        self.id = next(tracer._ids)
+        self.parent = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def incr(self, name: str, amount=1):
+        self.attrs[name] = self.attrs.get(name, 0) + amount
+
+    def __enter__(self):
+        parent = _current.get()
+        self.parent = parent.id if parent is not None else None
+        self._token = _current.set(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self.start
+        _current.reset(self._token)
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        self.tracer.write(self, elapsed)
+        return False
+
+
+class _NoopSpan:
+    """
+    What span() returns while tracing is off.
+    """
+
+    def set(self, **attrs):
+        pass
+
+    def incr(self, name: str, amount=1):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+def span_cost(attrs: dict) -> float:
+    if attrs.get("cache") in CACHED:
+        return 0.0
+    prompt_price, completion_price = PRICES.get(attrs.get("model"), (0.0, 0.0))
+    return (attrs.get("prompt_tokens", 0) * prompt_price
+            + attrs.get("completion_tokens", 0) * completion_price) / 1_000_000
+
+
+class Tracer:
+    def __init__(self, path: str = ""):
+        self.path = path
+        self.enabled = bool(path)
+        self.trace_id = f"{os.getpid()}-{int(time.time())}"  # one per agent run
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._file = None
+
+    def span(self, kind: str, **attrs):
+        """
+        with tracer.span("tool", tool="write_file") as span: ...; span.set(ok=True)
+        """
+        if not self.enabled:
+            return NOOP_SPAN
+        return Span(self, kind, attrs)
+
+    def write(self, span: Span, seconds: float):
+        record = {"trace": self.trace_id, "span": span.id, "parent": span.parent, "kind": span.kind,
+                  "ts": round(time.time(), 3), "ms": round(seconds * 1000, 3), **span.attrs}
+        if "prompt_tokens" in span.attrs:
+            record["cost_usd"] = round(span_cost(span.attrs), 8)
+        line = json.dumps(record, default=str) + "\n"
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, "a", encoding="utf-8")
+            # flushed per span so a crashed run still leaves its trace
+            self._file.write(line)
+            self._file.flush()
+
+
+tracer = Tracer(TRACE_PATH)
+
+
+def span(kind: str, **attrs):
+    return tracer.span(kind, **attrs)
+
+
+def annotate(**attrs):
+    """
+    Sets attributes on the open span, if any.
+    """
+    current = _current.get()
+    if current is not None:
+        current.attrs.update(attrs)
+
+
+def incr(name: str, amount=1):
+    current = _current.get()
+    if current is not None:
+        current.incr(name, amount)
+
+
+def record_usage(response):
+    """
+    Adds the usage block of a completion (or final stream chunk) to the open span.
+    """
+    current = _current.get()
+    if current is None:
+        return
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return
+    current.incr("prompt_tokens", getattr(usage, "prompt_tokens", 0) or 0)
+    current.incr("completion_tokens", getattr(usage, "completion_tokens", 0) or 0)
+
+
+# ------------------ Summary ------------------
+def load_spans(path: str, trace: str = None) -> list:
+    spans = []
+    if not os.path.exists(path):
+        return spans  # nothing traced yet
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # torn last line of a killed run
+            if trace is None or record.get("trace") == trace:
+                spans.append(record)
+    return spans
+
+
+def step_type(record: dict) -> str:
+    # llm:plan, llm:action, tool:write_file, turn, ...
+    detail = record.get("step") or record.get("tool")
+    return f"{record['kind']}:{detail}" if detail else record["kind"]
+
+
+def summarize(spans) -> dict:
+    groups = {}
+    for record in spans:
+        groups.setdefault(step_type(record), []).append(record)
+    summary = {}
+    for name, records in sorted(groups.items()):
+        latencies = [r["ms"] for r in records]
+        summary[name] = {
+            "count": len(records),
+            "p50_ms": round(percentile(latencies, 50), 1),
+            "p95_ms": round(percentile(latencies, 95), 1),
+            "total_ms": round(sum(latencies), 1),
+            "prompt_tokens": sum(r.get("prompt_tokens", 0) for r in records),
+            "completion_tokens": sum(r.get("completion_tokens", 0) for r in records),
+            "cost_usd": round(sum(r.get("cost_usd", 0.0) for r in records), 6),
+            "cache_hits": sum(r.get("cache") in CACHED for r in records),
+            "retries": sum(r.get("retries", 0) for r in records),
+            "errors": sum("error" in r or r.get("ok") is False for r in records),
+        }
+    return summary
+
+
+def print_summary(path: str = TRACE_PATH, trace: str = None):
+    summary = summarize(load_spans(path, trace))
+    if not summary:
+        print("no spans in", path)
+        return
+    print(f"{'step':<24}{'n':>6}{'p50 ms':>10}{'p95 ms':>10}{'total s':>9}{'tok in':>9}{'tok out':>9}"
+          f"{'cost $':>10}{'cached':>7}{'retry':>6}{'err':>5}")
+    for name, s in summary.items():
+        print(f"{name[:23]:<24}{s['count']:>6}{s['p50_ms']:>10.1f}{s['p95_ms']:>10.1f}{s['total_ms'] / 1000:>9.2f}"
+              f"{s['prompt_tokens']:>9}{s['completion_tokens']:>9}{s['cost_usd']:>10.4f}"
+              f"{s['cache_hits']:>7}{s['retries']:>6}{s['errors']:>5}")
+
+
+if __name__ == "__main__":
+    # python tracing.py [trace.jsonl] [trace id]
+    print_summary(sys.argv[1] if len(sys.argv) > 1 else TRACE_PATH or "trace.jsonl",
+                  sys.argv[2] if len(sys.argv) > 2 else None)
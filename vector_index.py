@@ -0,0 +1,149 @@
+# vector_index.py
+# In-memory cosine-similarity index backed by a float32 NumPy matrix.
+#
+# - vectors are L2-normalized on insert, so cosine similarity is one mat-vec product
+# - save() writes the matrix as .npy; load() memory-maps it, so opening a large
+#   index is instant and only touched pages are read from disk
+# - delete() only marks rows; compact() (or save) drops them for real
+import json
+import os
+
+import numpy as np
+
+VECTORS_FILE = "vectors.npy"
+META_FILE = "meta.json"
+
+
+def normalize_rows(vectors) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors[None, :]
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class VectorIndex:
+    def __init__(self, dim: int, capacity: int = 1024):
+        self.dim = dim
+        self._vectors = np.zeros((capacity, dim), dtype=np.float32)
+        self._alive = np.zeros(capacity, dtype=bool)
+        self._size = 0          # rows used (alive or deleted)
+        self.ids = []           # row -> id
+        self.payloads = []      # row -> optional payload (e.g. chunk text)
+        self._rows = {}         # id -> row
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __contains__(self, item_id):
+        return item_id in self._rows
+
+    # ------------------ writes ------------------
+    def _reserve(self, extra: int):
+        needed = self._size + extra
+        capacity = self._vectors.shape[0]
+        # a loaded index is a read-only memmap: the first write copies it into memory
+        if needed <= capacity and self._vectors.flags.writeable:
+            return
+        new_capacity = max(needed, capacity * 2, 1024)
+        vectors = np.zeros((new_capacity, self.dim), dtype=np.float32)
+        vectors[:self._size] = self._vectors[:self._size]
+        alive = np.zeros(new_capacity, dtype=bool)
+        alive[:self._size] = self._alive[:self._size]
+        self._vectors, self._alive = vectors, alive
+
+    def add(self, ids, vectors, payloads=None):
+        """
+        Adds (or replaces) vectors. ids and vectors must have the same length,
+        and an id may appear only once per call.
+        """
+        ids = list(ids)
+        if len(set(ids)) != len(ids):
+            # the later row would win and the earlier one stay searchable
+            raise ValueError("duplicate ids in one add() call")
+        vectors = normalize_rows(vectors)
+        if vectors.shape != (len(ids), self.dim):
+            raise ValueError(f"expected {len(ids)} vectors of dim {self.dim}, got {vectors.shape}")
+        payloads = list(payloads) if payloads is not None else [None] * len(ids)
+
+        self.delete([item_id for item_id in ids if item_id in self._rows])
+        self._reserve(len(ids))
+        start, end = self._size, self._size + len(ids)
+        self._vectors[start:end] = vectors
+        self._alive[start:end] = True
+        for offset, (item_id, payload) in enumerate(zip(ids, payloads)):
+            self._rows[item_id] = start + offset
+        self.ids.extend(ids)
+        self.payloads.extend(payloads)
+        self._size = end
+
+    def delete(self, ids) -> int:
+        removed = 0
+        for item_id in ids:
+            row = self._rows.pop(item_id, None)
+            if row is None:
+                continue
+            self._alive[row] = False
+            removed += 1
+        return removed
+
+    def compact(self):
+        """
+        Physically removes deleted rows.
+        """
+        keep = np.flatnonzero(self._alive[:self._size])
+        self._vectors = np.ascontiguousarray(self._vectors[keep])
+        self._alive = np.ones(len(keep), dtype=bool)
+        self.ids = [self.ids[row] for row in keep]
+        self.payloads = [self.payloads[row] for row in keep]
+        self._rows = {item_id: row for row, item_id in enumerate(self.ids)}
+        self._size = len(keep)
+
+    # ------------------ reads ------------------
+    def search(self, query, k: int = 5):
+        """
+        Top-k cosine matches for one query vector: [(id, score, payload), ...]
+        """
+        if not self._rows or k <= 0:
+            return []
+        q = normalize_rows(query)[0]
+        scores = self._vectors[:self._size] @ q
+        if len(self._rows) < self._size:
+            scores[~self._alive[:self._size]] = -np.inf
+        k = min(k, len(self._rows))
+        # argpartition is O(n), only the k winners get sorted
+        top = np.argpartition(scores, -k)[-k:]
+        top = top[np.argsort(-scores[top])]
+        return [(self.ids[row], float(scores[row]), self.payloads[row]) for row in top]
+
+    # ------------------ persistence ------------------
+    def save(self, directory: str):
+        self.compact()
+        os.makedirs(directory, exist_ok=True)
+        # both files are swapped in whole; vectors first, and load() checks that
+        # the row counts agree in case a crash falls between the two
+        tmp = os.path.join(directory, VECTORS_FILE + ".tmp")
+        with open(tmp, "wb") as f:
+            np.save(f, self._vectors[:self._size])
+        os.replace(tmp, os.path.join(directory, VECTORS_FILE))
+        meta = {"dim": self.dim, "ids": self.ids, "payloads": self.payloads}
+        tmp = os.path.join(directory, META_FILE + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp, os.path.join(directory, META_FILE))
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True):
+        with open(os.path.join(directory, META_FILE), encoding="utf-8") as f:
+            meta = json.load(f)
+        index = cls(meta["dim"], capacity=0)
+        index._vectors = np.load(os.path.join(directory, VECTORS_FILE), mmap_mode="r" if mmap else None)
+        index._size = index._vectors.shape[0]
+        if index._size != len(meta["ids"]) or index._vectors.shape[1:] != (index.dim,):
+            raise ValueError(f"{directory}: {VECTORS_FILE} does not match {META_FILE} (interrupted save?)")
+        index._alive = np.ones(index._size, dtype=bool)
+        index.ids = meta["ids"]
+        index.payloads = meta["payloads"]
+        index._rows = {item_id: row for row, item_id in enumerate(index.ids)}
+        return index
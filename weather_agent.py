@@ -1,16 +1,67 @@
-from dotenv import load_dotenv
-from openai import OpenAI
 import json
 import os
-import requests
+import sys
+from collections import Counter
 
-load_dotenv()
+from function_calling import FunctionCallingEngine, string_parameter
+from history_manager import HistoryManager
+from json_stream_parser import StreamParser, check_object, parse_error_message
+from llm_clients import lazy_client, load_env
+from provider_router import router_from_env
+from rate_limiter import call_with_retry, print_retry, shared_limiter
+from session_store import SessionStore
+from streaming import complete_text, print_delta, stream_completion
+from tracing import print_summary, tracer
+from weather_cache import WeatherCache
+from weather_prefetch import WeatherPrefetcher
 
-client = OpenAI(
-    api_key=os.getenv('GOOGLE_API_KEY'),
-    base_url="https://generativelanguage.googleapis.com/v1beta/openai/"
+load_env()
+
+MODEL_NAME = "gemini-2.5-flash"
+# AGENT_STREAM=1 echoes every step while the model is still generating it
+STREAM = os.getenv("AGENT_STREAM") == "1"
+# wttr.in by default, overridable so the agent can run against a local mock
+WEATHER_BASE_URL = os.getenv("WEATHER_BASE_URL", "https://wttr.in")
+
+# most questions are about a handful of cities, so weather lookups are cached
+weather_cache = WeatherCache(
+    ttl=float(os.getenv("WEATHER_CACHE_TTL", "300")),
+    maxsize=int(os.getenv("WEATHER_CACHE_SIZE", "256")),
 )
 
+# start get_weather for cities named in the query/plan while the model is
+# still planning (WEATHER_PREFETCH=0 to disable)
+PREFETCH = os.getenv("WEATHER_PREFETCH", "1") == "1"
+# AGENT_ENGINE=tools uses native function calling (fewer round trips),
+# the JSON step protocol below stays the default and the fallback
+ENGINE = os.getenv("AGENT_ENGINE", "json")
+# invalid JSON replies in a row before a turn is given up
+MAX_INVALID_REPLIES = 3
+
+# keeps long sessions from growing the prompt forever
+history = HistoryManager(max_tokens=int(os.getenv("HISTORY_MAX_TOKENS", "8000")))
+
+# conversations are kept in SESSION_DB (SQLite), so they survive restarts and
+# can be continued by another worker process
+sessions = SessionStore()
+
+# retries are done by rate_limiter, so the SDK's own retries are off.
+# the SDK is imported on the first call, not at startup.
+# no response cache: each step depends on the tool results before it
+# LLM_ROUTE=gemini,ollama routes calls by latency with failover between backends
+client = router_from_env(response_cache=False) or lazy_client("gemini", max_retries=0, response_cache=False)
+
+def fetch_weather(city: str) -> str:
+    """
+    Uncached wttr.in lookup. Raises on failure so errors are never cached.
+    """
+    import requests  # only needed once a lookup misses the cache
+
+    url = f"{WEATHER_BASE_URL}/{city}?format=%C+%t"
+    response = requests.get(url, timeout=10)
+    response.raise_for_status()
+    return response.text.strip()
+
 def get_weather(city: str) -> str:
     # Dummy implementation of weather fetching
     # In real scenario, this would call a weather API
@@ -22,22 +73,27 @@ def get_weather(city: str) -> str:
     # }
     # return weather_data.get(city, "31 degrees Celsius, sunny.")  
 
-    url = f"https://wttr.in/{city}?format=%C+%t"
-    response = requests.get(url)
-    if response.status_code == 200:
-        return response.text.strip()
-    else:
-        return "Could not fetch weather data at this time."
+    try:
+        return weather_cache.get_or_fetch(city, fetch_weather)
+    except Exception as e:
+        from requests import RequestException  # only imported once a lookup has failed
+
+        if isinstance(e, RequestException):
+            return "Could not fetch weather data at this time."
+        raise
+
+# launched / used / wasted speculative lookups, summed over all turns
+prefetch_stats = Counter()
 
 # def add(x, y):
 #     return x + y
 
 def run_command(command):
-    try:
-        result = os.system(command)
-        return result
-    except Exception as e:
-        return str(e)
+    # bounded subprocess (timeout, output cap, rlimits) instead of os.system,
+    # so the model sees stdout/stderr and a runaway command cannot hang the agent
+    import command_executor  # pulls in asyncio, only needed once a command runs
+
+    return command_executor.run_command(command).as_dict()
     
 available_tools = {
     "get_weather": {
@@ -50,7 +106,7 @@ available_tools = {
     # }
     "run_command": {
         "fn" : run_command,
-        "description": "Run a system command. Input is the command as string" 
+        "description": "Run a system command. Input is the command as string; returns exit code, stdout and stderr"
     }  
 }
 
@@ -77,7 +133,7 @@ Output JSON Format:
 
 Available tools:
 - get_weather: Get the current weather of a city. Input is city name as string
-- run_command: Takes a command as input to execute on system and returns output
+- run_command: Takes a command as input to execute on system and returns its exit code, stdout and stderr
 
 Example:
 User Query: what is the weather of New York?
@@ -88,46 +144,183 @@ Output: {{step: "observe", content: "The weather data for New York is 25 degree
 Output: {{step: "result", content: "The current weather of New York is 25 degree Celsius with clear sky."}}
 """
 
-messages = [
-    {"role": "system", "content": system_prompt},
-]
-
-while True:
-    query = input("> ")
-    if(query.lower() in ["exit", "quit"]):
-        break
+def run_turn(messages, query, client=client):
+    """
+    Resolve one user query with the plan -> action -> observe -> result protocol.
+    messages is the conversation history and is extended in place.
+    Returns the final answer (or None if the model called an unknown tool).
+    """
     messages.append({"role": "user", "content": query})
+    # per turn, so concurrent turns never take or discard each other's lookups;
+    # speculative lookups share the cache (and in-flight fetches) with get_weather
+    prefetcher = WeatherPrefetcher(lambda city: weather_cache.get_or_fetch(city, fetch_weather))
+    if PREFETCH:
+        prefetcher.from_text(query)
+    try:
+        return _run_steps(messages, client, prefetcher)
+    finally:
+        # prefetches the model never asked for
+        prefetcher.discard()
+        prefetch_stats.update(prefetcher.stats())
 
-    while True:
-        response = client.chat.completions.create(
-        model="gemini-2.5-flash",
-        response_format={"type": "json_object"},
-        messages = messages
+def _complete_step(messages, client, prefetcher):
+    """
+    One model reply as (parsed step, None) or (None, parse error).
+    Streamed replies are parsed while they arrive, so the get_weather lookup
+    starts as soon as the city has streamed in, before the reply is complete.
+    """
+    if not STREAM:
+        content = call_with_retry(
+            lambda: complete_text(
+                client,
+                model=MODEL_NAME,
+                response_format={"type": "json_object"},
+                messages=messages
+            ),
+            limiter=shared_limiter,
+            tokens=history.total_tokens(messages),
+            on_retry=print_retry,
         )
+        try:
+            return check_object(json.loads(content)), None
+        except (TypeError, ValueError) as e:  # JSONDecodeError carries the position
+            return None, e
+
+    def attempt():
+        seen = {}
+
+        def on_value(path, value):
+            if len(path) == 1:
+                seen[path[0]] = value
+            if (path == ("tool_input",) and PREFETCH and isinstance(value, str)
+                    and seen.get("step") == "action" and seen.get("function") == "get_weather"):
+                prefetcher.prefetch(value)
+
+        parser = StreamParser(on_value=on_value)
+
+        def on_delta(text):
+            print_delta(text)
+            parser.push(text)
+
+        stream_completion(client, on_delta=on_delta, model=MODEL_NAME,
+                          response_format={"type": "json_object"}, messages=messages)
+        print()
+        return parser
 
-        # print(response.choices[0].message.content)
-        parsed_response = json.loads(response.choices[0].message.content)
+    parser = call_with_retry(attempt, limiter=shared_limiter, tokens=history.total_tokens(messages),
+                             on_retry=print_retry)
+    try:
+        return check_object(parser.close()), None
+    except ValueError as e:
+        return None, e
+
+def _run_steps(messages, client, prefetcher):
+    invalid = 0
+    while True:
+        history.compact(messages)
+        # AGENT_TRACE=trace.jsonl records latency/tokens/retries of every step
+        with tracer.span("llm", engine="json", model=MODEL_NAME) as span:
+            parsed_response, error = _complete_step(messages, client, prefetcher)
+            span.set(step="invalid_json" if error else parsed_response.get("step"))
+        if error is not None:
+            # reported with its position, and the model gets another try
+            print(f"Invalid JSON from the model: {error}")
+            invalid += 1
+            if invalid >= MAX_INVALID_REPLIES:
+                return None
+            messages.append({"role": "assistant", "content": json.dumps(
+                {"step": "observe", "content": parse_error_message(error)})})
+            continue
+        invalid = 0
         messages.append({"role": "assistant", "content": json.dumps(parsed_response)})
 
         if parsed_response.get("step") == "result":
             print(f"Final Answer: {parsed_response.get('content')}")
-            break
+            return parsed_response.get("content")
         if parsed_response.get("step") == "action":
             function_name = parsed_response.get("function")
             tool_input = parsed_response.get("tool_input")
             if function_name in available_tools:
                 tool_fn = available_tools[function_name]["fn"]
-                observation = tool_fn(tool_input)
+                with tracer.span("tool", tool=function_name) as span:
+                    observation = prefetcher.take(tool_input) if function_name == "get_weather" else None
+                    if observation is not None:
+                        print('🔨tool called: get_weather', tool_input, '(prefetched)')
+                        span.set(prefetched=True)
+                    else:
+                        observation = tool_fn(tool_input)
                 print(f"Tool Observation: {observation}")
                 messages.append({"role": "assistant", "content": json.dumps({"step": "observe", "content": observation})})
                 continue
             else:
                 messages.append({"role": "assistant", "content": f"Observation: Function {function_name} not found."})
-                break
+                return None
         else:
             print(f"🧠: {parsed_response.get('content')}")
+            if PREFETCH:
+                prefetcher.from_text(parsed_response.get("content", ""))
             continue
 
+# ------------------ Function calling engine ------------------
+tools_system_prompt = """
+You are a helpful AI assistant who is specialized in solving user query.
+Use the provided tools when you need data; call independent tools together in one response.
+Once you have the tool results, answer the user directly.
+"""
+
+function_tools = {
+    "get_weather": {
+        "fn": lambda city: get_weather(city),
+        "description": "Get the current weather of a city",
+        "parameters": string_parameter("city", "City name, e.g. New York"),
+    },
+    "run_command": {
+        "fn": lambda command: run_command(command),
+        "description": "Run a shell command and return its exit code, stdout and stderr (output is truncated, "
+                       "long-running commands are killed)",
+        "parameters": string_parameter("command", "The shell command to run"),
+    },
+}
+
+def build_engine(client=client):
+    """
+    Function calling engine; backends that reject `tools` fall back to run_turn.
+    """
+    def json_fallback(messages, query):
+        messages[0] = {"role": "system", "content": system_prompt}
+        return run_turn(messages, query, client=client)
+
+    return FunctionCallingEngine(client, MODEL_NAME, function_tools, fallback=json_fallback, history=history)
+
+def main(session_id="cli"):
+    engine = build_engine() if ENGINE == "tools" else None
+    messages = sessions.get(session_id, [
+        {"role": "system", "content": tools_system_prompt if engine else system_prompt},
+    ])
+    if len(messages) > 1:
+        print(f"Continuing session {session_id!r} ({len(messages) - 1 + messages.earlier} earlier messages)")
+
+    while True:
+        query = input("> ")
+        if(query.lower() in ["exit", "quit"]):
+            break
+        with tracer.span("turn", engine=ENGINE):
+            try:
+                if engine:
+                    print(f"Final Answer: {engine.run(messages, query)}")
+                else:
+                    run_turn(messages, query)
+            finally:
+                # only this turn's messages are written
+                sessions.save(messages)
+
+    if tracer.enabled:
+        print_summary(tracer.path, tracer.trace_id)
+
+if __name__ == "__main__":
+    # python weather_agent.py [session id]
+    main(sys.argv[1] if len(sys.argv) > 1 else "cli")
+
 # response = client.chat.completions.create(
 #     model="gemini-2.5-flash",
 #     response_format={"type": "json_object"},
@@ -0,0 +1,162 @@
+# weather_cache.py
+# TTL + LRU cache for weather lookups with in-flight de-duplication:
+# concurrent lookups for the same city share one upstream fetch.
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+# handed to coalesced waiters when the fetching task was cancelled
+_LEADER_CANCELLED = object()
+
+
+def normalize_city(city) -> str:
+    """
+    "  new   YORK " -> "new york"
+    """
+    return " ".join(str(city).split()).casefold()
+
+
+class WeatherCache:
+    """
+    Maps normalized city name -> weather text.
+
+    - entries expire after `ttl` seconds
+    - at most `maxsize` entries are kept, least recently used are evicted first
+    - failed fetches are never cached
+    """
+
+    def __init__(self, ttl: float = 300.0, maxsize: int = 256, clock=time.monotonic):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.clock = clock
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._inflight = {}            # key -> concurrent.futures.Future
+        self._ainflight = {}           # key -> asyncio.Future
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    # ------------------ internal helpers (call with lock held) ------------------
+    def _lookup(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= self.clock():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _store(self, key, value):
+        self._entries[key] = (self.clock() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    # ------------------ public API ------------------
+    def get_or_fetch(self, city, fetch):
+        """
+        Return the cached value for city or call fetch(city) once,
+        even if several threads ask for the same city at the same time.
+        """
+        key = normalize_city(city)
+        with self._lock:
+            entry = self._lookup(key)
+            if entry is not None:
+                self.hits += 1
+                return entry[1]
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                self.misses += 1
+                future = self._inflight[key] = Future()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            return future.result()
+
+        try:
+            value = fetch(city)
+        except BaseException as e:
+            with self._lock:
+                self._inflight.pop(key, None)
+            future.set_exception(e)
+            raise
+        with self._lock:
+            self._store(key, value)
+            self._inflight.pop(key, None)
+        future.set_result(value)
+        return value
+
+    async def aget_or_fetch(self, city, fetch):
+        """
+        Async variant of get_or_fetch, fetch is a coroutine function.
+        """
+        key = normalize_city(city)
+        while True:
+            with self._lock:
+                entry = self._lookup(key)
+                if entry is not None:
+                    self.hits += 1
+                    return entry[1]
+                future = self._ainflight.get(key)
+                leader = future is None
+                if leader:
+                    self.misses += 1
+                    future = self._ainflight[key] = asyncio.get_running_loop().create_future()
+                else:
+                    self.coalesced += 1
+
+            if leader:
+                break
+            # shield so one cancelled waiter does not cancel the shared fetch
+            value = await asyncio.shield(future)
+            if value is not _LEADER_CANCELLED:
+                return value
+            # the leader's session went away: the first waiter back fetches instead
+
+        try:
+            value = await fetch(city)
+        except BaseException as e:
+            with self._lock:
+                self._ainflight.pop(key, None)
+            if isinstance(e, asyncio.CancelledError):
+                # not the waiters' business, they retry instead of being cancelled too
+                future.set_result(_LEADER_CANCELLED)
+            else:
+                future.set_exception(e)
+                # mark retrieved so an unawaited shared failure is not logged
+                future.exception()
+            raise
+        with self._lock:
+            self._store(key, value)
+            self._ainflight.pop(key, None)
+        future.set_result(value)
+        return value
+
+    def invalidate(self, city):
+        with self._lock:
+            self._entries.pop(normalize_city(city), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits + self.coalesced) / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,154 @@
+# weather_prefetch.py
+# Speculative get_weather calls for the weather agents.
+#
+# The model spends one or more "plan" round trips before it emits the
+# get_weather action, but the city is usually already named in the user query
+# or the first plan. The prefetcher starts those lookups in the background
+# while planning continues; when the action arrives its result is taken from
+# the finished (or still running) prefetch instead of starting a new fetch.
+# Prefetches the model never asks for are discarded at the end of the turn.
+#
+# Lookups go through WeatherCache, so a prefetch and a real call for the same
+# city still share one upstream request.
+import asyncio
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+from weather_cache import normalize_city
+
+# "weather of London", "weather data of New York", "temperature in Paris and Rome"
+WEATHER_PHRASE = re.compile(
+    r"\b(?:weather|temperature|forecast|climate)\b(?:\s+[\w-]+){0,3}?\s+(?:of|in|for|at)\s+"
+    r"([A-Za-z][A-Za-z .,'-]*)",
+    re.IGNORECASE,
+)
+# words that end a city name in free text ("weather in paris today")
+STOP_WORDS = {
+    "today", "tomorrow", "tonight", "now", "right", "currently", "this", "next", "please", "is", "was",
+    "will", "be", "like", "and", "or", "then", "city", "from", "the", "weekend", "week", "morning",
+    "evening", "using", "with", "i", "should", "so", "get_weather", "tool",
+}
+MAX_CITIES = 3
+MAX_CITY_WORDS = 3
+
+
+def extract_cities(text: str) -> list:
+    """
+    Best-effort city names mentioned after a weather phrase, in order.
+    A wrong guess only costs one wasted lookup.
+    """
+    cities = []
+    for match in WEATHER_PHRASE.finditer(text or ""):
+        for part in re.split(r",|\band\b|\bor\b", match.group(1), flags=re.IGNORECASE):
+            if not part.strip(" .'-"):
+                continue  # ", and"
+            words = []
+            for word in part.strip(" .'-").split():
+                if word.lower() in STOP_WORDS:
+                    break
+                words.append(word.strip(".'"))
+            if words and len(words) <= MAX_CITY_WORDS:
+                city = " ".join(words)
+                if normalize_city(city) not in {normalize_city(c) for c in cities}:
+                    cities.append(city)
+            if not words:
+                break  # "... in paris and then ..." -> stop at the first non-city part
+    return cities[:MAX_CITIES]
+
+
+class _PrefetchBase:
+    def __init__(self, lookup):
+        self.lookup = lookup
+        self.pending = {}  # normalized city -> future/task
+        self.launched = 0
+        self.used = 0
+        self.wasted = 0
+
+    def from_text(self, text: str):
+        for city in extract_cities(text):
+            self.prefetch(city)
+
+    def stats(self) -> dict:
+        return {"launched": self.launched, "used": self.used, "wasted": self.wasted}
+
+
+class WeatherPrefetcher(_PrefetchBase):
+    """
+    Thread-based, for weather_agent.run_turn. lookup(city) -> weather text.
+    """
+
+    def __init__(self, lookup, executor=None):
+        super().__init__(lookup)
+        self.executor = executor or default_executor
+
+    def prefetch(self, city: str):
+        key = normalize_city(city)
+        if key and key not in self.pending:
+            self.pending[key] = self.executor.submit(self.lookup, city)
+            self.launched += 1
+
+    def take(self, city: str):
+        """
+        The prefetched result for city, or None if it was not prefetched or failed.
+        """
+        future = self.pending.pop(normalize_city(city), None)
+        if future is None:
+            return None
+        try:
+            result = future.result()
+        except Exception:
+            return None  # the caller does the real call and reports the error
+        self.used += 1
+        return result
+
+    def discard(self):
+        # not yet started -> cancelled; already running ones just fill the cache
+        for future in self.pending.values():
+            future.cancel()
+            self.wasted += 1
+        self.pending.clear()
+
+
+class AsyncWeatherPrefetcher(_PrefetchBase):
+    """
+    Task-based, for AsyncWeatherAgent. lookup(city) is a coroutine function.
+    """
+
+    def prefetch(self, city: str):
+        key = normalize_city(city)
+        if key and key not in self.pending:
+            self.pending[key] = asyncio.create_task(self.lookup(city))
+            self.launched += 1
+
+    async def take(self, city: str):
+        task = self.pending.pop(normalize_city(city), None)
+        if task is None:
+            return None
+        try:
+            result = await task
+        except Exception:
+            return None
+        self.used += 1
+        return result
+
+    def discard(self):
+        # running lookups are not cancelled: WeatherCache shares them with
+        # other sessions asking for the same city, and they only fill the cache
+        for task in self.pending.values():
+            _background.add(task)  # keep a reference until it finishes
+            task.add_done_callback(_forget)
+            self.wasted += 1
+        self.pending.clear()
+
+
+_background = set()
+
+
+def _forget(task):
+    _background.discard(task)
+    if not task.cancelled():
+        task.exception()  # mark retrieved, a failed speculative lookup is not worth a warning
+
+
+# lookups are I/O bound and short; a few threads are enough for a CLI agent
+default_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="weather-prefetch")